@@ -2,7 +2,8 @@ const API_BASE_URL = 'https://nghki1cjdzng.manus.space/api'
 
 class ApiService {
   async request(endpoint, options = {}) {
-    const url = `${API_BASE_URL}${endpoint}`
+    // Paginated responses link their next page with an absolute URL
+    const url = /^https?:\/\//.test(endpoint) ? endpoint : `${API_BASE_URL}${endpoint}`
     const config = {
       headers: {
         'Content-Type': 'application/json',
@@ -32,7 +33,16 @@ class ApiService {
 
   // Comparison endpoints
   async getComparisons() {
-    return this.request('/comparisons/')
+    // The Django backend returns cursor-paginated pages; follow `next` until the list is complete
+    const comparisons = []
+    let endpoint = '/comparisons/?page_size=500'
+    while (endpoint) {
+      const data = await this.request(endpoint)
+      if (Array.isArray(data)) return data
+      comparisons.push(...data.results)
+      endpoint = data.next
+    }
+    return comparisons
   }
 
   async createComparison(data) {
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ranking.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -149,9 +150,90 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
 
+CORS_EXPOSE_HEADERS = ['etag', 'server-timing']
+
+
+# Ranking settings
+RANKING_MAX_PAGE_SIZE = 1000
+# Sort on per-process columnar snapshots instead of in SQL, keeping this many comparisons
+# and this many sort orders per comparison
+RANKING_SNAPSHOTS = True
+RANKING_SNAPSHOT_CACHE_SIZE = 32
+RANKING_SNAPSHOT_ORDERINGS = 16
+# Read single-attribute rankings from materialized rank tables, moving products on small writes
+# and rebuilding on read after writes touching more than RANKING_MATERIALIZED_MAX_MOVES values
+RANKING_MATERIALIZED_RANKS = True
+RANKING_MATERIALIZED_MAX_MOVES = 100
+RANKING_IMPORT_BATCH_SIZE = 1000
+RANKING_IMPORT_MAX_BATCH_SIZE = 10000
+# Most cells one attribute matrix PATCH may write
+RANKING_MATRIX_MAX_CELLS = 50000
+# Deleting a comparison hides it at once and removes its rows this many per transaction,
+# in a background thread (or with manage.py purge_deleted_comparisons when threads are off)
+RANKING_BACKGROUND_DELETION = True
+RANKING_DELETION_THREADS = True
+RANKING_DELETION_BATCH_SIZE = 2000
+# Background jobs run by manage.py run_job_worker: worker processes (None for one per CPU),
+# seconds between queue polls, seconds after which another worker takes over a running job,
+# and seconds finished jobs and their files are kept
+RANKING_JOB_PROCESSES = None
+RANKING_JOB_POLL_INTERVAL = 1.0
+RANKING_JOB_TIMEOUT = 3600
+RANKING_JOB_RETENTION = 7 * 24 * 3600
+RANKING_JOB_FILES_DIR = BASE_DIR / 'job_files'
+# Pareto requests over more than three attributes and more products than this are queued as jobs
+RANKING_PARETO_MAX_SYNC_PRODUCTS = 10000
+# Products loaded per query when ranking results are streamed (?stream=true)
+RANKING_STREAM_CHUNK_SIZE = 500
+# Products per chunk of CSV/JSONL/Parquet exports
+RANKING_EXPORT_CHUNK_SIZE = 2000
+# Requests issuing more queries than this are logged as warnings (None disables the check)
+RANKING_QUERY_BUDGET = 25
+# Value of one unit of each currency in USD for converting prices on write; stored
+# values keep the rates they were written with until Attribute.refresh_typed_values()
+RANKING_CURRENCY_RATES = {
+    'USD': 1.0,
+    'EUR': 1.08,
+    'GBP': 1.27,
+}
+
+# Cache settings
+# Ranking results are cached per comparison version; LocMemCache evicts least
+# recently used entries once MAX_ENTRIES is reached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ranking',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    }
+}
+
+
+# Logging
+# Per-request metrics lines from RequestMetricsMiddleware go to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'ranking.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -1,13 +1,55 @@
 from django.contrib import admin
-from .models import Comparison, Attribute, Product, ProductAttributeData
+from .deletion import mark_deleted
+from .models import Comparison, ComparisonDeletion, Attribute, Job, Product, ProductAttributeData
+from .search import matching_ids, search_available
+
+
+class FullTextSearchMixin:
+    """Search the changelist through the full-text index instead of LIKE '%...%' scans"""
+    search_field = None
+    search_kinds = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        ids = matching_ids(self.search_field, self.search_kinds, search_term) if search_available() else None
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=ids), False
 
 
 @admin.register(Comparison)
-class ComparisonAdmin(admin.ModelAdmin):
+class ComparisonAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_field = 'comparison_id'
+    search_kinds = ('comparison',)
     list_display = ['name', 'created_at', 'updated_at']
     search_fields = ['name', 'description']
     list_filter = ['created_at']
 
+    # Deleted comparisons are hidden at once and purged in batches, see deletion.py
+    def get_deleted_objects(self, objs, request):
+        # Skip collecting every related row just for the confirmation page
+        return [str(obj) for obj in objs], {'comparisons': len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        mark_deleted(obj)
+
+    def delete_queryset(self, request, queryset):
+        for comparison in queryset:
+            mark_deleted(comparison)
+
+
+@admin.register(ComparisonDeletion)
+class ComparisonDeletionAdmin(admin.ModelAdmin):
+    list_display = ['comparison_name', 'comparison_id', 'status', 'stage', 'deleted_rows', 'total_rows', 'requested_at']
+    list_filter = ['status']
+    readonly_fields = [field.name for field in ComparisonDeletion._meta.fields]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'comparison', 'status', 'worker', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['key', 'result', 'result_file', 'worker', 'created_at', 'started_at', 'finished_at']
+
 
 @admin.register(Attribute)
 class AttributeAdmin(admin.ModelAdmin):
@@ -17,7 +59,10 @@ class AttributeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    # Products also match on their text attribute values
+    search_field = 'product_id'
+    search_kinds = ('product', 'value')
     list_display = ['name', 'comparison', 'created_at']
     list_filter = ['comparison', 'created_at']
     search_fields = ['name', 'description']
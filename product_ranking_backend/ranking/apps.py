@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RankingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ranking'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .values import register_units
+
+        register_units('currency', getattr(settings, 'RANKING_CURRENCY_RATES', {}))
@@ -0,0 +1,137 @@
+"""
+Async read views for serving under ASGI.
+
+These mirror the comparison list, detail and ranking results endpoints
+with Django's async ORM, so waiting on the database does not hold a
+worker thread. Conditional requests and cached results are answered
+without leaving the event loop; a ranking results cache miss runs the
+synchronous view, whose sorting and scoring are CPU-bound anyway, in the
+request's worker thread.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import views
+from .cache import aget_cached_results, aget_version, versioned_etag
+from .models import Comparison
+from .pagination import ComparisonCursorPagination, decode_cursor, encode_cursor
+from .serializers import ComparisonListSerializer, ComparisonSerializer
+
+
+def _json(data, status=200, etag=None):
+    response = JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def _error(message, status):
+    return _json({'error': message}, status=status)
+
+
+def _page_size(raw):
+    if raw in (None, ''):
+        return ComparisonCursorPagination.page_size
+    try:
+        size = int(raw)
+    except ValueError:
+        raise ValueError('page_size must be an integer')
+    if size < 1:
+        raise ValueError('page_size must be at least 1')
+    return min(size, ComparisonCursorPagination.max_page_size)
+
+
+@require_GET
+async def comparison_list(request):
+    """
+    Async comparison list with the sync view's filters and keyset pagination on (-created_at, -id).
+
+    Its cursors are the ranking results' keyset cursors, not the sync
+    list's DRF cursors, which would need an offset query per page; cursors
+    from the two lists are not interchangeable and are rejected by the other.
+    """
+    params = request.GET
+    try:
+        queryset = views.filter_comparisons(Comparison.objects.all(), params)
+    except ValidationError as e:
+        return _json(e.detail, status=400)
+
+    sort_key = ['comparisons', params.get('name') or '', params.get('created_after', ''), params.get('created_before', '')]
+    try:
+        page_size = _page_size(params.get('page_size'))
+        cursor = decode_cursor(params.get('cursor'), sort_key)
+    except ValueError as e:
+        return _error(str(e), 400)
+    if cursor:
+        created_at = parse_datetime(cursor['value'] or '')
+        if created_at is None:
+            return _error('Invalid cursor', 400)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=cursor['id']))
+
+    queryset = queryset.with_counts().order_by('-created_at', '-id')
+    comparisons = [comparison async for comparison in queryset[:page_size + 1]]
+
+    next_url = None
+    if len(comparisons) > page_size:
+        comparisons = comparisons[:page_size]
+        last = comparisons[-1]
+        position = (cursor['position'] if cursor else 0) + page_size
+        query = params.copy()
+        query['cursor'] = encode_cursor(sort_key, {
+            'id': last.id, 'position': position, 'value': last.created_at.isoformat(), 'rank': position,
+        })
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    return _json({
+        'next': next_url,
+        'previous': None,
+        'results': ComparisonListSerializer(comparisons, many=True).data,
+    })
+
+
+@require_GET
+async def comparison_detail(request, pk):
+    """Async comparison detail with ?fields= / ?include= and ETags"""
+    try:
+        fields = ComparisonSerializer.select_fields(request.GET)
+    except ValidationError as e:
+        return _json(e.detail, status=400)
+
+    version = await aget_version(pk)
+    if version is None:
+        return _error('Comparison not found', 404)
+    etag = versioned_etag('comparison', pk, version, request.GET)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    queryset = ComparisonSerializer.setup_eager_loading(Comparison.objects.all(), fields)
+    try:
+        comparison = await queryset.aget(pk=pk)
+    except Comparison.DoesNotExist:
+        return _error('Comparison not found', 404)
+    # Everything the serializer reads was annotated or prefetched by aget()
+    return _json(ComparisonSerializer(comparison, fields=fields).data, etag=etag)
+
+
+@require_GET
+async def ranking_results(request, comparison_id):
+    """Async ranking results: 304s and cache hits stay on the event loop, misses run the sync view"""
+    version = await aget_version(comparison_id)
+    if version is None:
+        return _error('Comparison not found', 404)
+    etag = versioned_etag('results', comparison_id, version, request.GET)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    cached = await aget_cached_results(comparison_id, version, request.GET)
+    if cached is not None:
+        return _json(cached, etag=etag)
+    return await sync_to_async(views.get_ranking_results)(request, comparison_id=comparison_id)
@@ -0,0 +1,364 @@
+"""
+Endpoint benchmarks for the Django and Flask backends.
+
+Both backends are loaded with the same synthetic comparisons in a
+throwaway database, then each scenario is requested sequentially through
+the framework's test client while latency and the number of database
+statements per request are recorded. Results are plain dicts meant to be
+stored as JSON and compared between releases.
+"""
+import asyncio
+import importlib.util
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from importlib import metadata
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .synthetic import create_comparison
+
+
+SCENARIOS = ('list', 'detail', 'results', 'results_cached', 'attribute_update', 'product_create', 'create')
+PERCENTILES = (50, 90, 95, 99)
+FLASK_SOURCE = Path(__file__).resolve().parent.parent / 'src' / 'main.py'
+
+
+def _value_for(data_type, i):
+    if data_type == 'number':
+        return str(100 + i % 1000)
+    if data_type == 'boolean':
+        return 'true' if i % 2 else 'false'
+    return f'value {i % 50}'
+
+
+def _fixture(comparison_id, product_ids, attributes):
+    """What scenarios need to know about one loaded comparison; attributes are (id, name, data_type)"""
+    sort_by = next((name for _, name, data_type in attributes if data_type == 'number'), None)
+    return {'id': comparison_id, 'product_ids': product_ids, 'attributes': attributes, 'sort_by': sort_by}
+
+
+def scenario_request(scenario, fixture, i):
+    """(method, path, payload) of the i-th request of a scenario"""
+    base = f"/api/comparisons/{fixture['id']}/"
+    if scenario == 'list':
+        return 'GET', '/api/comparisons/', None
+    if scenario == 'detail':
+        return 'GET', base, None
+    if scenario in ('results', 'results_cached'):
+        return 'GET', base + 'results/' + (f"?sort_by={fixture['sort_by']}" if fixture['sort_by'] else ''), None
+    if scenario == 'attribute_update':
+        product_id = fixture['product_ids'][i % len(fixture['product_ids'])]
+        attribute_id, _, data_type = fixture['attributes'][i % len(fixture['attributes'])]
+        return 'PATCH', f'{base}products/{product_id}/attributes/', {
+            'attribute_data': [{'attribute_id': attribute_id, 'value': _value_for(data_type, i)}]
+        }
+    if scenario == 'product_create':
+        return 'POST', base + 'products/', {
+            'name': f'Benchmark product {i}',
+            'attribute_data': [
+                {'attribute_id': attribute_id, 'value': _value_for(data_type, i)}
+                for attribute_id, _, data_type in fixture['attributes']
+            ],
+        }
+    if scenario == 'create':
+        return 'POST', '/api/comparisons/', {'name': f'Benchmark comparison {i}'}
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+class DjangoTarget:
+    """The ranking app on a fresh test database"""
+    name = 'django'
+    scenarios = SCENARIOS
+
+    def __init__(self):
+        self.queries = 0
+        self._stack = ExitStack()
+
+    def _count(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def setup(self, specs):
+        setup_test_environment(debug=False)
+        self._stack.callback(teardown_test_environment)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        self._stack.callback(connection.creation.destroy_test_db, old_name, verbosity=0)
+        cache.clear()
+        self.client = Client()
+
+        fixtures = []
+        for spec in specs:
+            comparison = create_comparison(spec)
+            fixtures.append(_fixture(
+                comparison.id,
+                list(comparison.products.order_by('id').values_list('id', flat=True)),
+                list(comparison.attributes.order_by('id').values_list('id', 'name', 'data_type')),
+            ))
+        self._stack.enter_context(connection.execute_wrapper(self._count))
+        return fixtures
+
+    def clear_caches(self):
+        cache.clear()
+
+    def request(self, method, path, payload=None):
+        if payload is None:
+            return self.client.generic(method, path).status_code
+        return self.client.generic(method, path, json.dumps(payload), content_type='application/json').status_code
+
+    def teardown(self):
+        self._stack.close()
+
+
+class FlaskTarget:
+    """src/main.py on a temporary SQLite file"""
+    name = 'flask'
+    scenarios = ('list', 'detail', 'results', 'results_cached', 'product_create', 'create')
+
+    def __init__(self):
+        self.queries = 0
+        self._stack = ExitStack()
+
+    def _count(self, statement):
+        self.queries += 1
+
+    def _import_app(self, db_path):
+        # The app reads its database path and imports its siblings at import time
+        previous = os.environ.get('PRODUCT_RANKING_DB')
+        os.environ['PRODUCT_RANKING_DB'] = db_path
+        sys.path.insert(0, str(FLASK_SOURCE.parent))
+        try:
+            spec = importlib.util.spec_from_file_location('product_ranking_flask', FLASK_SOURCE)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        finally:
+            sys.path.remove(str(FLASK_SOURCE.parent))
+            if previous is None:
+                del os.environ['PRODUCT_RANKING_DB']
+            else:
+                os.environ['PRODUCT_RANKING_DB'] = previous
+        return module
+
+    def _load(self, spec):
+        conn = sqlite3.connect(self.main.DB_PATH)
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO comparisons (name, description) VALUES (?, ?)', (spec['name'], spec['description'])
+            )
+            comparison_id = cursor.lastrowid
+            attributes = []
+            for name, data_type, unit in spec['attributes']:
+                cursor.execute(
+                    'INSERT INTO attributes (comparison_id, name, data_type, unit) VALUES (?, ?, ?, ?)',
+                    (comparison_id, name, data_type, unit)
+                )
+                attributes.append((cursor.lastrowid, name, data_type))
+            product_ids, rows = [], []
+            for name, description, values in spec['products']:
+                cursor.execute(
+                    'INSERT INTO products (comparison_id, name, description) VALUES (?, ?, ?)',
+                    (comparison_id, name, description)
+                )
+                product_ids.append(cursor.lastrowid)
+                rows.extend(
+                    (cursor.lastrowid, attribute_id, value) + self.main.typed_values(value, data_type)
+                    for (attribute_id, _, data_type), value in zip(attributes, values) if value is not None
+                )
+            cursor.executemany('''
+                INSERT INTO product_attribute_data (product_id, attribute_id, value, numeric_value, boolean_value)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+        conn.close()
+        return _fixture(comparison_id, product_ids, attributes)
+
+    def setup(self, specs):
+        directory = self._stack.enter_context(tempfile.TemporaryDirectory())
+        self.main = self._import_app(os.path.join(directory, 'benchmark.db'))
+        self._stack.callback(self.main.pool.close_all)
+        self.main.init_db()
+        fixtures = [self._load(spec) for spec in specs]
+
+        @self.main.app.before_request
+        def trace_queries():
+            self.main.get_db().set_trace_callback(self._count)
+
+        self.client = self.main.app.test_client()
+        return fixtures
+
+    def clear_caches(self):
+        pass
+
+    def request(self, method, path, payload=None):
+        return self.client.open(path, method=method, json=payload).status_code
+
+    def teardown(self):
+        self._stack.close()
+
+
+TARGETS = {'django': DjangoTarget, 'flask': FlaskTarget}
+
+
+def summarize(latencies, queries):
+    """Latency percentiles in ms, sequential throughput and statements per request"""
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+    latency_ms = {'mean': statistics.fmean(ordered), 'min': ordered[0], 'max': ordered[-1]}
+    latency_ms.update((f'p{p}', percentile(p)) for p in PERCENTILES)
+    return {
+        'requests': len(ordered),
+        'throughput_rps': round(len(ordered) / sum(ordered), 2),
+        'latency_ms': {key: round(value * 1000, 3) for key, value in latency_ms.items()},
+        'queries': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)},
+    }
+
+
+def run_benchmark(target, specs, scenarios=SCENARIOS, requests=50, warmup=5):
+    """Load specs into a target and measure each scenario; unsupported scenarios are reported as such"""
+    fixtures = target.setup(specs)
+    try:
+        results = {}
+        for scenario in scenarios:
+            if scenario not in target.scenarios:
+                results[scenario] = {'supported': False}
+                continue
+            latencies, queries = [], []
+            for i in range(-warmup, requests):
+                method, path, payload = scenario_request(scenario, fixtures[i % len(fixtures)], i)
+                if scenario == 'results':
+                    target.clear_caches()
+                target.queries = 0
+                started = time.perf_counter()
+                status_code = target.request(method, path, payload)
+                elapsed = time.perf_counter() - started
+                if status_code >= 400:
+                    raise RuntimeError(f'{target.name}: {method} {path} returned {status_code}')
+                if i >= 0:
+                    latencies.append(elapsed)
+                    queries.append(target.queries)
+            results[scenario] = summarize(latencies, queries)
+        return results
+    finally:
+        target.teardown()
+
+
+READ_SCENARIOS = ('list', 'detail', 'results_cached')
+
+
+def _concurrency_summary(latencies, elapsed):
+    result = summarize(latencies, [0])
+    del result['queries']
+    result['throughput_rps'] = round(len(latencies) / elapsed, 2)
+    return result
+
+
+def run_concurrency_benchmark(specs, concurrency=50, requests=500, threads=4):
+    """
+    Compare read throughput of the sync views on a pool of threads, as a
+    threaded WSGI worker serves them, with the async views on one event
+    loop, as an ASGI worker serves them, at the given number of
+    concurrent clients.
+    """
+    target = DjangoTarget()
+    fixtures = target.setup(specs)
+    try:
+        paths = [
+            scenario_request(READ_SCENARIOS[i % len(READ_SCENARIOS)], fixtures[i % len(fixtures)], i)[1]
+            for i in range(requests)
+        ]
+        for path in set(paths):
+            Client().get(path)  # warm caches and snapshots
+
+        local = threading.local()
+
+        def sync_request(path):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            started = time.perf_counter()
+            local.client.get(path)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            wsgi_latencies = list(executor.map(sync_request, paths))
+        wsgi = _concurrency_summary(wsgi_latencies, time.perf_counter() - started)
+
+        async def run_async():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def async_request(path):
+                async with slots:
+                    request_started = time.perf_counter()
+                    await client.get(path.replace('/api/', '/api/async/', 1))
+                    return time.perf_counter() - request_started
+
+            return await asyncio.gather(*(async_request(path) for path in paths))
+
+        started = time.perf_counter()
+        asgi_latencies = asyncio.run(run_async())
+        asgi = _concurrency_summary(asgi_latencies, time.perf_counter() - started)
+    finally:
+        target.teardown()
+    return {
+        'concurrency': concurrency,
+        'wsgi_threads': threads,
+        'scenarios': list(READ_SCENARIOS),
+        'wsgi': wsgi,
+        'asgi': asgi,
+        'throughput_gain': round(asgi['throughput_rps'] / wsgi['throughput_rps'], 2),
+    }
+
+
+def environment():
+    """Versions the numbers depend on"""
+    versions = {}
+    for package in ('django', 'djangorestframework', 'flask', 'numpy'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+        **versions,
+    }
+
+
+def compare_results(baseline, current, threshold=0.2, metric='p50'):
+    """
+    List regressions of current against baseline benchmark results.
+
+    A scenario regresses when its latency metric grew by more than
+    threshold (a fraction) or when it issues more queries per request.
+    """
+    regressions = []
+    for backend, scenarios in current['backends'].items():
+        for scenario, result in scenarios.items():
+            before = baseline.get('backends', {}).get(backend, {}).get(scenario)
+            if not before or 'latency_ms' not in before or 'latency_ms' not in result:
+                continue
+            old, new = before['latency_ms'][metric], result['latency_ms'][metric]
+            if old and (new - old) / old > threshold:
+                regressions.append(f'{backend} {scenario}: {metric} {old}ms -> {new}ms')
+            if result['queries']['mean'] > before['queries']['mean']:
+                regressions.append(
+                    f"{backend} {scenario}: queries {before['queries']['mean']} -> {result['queries']['mean']}"
+                )
+    return regressions
@@ -0,0 +1,80 @@
+"""
+Versioned caching of comparison responses.
+
+Every write to a comparison, its attributes, products or attribute data
+bumps Comparison.version (see signals.py; bulk writes call bump_version()
+themselves). Cache keys and ETags include the version, so stale entries
+are never read again and simply age out of the LRU cache.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Comparison
+
+
+def bump_version(comparison_id):
+    """Invalidate cached responses for a comparison"""
+    Comparison.objects.filter(pk=comparison_id).update(version=F('version') + 1)
+
+
+def get_version(comparison_id):
+    """Current version of a comparison, or None if it does not exist"""
+    return Comparison.objects.filter(pk=comparison_id).values_list('version', flat=True).first()
+
+
+def _fingerprint(kind, comparison_id, version, params):
+    """Stable digest of a response's inputs; query parameters are order-insensitive"""
+    items = sorted((key, params.getlist(key)) for key in params)
+    payload = json.dumps([kind, comparison_id, version, items], separators=(',', ':'))
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def results_cache_key(comparison_id, version, params, kind='results'):
+    return f'ranking:{kind}:{comparison_id}:{version}:{_fingerprint(kind, comparison_id, version, params)}'
+
+
+def get_cached_results(comparison_id, version, params, kind='results'):
+    return cache.get(results_cache_key(comparison_id, version, params, kind))
+
+
+def set_cached_results(comparison_id, version, params, data, kind='results'):
+    cache.set(results_cache_key(comparison_id, version, params, kind), data)
+
+
+async def aget_version(comparison_id):
+    """get_version() for async views"""
+    return await Comparison.objects.filter(pk=comparison_id).values_list('version', flat=True).afirst()
+
+
+async def aget_cached_results(comparison_id, version, params, kind='results'):
+    return await cache.aget(results_cache_key(comparison_id, version, params, kind))
+
+
+def versioned_etag(kind, comparison_id, version, params):
+    """ETag of a response for a known comparison version"""
+    return f'"{_fingerprint(kind, comparison_id, version, params)}"'
+
+
+def _etag(kind, request, comparison_id):
+    version = get_version(comparison_id)
+    if version is None:
+        return None
+    return versioned_etag(kind, comparison_id, version, request.GET)
+
+
+def comparison_etag(request, pk):
+    """ETag for the comparison detail endpoint"""
+    return _etag('comparison', request, pk)
+
+
+def results_etag(request, comparison_id):
+    """ETag for the ranking results endpoint"""
+    return _etag('results', request, comparison_id)
+
+
+def pareto_etag(request, comparison_id):
+    """ETag for the Pareto frontier endpoint"""
+    return _etag('pareto', request, comparison_id)
@@ -0,0 +1,143 @@
+"""
+Soft deletion of comparisons with batched removal of their rows.
+
+Deleting a comparison through the ORM makes Django's collector load every
+product (Product has post_delete receivers) and delete it in one long
+transaction. Instead, mark_deleted() only sets Comparison.deleted_at,
+which hides the comparison from Comparison.objects at once, and records a
+ComparisonDeletion. purge() then removes the rows table by table in
+raw-SQL batches of RANKING_DELETION_BATCH_SIZE, each in its own short
+transaction together with its progress, so other writers get the
+database between batches and an interrupted purge resumes where it
+stopped. Signals are not sent for the purged rows.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    Attribute, Comparison, ComparisonDeletion, Job, Product, ProductAttributeData, ProductRank, RankingMaterialization
+)
+
+
+logger = logging.getLogger(__name__)
+
+# (stage, model, query selecting the ids of the comparison's rows), children before parents
+STAGES = (
+    ('ranks', ProductRank, '''
+        SELECT r.id FROM {ProductRank} r
+        JOIN {RankingMaterialization} m ON m.id = r.materialization_id
+        JOIN {Attribute} a ON a.id = m.attribute_id
+        WHERE a.comparison_id = %s'''),
+    ('materializations', RankingMaterialization, '''
+        SELECT m.id FROM {RankingMaterialization} m
+        JOIN {Attribute} a ON a.id = m.attribute_id
+        WHERE a.comparison_id = %s'''),
+    ('attribute_data', ProductAttributeData, '''
+        SELECT d.id FROM {ProductAttributeData} d
+        JOIN {Product} p ON p.id = d.product_id
+        WHERE p.comparison_id = %s'''),
+    # Values of other comparisons' products for this comparison's attributes, which should not exist
+    ('foreign_attribute_data', ProductAttributeData, '''
+        SELECT d.id FROM {ProductAttributeData} d
+        JOIN {Attribute} a ON a.id = d.attribute_id
+        JOIN {Product} p ON p.id = d.product_id
+        WHERE a.comparison_id = %s AND p.comparison_id <> a.comparison_id'''),
+    ('products', Product, 'SELECT id FROM {Product} WHERE comparison_id = %s'),
+    ('attributes', Attribute, 'SELECT id FROM {Attribute} WHERE comparison_id = %s'),
+    # Their files are removed by jobs.prune_jobs()
+    ('jobs', Job, 'SELECT id FROM {Job} WHERE comparison_id = %s'),
+    ('comparison', Comparison, 'SELECT id FROM {Comparison} WHERE id = %s AND deleted_at IS NOT NULL'),
+)
+
+
+def _stage_queries():
+    tables = {model.__name__: model._meta.db_table for _, model, _ in STAGES}
+    return [(stage, model._meta.db_table, select.format(**tables)) for stage, model, select in STAGES]
+
+
+def mark_deleted(comparison):
+    """
+    Hide a comparison and queue the removal of its rows.
+
+    Returns the ComparisonDeletion tracking the removal, which starts in a
+    background thread once the transaction commits unless
+    RANKING_DELETION_THREADS is off (then run purge_deleted_comparisons).
+    """
+    with transaction.atomic():
+        Comparison.objects.filter(pk=comparison.pk).update(deleted_at=timezone.now(), version=F('version') + 1)
+        deletion = ComparisonDeletion.objects.create(comparison_id=comparison.pk, comparison_name=comparison.name)
+        if settings.RANKING_DELETION_THREADS:
+            transaction.on_commit(lambda: purge_in_background(deletion.pk))
+    return deletion
+
+
+def claim(deletion_id, statuses=('pending', 'failed')):
+    """Mark a deletion running if it is in one of statuses; returns it, or None if another worker has it"""
+    claimed = ComparisonDeletion.objects.filter(pk=deletion_id, status__in=statuses).update(
+        status='running', started_at=timezone.now(), error=''
+    )
+    return ComparisonDeletion.objects.get(pk=deletion_id) if claimed else None
+
+
+def purge(deletion, batch_size=None):
+    """Remove the rows of a claimed deletion's comparison in batches, saving progress after each one"""
+    batch_size = batch_size or settings.RANKING_DELETION_BATCH_SIZE
+    queries = _stage_queries()
+    try:
+        if deletion.total_rows is None:
+            with connection.cursor() as cursor:
+                total = 0
+                for _, _, select in queries:
+                    cursor.execute(f'SELECT COUNT(*) FROM ({select}) t', [deletion.comparison_id])
+                    total += cursor.fetchone()[0]
+            deletion.total_rows = total
+            deletion.save(update_fields=['total_rows'])
+
+        for stage, table, select in queries:
+            deletion.stage = stage
+            deleted = batch_size
+            while deleted == batch_size:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f'DELETE FROM {table} WHERE id IN ({select} LIMIT %s)', [deletion.comparison_id, batch_size]
+                    )
+                    deleted = cursor.rowcount
+                    deletion.deleted_rows += deleted
+                    deletion.save(update_fields=['stage', 'deleted_rows'])
+    except Exception as e:
+        deletion.status, deletion.error = 'failed', str(e)
+        deletion.save(update_fields=['status', 'error'])
+        raise
+
+    deletion.status, deletion.stage, deletion.finished_at = 'done', '', timezone.now()
+    deletion.save(update_fields=['status', 'stage', 'finished_at'])
+    return deletion
+
+
+def run_deletion(deletion_id, statuses=('pending', 'failed'), batch_size=None):
+    """Claim and purge a deletion; returns it, or None if it was not in one of statuses"""
+    deletion = claim(deletion_id, statuses)
+    return purge(deletion, batch_size) if deletion is not None else None
+
+
+def _purge_thread(deletion_id):
+    try:
+        run_deletion(deletion_id)
+    except Exception:
+        logger.exception('Purging comparison deletion %s failed', deletion_id)
+    finally:
+        connections.close_all()
+
+
+def purge_in_background(deletion_id):
+    """Run a deletion in a daemon thread; one interrupted by a restart is resumed by purge_deleted_comparisons"""
+    thread = threading.Thread(
+        target=_purge_thread, args=(deletion_id,), name=f'comparison-deletion-{deletion_id}', daemon=True
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,188 @@
+"""
+Streaming export of comparisons as a wide products x attributes table.
+
+One row per product with fixed columns (comparison_id, comparison_name,
+product_id, name, description) followed by one typed column per attribute
+name. Exporting several comparisons uses the union of their attribute
+names; a name used with different data types is exported as text.
+Products are read chunk_size rows at a time and every chunk is encoded
+and yielded before the next one is loaded.
+"""
+import csv
+import io
+import json
+
+from .models import Attribute, Comparison, Product
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet and Arrow exports are optional
+    pyarrow = None
+
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet', 'arrow')
+ARROW_FORMATS = ('parquet', 'arrow')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+FILE_EXTENSIONS = {'csv': 'csv', 'jsonl': 'jsonl', 'parquet': 'parquet', 'arrow': 'arrows'}
+FIXED_COLUMNS = [
+    ('comparison_id', 'integer'),
+    ('comparison_name', 'text'),
+    ('product_id', 'integer'),
+    ('name', 'text'),
+    ('description', 'text'),
+]
+
+
+def available_formats():
+    """Export formats usable with the installed packages"""
+    return [name for name in EXPORT_FORMATS if pyarrow is not None or name not in ARROW_FORMATS]
+
+
+def export_columns(comparison_ids):
+    """
+    Return ([(column, data_type)], {attribute_id: column}) for the given comparisons.
+
+    Attribute columns follow the fixed columns in order of first appearance.
+    """
+    columns = dict(FIXED_COLUMNS)
+    column_names = {}
+    attributes = Attribute.objects.filter(comparison_id__in=comparison_ids).order_by('comparison_id', 'id')
+    for attribute_id, name, data_type in attributes.values_list('id', 'name', 'data_type'):
+        column = name if name not in dict(FIXED_COLUMNS) else f'{name} (attribute)'
+        if column in columns and columns[column] != data_type:
+            data_type = 'text'
+        columns[column] = data_type
+        column_names[attribute_id] = column
+    return list(columns.items()), column_names
+
+
+def iter_row_chunks(comparison_ids, chunk_size=2000):
+    """Yield (columns, None) first, then lists of row dicts with up to chunk_size products each"""
+    columns, column_names = export_columns(comparison_ids)
+    column_types = dict(columns)
+    yield columns, None
+
+    comparisons = Comparison.objects.filter(id__in=comparison_ids).order_by('id').values_list('id', 'name')
+    for comparison_id, comparison_name in comparisons:
+        # One row per attribute value, or one per product without values, in product order
+        data = Product.objects.filter(comparison_id=comparison_id).order_by('id').values_list(
+            'id', 'name', 'description', 'attribute_data__attribute_id', 'attribute_data__value',
+            'attribute_data__numeric_value', 'attribute_data__boolean_value',
+        )
+        chunk, row = [], None
+        for product_id, name, description, attribute_id, value, numeric_value, boolean_value in data.iterator(
+            chunk_size=chunk_size
+        ):
+            if row is None or row['product_id'] != product_id:
+                if len(chunk) >= chunk_size:
+                    yield None, chunk
+                    chunk = []
+                row = dict.fromkeys(column_types)
+                row.update(comparison_id=comparison_id, comparison_name=comparison_name, product_id=product_id,
+                           name=name, description=description)
+                chunk.append(row)
+            column = column_names.get(attribute_id)
+            if column is not None:
+                data_type = column_types[column]
+                row[column] = (
+                    numeric_value if data_type == 'number'
+                    else boolean_value if data_type == 'boolean'
+                    else value
+                )
+        if chunk:
+            yield None, chunk
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return value
+
+
+def _iter_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for columns, rows in chunks:
+        if columns is not None:
+            writer.writerow([column for column, _ in columns])
+        else:
+            writer.writerows([_csv_value(value) for value in row.values()] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _iter_jsonl(chunks):
+    for columns, rows in chunks:
+        if rows:
+            yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that buffers what pyarrow writes until it is drained"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _iter_arrow(chunks, export_format):
+    arrow_types = {
+        'integer': pyarrow.int64(), 'number': pyarrow.float64(), 'boolean': pyarrow.bool_(), 'text': pyarrow.string(),
+    }
+    sink = _ChunkSink()
+    writer = schema = None
+    for columns, rows in chunks:
+        if columns is not None:
+            schema = pyarrow.schema([(column, arrow_types[data_type]) for column, data_type in columns])
+            if export_format == 'parquet':
+                writer = pyarrow.parquet.ParquetWriter(sink, schema)
+            else:
+                writer = pyarrow.ipc.new_stream(sink, schema)
+            continue
+        # Each chunk becomes one Parquet row group or Arrow record batch
+        writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_comparisons(comparison_ids, export_format='csv', chunk_size=2000):
+    """Yield the export of the given comparisons as bytes, one piece per chunk of products"""
+    if export_format not in available_formats():
+        if export_format in ARROW_FORMATS:
+            raise ValueError(f'{export_format} export requires pyarrow')
+        raise ValueError(f"Unknown export format '{export_format}', expected one of: {', '.join(EXPORT_FORMATS)}")
+    chunks = iter_row_chunks(comparison_ids, chunk_size)
+    if export_format == 'csv':
+        return _iter_csv(chunks)
+    if export_format == 'jsonl':
+        return _iter_jsonl(chunks)
+    return _iter_arrow(chunks, export_format)
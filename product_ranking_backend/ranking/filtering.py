@@ -0,0 +1,185 @@
+"""Attribute filter expressions and facet counts for ranking results, evaluated in SQL"""
+import re
+
+from django.db.models import Case, Count, F, FloatField, Max, Min, Q, TextField, Value, When
+from django.db.models.functions import Floor, Least, Lower
+
+from .models import ProductAttributeData
+from .values import canonical_number, parse_boolean
+
+
+# Longest operators first so '<=' is not read as '<'
+OPERATORS = ('<=', '>=', '!=', '==', '<', '>', '=')
+RANGE_LOOKUPS = {'<=': 'lte', '>=': 'gte', '<': 'lt', '>': 'gt'}
+FACET_BUCKETS = 10
+MAX_FACET_BUCKETS = 50
+FACET_TOP_VALUES = 10
+
+EXPRESSION_PATTERN = re.compile(
+    r'^\s*(?P<name>.+?)\s*(?P<operator>' + '|'.join(map(re.escape, OPERATORS)) + r')\s*(?P<value>.*?)\s*$'
+)
+# Commas separate expressions only when another 'name<op>' follows, so '$1,299' stays one value
+SEPARATOR_PATTERN = re.compile(r',(?=[^,<>=!]+(?:' + '|'.join(map(re.escape, OPERATORS)) + '))')
+
+
+class AttributeFilter:
+    """One 'attribute <operator> value' condition, with value parsed for the attribute's data type"""
+    __slots__ = ('attribute', 'operator', 'value')
+
+    def __init__(self, attribute, operator, value):
+        self.attribute = attribute
+        self.operator = operator
+        self.value = value
+
+    def as_dict(self):
+        return {'attribute': self.attribute.name, 'operator': self.operator, 'value': self.value}
+
+    def matching_data(self):
+        """This attribute's data rows that satisfy the condition; uses the (attribute, typed value) indexes"""
+        data = ProductAttributeData.objects.filter(attribute=self.attribute)
+        if self.attribute.data_type == 'text':
+            field, lookup = 'value', 'iexact'
+        else:
+            field = 'boolean_value' if self.attribute.data_type == 'boolean' else 'numeric_value'
+            lookup = RANGE_LOOKUPS.get(self.operator, 'exact')
+        condition = Q(**{f'{field}__{lookup}': self.value})
+        if self.operator == '!=':
+            # Products without a parsed value match no filter, not even a negated one
+            return data.filter(**{f'{field}__isnull': False}).exclude(condition)
+        return data.filter(condition)
+
+
+def parse_filters(expressions):
+    """Parse ['Price<=1000,RAM>=16', 'Wifi=true'] into [(name, operator, raw value)]"""
+    parsed = []
+    for expression in expressions:
+        for item in filter(None, (part.strip() for part in SEPARATOR_PATTERN.split(expression))):
+            match = EXPRESSION_PATTERN.match(item)
+            if match is None or not match.group('value'):
+                raise ValueError(f"Invalid filter '{item}', expected e.g. 'Price<=1000'")
+            operator = '=' if match.group('operator') == '==' else match.group('operator')
+            parsed.append((match.group('name'), operator, match.group('value')))
+    return parsed
+
+
+def _resolve_attribute(name, attributes, lowercase):
+    attribute = attributes.get(name) or lowercase.get(name.lower())
+    if attribute is None:
+        raise ValueError(f"Unknown attribute '{name}'")
+    return attribute
+
+
+def resolve_filters(parsed, attributes):
+    """Turn parse_filters() output into AttributeFilters given {name: Attribute}; invalid filters raise ValueError"""
+    lowercase = {name.lower(): attribute for name, attribute in attributes.items()}
+    filters = []
+    for name, operator, raw in parsed:
+        attribute = _resolve_attribute(name, attributes, lowercase)
+        if attribute.data_type == 'number':
+            # Values may carry their own unit, e.g. 'Storage>=1TB' for a GB attribute
+            value = canonical_number(raw, attribute.unit)
+            if value is None:
+                raise ValueError(f"Invalid number '{raw}' for attribute '{attribute.name}'")
+        elif operator in RANGE_LOOKUPS:
+            raise ValueError(f"Operator '{operator}' needs a number attribute, '{attribute.name}' is {attribute.data_type}")
+        elif attribute.data_type == 'boolean':
+            value = parse_boolean(raw)
+            if value is None:
+                raise ValueError(f"Invalid boolean '{raw}' for attribute '{attribute.name}'")
+        else:
+            value = raw
+        filters.append(AttributeFilter(attribute, operator, value))
+    return filters
+
+
+def filter_products(queryset, filters):
+    """Restrict a Product queryset to products matching every filter, one indexed subquery each"""
+    for attribute_filter in filters:
+        queryset = queryset.filter(id__in=attribute_filter.matching_data().values('product_id'))
+    return queryset
+
+
+def parse_facet_params(params):
+    """Read ?facets=Price,RAM (or '*' for every attribute) and ?facet_buckets="""
+    names = [name.strip() for name in (params.get('facets') or '').split(',') if name.strip()]
+    try:
+        buckets = int(params.get('facet_buckets', FACET_BUCKETS))
+    except ValueError:
+        raise ValueError('facet_buckets must be an integer')
+    if not 1 <= buckets <= MAX_FACET_BUCKETS:
+        raise ValueError(f'facet_buckets must be between 1 and {MAX_FACET_BUCKETS}')
+    return names, buckets
+
+
+def resolve_facets(names, attributes):
+    """Attributes to compute facets for, in request order; '*' selects all of them"""
+    if '*' in names:
+        return list(attributes.values())
+    lowercase = {name.lower(): attribute for name, attribute in attributes.items()}
+    resolved = []
+    for name in names:
+        attribute = _resolve_attribute(name, attributes, lowercase)
+        if attribute not in resolved:
+            resolved.append(attribute)
+    return resolved
+
+
+def compute_facets(products, attributes, buckets=FACET_BUCKETS):
+    """
+    Facet counts over a Product queryset: equal-width histograms for numbers,
+    true/false counts for booleans and the most common values for text.
+
+    A small aggregate finds the range of each number attribute, then one
+    grouped query counts every attribute's buckets and values together.
+    """
+    data = ProductAttributeData.objects.filter(product__in=products, attribute__in=attributes)
+    number_ids = [attribute.id for attribute in attributes if attribute.data_type == 'number']
+    boolean_ids = [attribute.id for attribute in attributes if attribute.data_type == 'boolean']
+    text_ids = [attribute.id for attribute in attributes if attribute.data_type == 'text']
+
+    ranges = {}
+    if number_ids:
+        ranges = {
+            row['attribute_id']: (row['low'], row['high'])
+            for row in data.filter(attribute_id__in=number_ids, numeric_value__isnull=False)
+            .values('attribute_id').annotate(low=Min('numeric_value'), high=Max('numeric_value'))
+        }
+
+    # Numbers group by bucket index and booleans by their 0/1 numeric value; text groups by lowercase value
+    whens = [When(attribute_id__in=boolean_ids, then=F('numeric_value'))] if boolean_ids else []
+    for attribute_id, (low, high) in ranges.items():
+        width = (high - low) / buckets
+        index = Least(Floor((F('numeric_value') - Value(low)) / Value(width)), Value(buckets - 1.0)) if width else Value(0.0)
+        whens.append(When(attribute_id=attribute_id, then=index))
+    bucket = Case(*whens, output_field=FloatField()) if whens else Value(None, output_field=FloatField())
+    text = Value(None, output_field=TextField())
+    if text_ids:
+        text = Case(When(attribute_id__in=text_ids, then=Lower('value')), output_field=TextField())
+
+    counts = {attribute.id: {} for attribute in attributes}
+    for row in data.values('attribute_id', bucket=bucket, text=text).annotate(count=Count('id')):
+        key = row['text'] if row['attribute_id'] in text_ids else row['bucket']
+        if key is not None:
+            counts[row['attribute_id']][key] = row['count']
+
+    facets = {}
+    for attribute in attributes:
+        found = counts[attribute.id]
+        facet = {'data_type': attribute.data_type, 'unit': attribute.unit}
+        if attribute.data_type == 'boolean':
+            facet.update({'true': found.get(1.0, 0), 'false': found.get(0.0, 0)})
+        elif attribute.data_type == 'number':
+            facet.update({'min': None, 'max': None, 'buckets': []})
+            if attribute.id in ranges:
+                low, high = ranges[attribute.id]
+                width = (high - low) / buckets
+                facet.update({'min': low, 'max': high, 'buckets': [
+                    {'min': low + i * width, 'max': high if i == buckets - 1 else low + (i + 1) * width,
+                     'count': found.get(float(i), 0)}
+                    for i in range(buckets if width else 1)
+                ]})
+        else:
+            top = sorted(found.items(), key=lambda item: (-item[1], item[0]))[:FACET_TOP_VALUES]
+            facet.update({'distinct': len(found), 'values': [{'value': value, 'count': count} for value, count in top]})
+        facets[attribute.name] = facet
+    return facets
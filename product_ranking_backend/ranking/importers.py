@@ -0,0 +1,213 @@
+"""Streaming bulk import of products and their attribute values from CSV or JSON Lines"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from .cache import bump_version
+from .models import Product, ProductAttributeData
+
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+RESERVED_COLUMNS = ('name', 'description')
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    """A problem with a single import row"""
+
+
+class ImportAborted(ValueError):
+    """The upload could not be read to the end; report covers the batches committed before that"""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+def detect_format(requested, filename='', content_type=''):
+    """Pick the import format from an explicit choice, the file extension or the content type"""
+    if requested:
+        return requested if requested in IMPORT_FORMATS else None
+    filename = (filename or '').lower()
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if filename.endswith('.csv') or content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if filename.endswith(('.jsonl', '.ndjson')) or content_type in ('application/x-ndjson', 'application/jsonl',
+                                                                     'application/x-jsonlines'):
+        return 'jsonl'
+    return None
+
+
+def _text_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def iter_csv_rows(stream):
+    """
+    Yield (line_number, row) from a wide CSV: a 'name' column, an optional
+    'description' column and one column per attribute name.
+    """
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames or 'name' not in reader.fieldnames:
+        raise ValueError("CSV header must contain a 'name' column")
+    for row in reader:
+        values = {
+            column: value for column, value in row.items()
+            if column not in RESERVED_COLUMNS and column is not None and value not in (None, '')
+        }
+        yield reader.line_num, {
+            'name': (row.get('name') or '').strip(),
+            'description': row.get('description') or None,
+            'values': values,
+        }
+
+
+def iter_jsonl_rows(stream):
+    """Yield (line_number, row) from JSON Lines objects like {"name", "description", "attributes": {...}}"""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+            if not isinstance(obj, dict):
+                raise ValueError('Expected a JSON object')
+            attributes = obj.get('attributes') or {}
+            if not isinstance(attributes, dict):
+                raise ValueError("'attributes' must be an object")
+            for key, value in attributes.items():
+                if value is not None and not isinstance(value, (str, int, float, bool)):
+                    raise ValueError(f"Value of '{key}' must be a string, number or boolean")
+        except ValueError as e:
+            yield line_number, RowError(str(e))
+            continue
+        yield line_number, {
+            'name': str(obj.get('name') or '').strip(),
+            'description': obj.get('description'),
+            'values': {key: _text_value(value) for key, value in attributes.items() if value is not None},
+        }
+
+
+class _ReadAdapter(io.RawIOBase):
+    """Expose any object with read() (an upload, the request itself) as a raw binary stream"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_rows(binary_stream, import_format):
+    """Decode a binary upload and iterate its rows lazily"""
+    text = io.TextIOWrapper(io.BufferedReader(_ReadAdapter(binary_stream)), encoding='utf-8-sig', newline='')
+    if import_format == 'csv':
+        return iter_csv_rows(text)
+    return iter_jsonl_rows(text)
+
+
+def import_products(comparison, rows, batch_size=1000):
+    """
+    Create products and attribute values from parsed rows in batched transactions.
+
+    Attribute names are resolved with a single query; each batch costs one
+    query for duplicate names and one bulk INSERT per table. Rows with errors
+    are skipped and reported, the rest are imported. Each committed batch
+    bumps the comparison version. If the upload cannot be read to the end
+    (bad encoding, malformed CSV) or a batch conflicts with products created
+    concurrently, ImportAborted carries the report of the committed batches
+    and the row where the import stopped.
+    """
+    attributes = {attribute.name: attribute for attribute in comparison.attributes.all()}
+    report = {'created': 0, 'values': 0, 'error_count': 0, 'errors': [], 'imported_through_row': 0}
+    seen_names = set()
+    last_line = 0
+    batch_start = None
+
+    def add_error(line_number, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': line_number, 'error': message})
+
+    def tracked(rows):
+        nonlocal last_line
+        for line_number, row in rows:
+            last_line = line_number
+            yield line_number, row
+
+    rows = tracked(rows)
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            batch_start = batch[0][0]
+
+            valid = []
+            for line_number, row in batch:
+                if isinstance(row, Exception):
+                    add_error(line_number, str(row))
+                    continue
+                if not row['name']:
+                    add_error(line_number, 'Name is required')
+                    continue
+                if len(row['name']) > Product._meta.get_field('name').max_length:
+                    add_error(line_number, 'Name is too long')
+                    continue
+                unknown = sorted(set(row['values']) - set(attributes))
+                if unknown:
+                    add_error(line_number, f"Unknown attributes: {', '.join(unknown)}")
+                    continue
+                if row['name'] in seen_names:
+                    add_error(line_number, f"Duplicate product name '{row['name']}'")
+                    continue
+                seen_names.add(row['name'])
+                valid.append((line_number, row))
+
+            existing = set(
+                Product.objects.filter(comparison=comparison, name__in=[row['name'] for _, row in valid])
+                .values_list('name', flat=True)
+            )
+            products, product_rows = [], []
+            for line_number, row in valid:
+                if row['name'] in existing:
+                    add_error(line_number, f"Product '{row['name']}' already exists")
+                    continue
+                products.append(Product(comparison=comparison, name=row['name'], description=row['description']))
+                product_rows.append(row)
+
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+                attribute_data = []
+                for product, row in zip(products, product_rows):
+                    for attribute_name, value in row['values'].items():
+                        attribute = attributes[attribute_name]
+                        data = ProductAttributeData(product=product, attribute=attribute, value=value)
+                        data.set_typed_values(attribute)
+                        attribute_data.append(data)
+                ProductAttributeData.objects.bulk_create(attribute_data)
+                # Committed batches stay even if a later one fails, so cached results must not outlive them
+                if products:
+                    bump_version(comparison.id)
+
+            report['created'] += len(products)
+            report['values'] += len(attribute_data)
+            report['imported_through_row'] = batch[-1][0]
+    except IntegrityError as e:
+        # The whole batch was rolled back; its first row is where to resume (for CSV, line 1 is the header)
+        report['stopped_at_row'] = batch_start
+        raise ImportAborted('Products with the same names were created concurrently; retry the remaining rows', report) from e
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        report['stopped_at_row'] = last_line + 1
+        message = f'Could not read the upload past row {last_line}: {e}' if last_line else str(e)
+        raise ImportAborted(message, report) from e
+    return report
@@ -0,0 +1,270 @@
+"""
+Background jobs for heavy ranking computations, with the database as the queue.
+
+enqueue() stores a Job; manage.py run_job_worker claims queued jobs with
+a conditional UPDATE and runs them in a pool of worker processes, so
+scoring, Pareto layers, exports and imports do not hold a web worker.
+
+A job's key digests its kind, params and the versions of the comparisons
+it reads. While those versions stand, queueing the same computation
+returns the existing job, queued, running or done with its result, so
+duplicate requests share one computation. Any write bumps the version and
+the next request queues a fresh job. Imports are never shared.
+"""
+import hashlib
+import json
+import logging
+import shutil
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .exporters import FILE_EXTENSIONS, export_comparisons
+from .importers import ImportAborted, import_products, open_rows
+from .models import Comparison, Job
+
+
+logger = logging.getLogger(__name__)
+
+# Jobs whose result is the response of a read endpoint, computed by running its view
+VIEW_JOBS = {
+    'results': 'ranking.views.get_ranking_results',
+    'pareto': 'ranking.views.get_pareto_frontier',
+}
+# Kinds queued through POST /api/jobs/; imports are queued by the import endpoint
+QUEUED_KINDS = (*VIEW_JOBS, 'export')
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class JobError(Exception):
+    """A job that cannot complete; the message is stored as the job's error"""
+
+
+def files_dir():
+    """Directory for job uploads and outputs, created on first use"""
+    directory = Path(settings.RANKING_JOB_FILES_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def job_file(job, extension):
+    return files_dir() / f'job-{job.pk}.{extension}'
+
+
+def normalize_params(raw):
+    """Turn {'sort_by': 'Price', 'filter': ['RAM>=16']} into sorted {name: [str values]}"""
+    if raw is None:
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError("'params' must be an object of query parameters")
+    params = {}
+    for name, values in sorted(raw.items()):
+        values = values if isinstance(values, list) else [values]
+        if not all(isinstance(value, (str, int, float, bool)) for value in values):
+            raise ValueError(f"Parameter '{name}' must be a string, number, boolean or a list of them")
+        params[name] = [str(value).lower() if isinstance(value, bool) else str(value) for value in values]
+    return params
+
+
+def job_key(kind, params, versions):
+    """Digest of everything a job's result depends on"""
+    payload = json.dumps([kind, sorted(params.items()), sorted(versions)], separators=(',', ':'))
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def enqueue(kind, comparison_id=None, params=None):
+    """
+    Queue a results, pareto or export job, or find the equal one at the current versions.
+
+    Returns (job, created). Raises Comparison.DoesNotExist for an unknown
+    comparison and ValueError for invalid arguments.
+    """
+    if kind not in QUEUED_KINDS:
+        raise ValueError(f"Invalid kind '{kind}', expected one of: {', '.join(QUEUED_KINDS)}")
+    params = normalize_params(params)
+    if comparison_id is not None:
+        try:
+            comparison_id = int(comparison_id)
+        except (TypeError, ValueError):
+            raise ValueError('comparison_id must be an integer')
+    elif kind in VIEW_JOBS:
+        raise ValueError(f"'{kind}' jobs need a comparison_id")
+
+    if kind in VIEW_JOBS and 'stream' in params:
+        raise ValueError('stream cannot be used in a job')
+    if kind == 'export':
+        params.setdefault('export_format', ['csv'])
+        # Checks the format up front; nothing is read until the export is iterated
+        export_comparisons([], params['export_format'][0])
+
+    comparisons = Comparison.objects.all() if comparison_id is None else Comparison.objects.filter(id=comparison_id)
+    versions = list(comparisons.values_list('id', 'version'))
+    if comparison_id is not None and not versions:
+        raise Comparison.DoesNotExist
+    key = job_key(kind, params, versions)
+
+    shared = Job.objects.filter(key=key).exclude(status='failed')
+    job = shared.first()
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            job = Job.objects.create(
+                kind=kind, comparison_id=comparison_id, params=params, key=key,
+                version=versions[0][1] if comparison_id is not None else None,
+            )
+    except IntegrityError:
+        # Queued by a concurrent request in the meantime
+        return shared.get(), False
+    return job, True
+
+
+def enqueue_import(comparison, stream, import_format, batch_size):
+    """Save an upload to the job files directory and queue its import"""
+    job = Job.objects.create(
+        kind='import', comparison=comparison, version=comparison.version,
+        params={'batch_size': [str(batch_size)], 'input_format': [import_format]},
+    )
+    try:
+        with open(job_file(job, 'upload'), 'wb') as f:
+            shutil.copyfileobj(stream, f, UPLOAD_CHUNK_SIZE)
+    except Exception:
+        job.delete()
+        raise
+    return job
+
+
+def claim_next(worker):
+    """
+    Mark the oldest runnable job running for this worker and return its id, or None.
+
+    Running jobs whose worker has not finished them within
+    RANKING_JOB_TIMEOUT seconds are taken over, since that worker most
+    likely died. Imports are not idempotent, so expired ones fail instead.
+    The conditional UPDATE lets only one worker claim a job.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.RANKING_JOB_TIMEOUT)
+    Job.objects.filter(kind='import', status='running', started_at__lt=expired).update(
+        status='failed', finished_at=timezone.now(),
+        error='The import did not finish in time; batches before that may be committed, check the products',
+    )
+    runnable = Q(status='queued') | Q(status='running', started_at__lt=expired)
+    candidates = Job.objects.filter(runnable).order_by('created_at', 'id').values_list('id', flat=True)
+    for job_id in candidates[:10]:
+        if Job.objects.filter(runnable, pk=job_id).update(status='running', worker=worker, started_at=timezone.now()):
+            return job_id
+    return None
+
+
+def _run_view(job):
+    request = HttpRequest()
+    request.method = 'GET'
+    # Tells views that queue large requests to compute this one
+    request.in_job = True
+    request.GET = QueryDict(mutable=True)
+    for name, values in job.params.items():
+        request.GET.setlist(name, values)
+    response = import_string(VIEW_JOBS[job.kind])(request, comparison_id=job.comparison_id)
+    if response.status_code != 200:
+        raise JobError(response.data.get('error', f'Request failed with status {response.status_code}'))
+    return response.data
+
+
+def _run_export(job):
+    if job.comparison_id is None:
+        comparison_ids = list(Comparison.objects.order_by('id').values_list('id', flat=True))
+    elif Comparison.objects.filter(id=job.comparison_id).exists():
+        comparison_ids = [job.comparison_id]
+    else:
+        raise JobError('Comparison not found')
+
+    export_format = job.params['export_format'][0]
+    path = job_file(job, FILE_EXTENSIONS[export_format])
+    size = 0
+    with open(path, 'wb') as f:
+        for data in export_comparisons(comparison_ids, export_format, settings.RANKING_EXPORT_CHUNK_SIZE):
+            f.write(data)
+            size += len(data)
+    job.result_file = path.name
+    return {'export_format': export_format, 'comparison_count': len(comparison_ids), 'size': size}
+
+
+def _run_import(job):
+    path = job_file(job, 'upload')
+    try:
+        comparison = Comparison.objects.get(id=job.comparison_id)
+        with open(path, 'rb') as f:
+            rows = open_rows(f, job.params['input_format'][0])
+            return import_products(comparison, rows, int(job.params['batch_size'][0]))
+    except Comparison.DoesNotExist:
+        raise JobError('Comparison not found')
+    except FileNotFoundError:
+        raise JobError('The uploaded file is no longer available')
+    except ImportAborted as e:
+        # The batches before the failure are committed; keep the report of them
+        job.result = e.report
+        raise JobError(str(e))
+    finally:
+        path.unlink(missing_ok=True)
+
+
+RUNNERS = {'results': _run_view, 'pareto': _run_view, 'export': _run_export, 'import': _run_import}
+
+
+def run_job(job_id):
+    """
+    Run a claimed job, storing its result or error; returns the final status.
+
+    The result is only stored while the job is still this run's claim: if
+    another worker took the job over meanwhile, its run is the one recorded
+    and 'taken over' is returned.
+    """
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    try:
+        job.result = RUNNERS[job.kind](job)
+        job.status = 'done'
+    except JobError as e:
+        job.status, job.error = 'failed', str(e)
+    except Exception as e:
+        logger.exception('Job %s failed', job_id)
+        job.status, job.error = 'failed', f'{e.__class__.__name__}: {e}'
+    claimed = Job.objects.filter(pk=job.pk, status='running', worker=job.worker, started_at=job.started_at).update(
+        status=job.status, result=job.result, result_file=job.result_file, error=job.error,
+        finished_at=timezone.now(),
+    )
+    close_old_connections()
+    if not claimed:
+        logger.warning('Job %s was taken over by another worker; discarding this run', job_id)
+        return 'taken over'
+    return job.status
+
+
+def fail_job(job_id, message, worker=None):
+    """Record a job whose worker process died, unless another worker has taken it over"""
+    jobs = Job.objects.filter(pk=job_id, status='running')
+    if worker is not None:
+        jobs = jobs.filter(worker=worker)
+    jobs.update(status='failed', error=message, finished_at=timezone.now())
+
+
+def prune_jobs():
+    """Delete jobs finished more than RANKING_JOB_RETENTION seconds ago and files left without a job"""
+    cutoff = timezone.now() - timedelta(seconds=settings.RANKING_JOB_RETENTION)
+    deleted, _ = Job.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff).delete()
+
+    files = {}
+    for path in files_dir().glob('job-*.*'):
+        job_id = path.name[len('job-'):].split('.', 1)[0]
+        if job_id.isdigit():
+            files.setdefault(int(job_id), []).append(path)
+    for job_id in set(files) - set(Job.objects.filter(id__in=list(files)).values_list('id', flat=True)):
+        for path in files[job_id]:
+            path.unlink(missing_ok=True)
+    return deleted
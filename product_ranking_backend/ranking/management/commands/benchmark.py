@@ -0,0 +1,107 @@
+import contextlib
+import json
+import sys
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ranking.benchmarks import (
+    SCENARIOS, TARGETS, compare_results, environment, run_benchmark, run_concurrency_benchmark
+)
+from ranking.synthetic import DEFAULT_TYPE_MIX, parse_type_mix, synthetic_comparisons
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the Django and Flask endpoints on synthetic data and report latency percentiles, '
+            'throughput and queries per request as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=['both', *TARGETS], default='both')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+        parser.add_argument('--comparisons', type=int, default=2)
+        parser.add_argument('--products', type=int, default=1000, help='Products per comparison')
+        parser.add_argument('--attributes', type=int, default=8, help='Attributes per comparison')
+        parser.add_argument('--types', default=DEFAULT_TYPE_MIX, help='Relative weights of attribute data types')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help='Also compare sync (WSGI threads) and async (ASGI) read views at this many '
+                                 'concurrent clients')
+        parser.add_argument('--threads', type=int, default=4, help='WSGI worker threads for --concurrency')
+        parser.add_argument('--output', '-o', help='Write results to this JSON file instead of standard output')
+        parser.add_argument('--baseline', help='Earlier results file to check for regressions')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative p50 latency increase over the baseline')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        if options['comparisons'] < 1 or options['products'] < 1 or options['attributes'] < 1:
+            raise CommandError('--comparisons, --products and --attributes must be at least 1')
+        if options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError('--requests must be at least 1 and --warmup not negative')
+        try:
+            type_mix = parse_type_mix(options['types'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        specs = list(synthetic_comparisons(
+            options['comparisons'], options['products'], options['attributes'], type_mix, seed=options['seed'],
+        ))
+        backends = list(TARGETS) if options['backend'] == 'both' else [options['backend']]
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'environment': environment(),
+            'config': {
+                key: options[key] for key in
+                ('comparisons', 'products', 'attributes', 'types', 'seed', 'requests', 'warmup')
+            },
+            'backends': {},
+        }
+        for backend in backends:
+            self.stderr.write(f'Benchmarking {backend}...')
+            # Keep stray prints from the views out of the JSON on stdout
+            with contextlib.redirect_stdout(sys.stderr):
+                report['backends'][backend] = run_benchmark(
+                    TARGETS[backend](), specs, scenarios, options['requests'], options['warmup'],
+                )
+
+        if options['concurrency'] > 0:
+            self.stderr.write(f"Benchmarking WSGI vs ASGI at concurrency {options['concurrency']}...")
+            with contextlib.redirect_stdout(sys.stderr):
+                report['concurrency'] = run_concurrency_benchmark(
+                    specs, options['concurrency'], options['requests'], options['threads'],
+                )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            for backend, results in report['backends'].items():
+                for scenario, result in results.items():
+                    if 'latency_ms' in result:
+                        self.stdout.write(
+                            f"{backend:8} {scenario:18} p50 {result['latency_ms']['p50']:9.3f}ms  "
+                            f"p95 {result['latency_ms']['p95']:9.3f}ms  {result['throughput_rps']:9.2f} req/s  "
+                            f"{result['queries']['mean']:6.2f} queries"
+                        )
+            if 'concurrency' in report:
+                for mode in ('wsgi', 'asgi'):
+                    result = report['concurrency'][mode]
+                    self.stdout.write(
+                        f"{mode:8} {'concurrent reads':18} p50 {result['latency_ms']['p50']:9.3f}ms  "
+                        f"p95 {result['latency_ms']['p95']:9.3f}ms  {result['throughput_rps']:9.2f} req/s"
+                    )
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = compare_results(json.load(f), report, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline'))
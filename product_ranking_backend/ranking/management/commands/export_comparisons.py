@@ -0,0 +1,44 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ranking.exporters import EXPORT_FORMATS, export_comparisons
+from ranking.models import Comparison
+
+
+class Command(BaseCommand):
+    help = 'Export comparisons as a wide products x attributes table (CSV, JSONL, Parquet or Arrow)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('comparison_ids', nargs='*', type=int, help='Comparisons to export (default: all)')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', dest='export_format')
+        parser.add_argument('--output', '-o', default='-', help="Output file, '-' for standard output")
+        parser.add_argument('--chunk-size', type=int, default=settings.RANKING_EXPORT_CHUNK_SIZE,
+                            help='Products loaded and written per chunk')
+
+    def handle(self, *args, comparison_ids, export_format, output, chunk_size, **options):
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if comparison_ids:
+            missing = set(comparison_ids) - set(Comparison.objects.filter(id__in=comparison_ids).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Comparisons not found: {', '.join(map(str, sorted(missing)))}")
+        else:
+            comparison_ids = list(Comparison.objects.order_by('id').values_list('id', flat=True))
+
+        try:
+            content = export_comparisons(comparison_ids, export_format, chunk_size)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if output == '-':
+            for data in content:
+                sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(output, 'wb') as f:
+            for data in content:
+                f.write(data)
+        self.stdout.write(self.style.SUCCESS(f'Exported {len(comparison_ids)} comparison(s) to {output}'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ranking.synthetic import DEFAULT_TYPE_MIX, create_comparison, parse_type_mix, synthetic_comparisons
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic comparisons with products and typed attribute values'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comparisons', type=int, default=1)
+        parser.add_argument('--products', type=int, default=1000, help='Products per comparison')
+        parser.add_argument('--attributes', type=int, default=8, help='Attributes per comparison')
+        parser.add_argument('--types', default=DEFAULT_TYPE_MIX,
+                            help="Relative weights of attribute data types, e.g. 'number:6,boolean:2,text:2'")
+        parser.add_argument('--missing', type=float, default=0.05, help='Fraction of values left empty')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if min(options['comparisons'], options['products'], options['attributes']) < 0:
+            raise CommandError('--comparisons, --products and --attributes must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if not 0 <= options['missing'] <= 1:
+            raise CommandError('--missing must be between 0 and 1')
+        try:
+            type_mix = parse_type_mix(options['types'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        specs = synthetic_comparisons(
+            options['comparisons'], options['products'], options['attributes'], type_mix,
+            options['missing'], options['seed'],
+        )
+        for spec in specs:
+            comparison = create_comparison(spec, options['batch_size'])
+            self.stdout.write(f'Created comparison {comparison.id}: {comparison.name}')
+        self.stdout.write(self.style.SUCCESS(f"Generated {options['comparisons']} comparison(s)"))
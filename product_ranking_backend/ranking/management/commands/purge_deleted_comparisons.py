@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ranking.deletion import run_deletion
+from ranking.models import ComparisonDeletion
+
+
+class Command(BaseCommand):
+    help = 'Remove the rows of deleted comparisons in batches, resuming failed or interrupted deletions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.RANKING_DELETION_BATCH_SIZE,
+                            help='Rows deleted per transaction')
+        parser.add_argument('--resume-running', action='store_true',
+                            help='Also take deletions left running, e.g. by a server that was restarted mid-purge')
+
+    def handle(self, *args, batch_size, resume_running, **options):
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        statuses = ('pending', 'failed', 'running') if resume_running else ('pending', 'failed')
+        deletion_ids = ComparisonDeletion.objects.filter(status__in=statuses).order_by('requested_at', 'id').values_list('id', flat=True)
+
+        for deletion_id in list(deletion_ids):
+            try:
+                deletion = run_deletion(deletion_id, statuses, batch_size)
+            except Exception as e:
+                self.stderr.write(f'Deletion {deletion_id} failed: {e}')
+                continue
+            if deletion is not None:
+                self.stdout.write(f'Purged comparison {deletion.comparison_id} ({deletion.deleted_rows} rows)')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,92 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ranking.jobs import claim_next, fail_job, prune_jobs, run_job
+from ranking.workers import run_job as run_job_in_worker, setup_process
+
+
+# Seconds between removals of expired jobs and their files
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Run queued ranking jobs in a pool of worker processes, using the database as the queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.RANKING_JOB_PROCESSES or os.cpu_count(),
+                            help='Worker processes; 0 runs jobs one at a time in this process')
+        parser.add_argument('--poll-interval', type=float, default=settings.RANKING_JOB_POLL_INTERVAL,
+                            help='Seconds between queue polls while idle')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, processes, poll_interval, once, **options):
+        if processes < 0:
+            raise CommandError('--processes must be at least 0')
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.next_prune = 0
+        if processes == 0:
+            self._run_inline(poll_interval, once)
+        else:
+            self._run_pool(processes, poll_interval, once)
+
+    def _report(self, job_id, status):
+        self.stdout.write(f'Job {job_id} {status}')
+
+    def _idle(self, poll_interval):
+        if time.monotonic() >= self.next_prune:
+            pruned = prune_jobs()
+            if pruned:
+                self.stdout.write(f'Pruned {pruned} expired job(s)')
+            self.next_prune = time.monotonic() + PRUNE_INTERVAL
+        time.sleep(poll_interval)
+
+    def _run_inline(self, poll_interval, once):
+        while True:
+            job_id = claim_next(self.worker)
+            if job_id is None:
+                if once:
+                    return
+                self._idle(poll_interval)
+                continue
+            self._report(job_id, run_job(job_id))
+
+    def _run_pool(self, processes, poll_interval, once):
+        # Spawned workers set Django up themselves and open their own database connections
+        pool = ProcessPoolExecutor(
+            processes, mp_context=get_context('spawn'),
+            initializer=setup_process, initargs=(os.environ['DJANGO_SETTINGS_MODULE'],),
+        )
+        running = {}
+        with pool:
+            while True:
+                while len(running) < processes:
+                    job_id = claim_next(self.worker)
+                    if job_id is None:
+                        break
+                    running[pool.submit(run_job_in_worker, job_id)] = job_id
+                if not running:
+                    if once:
+                        return
+                    self._idle(poll_interval)
+                    continue
+
+                finished, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job_id = running.pop(future)
+                    try:
+                        self._report(job_id, future.result())
+                    except BrokenProcessPool as e:
+                        fail_job(job_id, f'Worker process died: {e}', self.worker)
+                        for other in running.values():
+                            fail_job(other, f'Worker process died: {e}', self.worker)
+                        raise CommandError('A worker process died; restart the worker')
+                    except Exception as e:
+                        fail_job(job_id, f'{e.__class__.__name__}: {e}', self.worker)
+                        self._report(job_id, 'failed')
@@ -0,0 +1,231 @@
+"""
+Materialized rankings, maintained incrementally on write.
+
+A RankingMaterialization stores every product's position in the ranking
+by one attribute and direction (missing values last, ties by product id)
+as ProductRank rows, so a page of results is an index range scan on
+position instead of a sort of the whole comparison.
+
+A materialization is valid while its version matches the comparison's.
+Writes go through record_changes(), which moves just the changed
+products to their new positions in the valid materializations and
+brings them along to the new version. Writes that are not recorded
+(bulk imports, deletions, attribute changes) only bump the comparison
+version, and the stale materializations are rebuilt on their next read.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.db.models.functions import Lower
+
+from .cache import bump_version
+from .models import Product, ProductAttributeData, ProductRank, RankingMaterialization
+from .ordering import SortKey, rank_products
+
+
+# Rank methods a materialization can answer; dense_rank would need distinct value counts
+RANK_METHODS = ('row_number', 'rank')
+
+
+def _value_field(attribute):
+    return 'text_value' if attribute.data_type == 'text' else 'numeric_value'
+
+
+def _sort_value(attribute, numeric_value, text_value):
+    """Stored values as the ranking results report them"""
+    if attribute.data_type == 'text':
+        return text_value
+    if attribute.data_type == 'boolean' and numeric_value is not None:
+        return bool(numeric_value)
+    return numeric_value
+
+
+def is_materializable(sort_keys, rank_method):
+    """Whether results in this ordering can be read from a materialization"""
+    return (
+        settings.RANKING_MATERIALIZED_RANKS and len(sort_keys) == 1
+        and not sort_keys[0].nulls_first and rank_method in RANK_METHODS
+    )
+
+
+def build(attribute, descending, version):
+    """(Re)compute a materialization from scratch, stamped with the given comparison version"""
+    ordered = rank_products(
+        Product.objects.filter(comparison_id=attribute.comparison_id),
+        [SortKey(attribute, descending)],
+    ).values_list('id', 'sort_value_0')
+    text = attribute.data_type == 'text'
+    with transaction.atomic():
+        materialization, _ = RankingMaterialization.objects.update_or_create(
+            attribute=attribute, descending=descending, defaults={'version': version}
+        )
+        materialization.ranks.all().delete()
+        ProductRank.objects.bulk_create([
+            ProductRank(
+                materialization=materialization, product_id=product_id, position=position,
+                numeric_value=None if text else value, text_value=value if text else None,
+            )
+            for position, (product_id, value) in enumerate(ordered.iterator(chunk_size=2000), start=1)
+        ], batch_size=1000)
+    return materialization
+
+
+def get_materialization(attribute, descending, version):
+    """The materialization for an attribute and direction at the given comparison version, rebuilt if stale"""
+    materialization = RankingMaterialization.objects.filter(attribute=attribute, descending=descending).first()
+    if materialization is None or materialization.version != version:
+        materialization = build(attribute, descending, version)
+    materialization.attribute = attribute
+    return materialization
+
+
+def _successor(ranks, field, descending, value, product_id, last_of_value=False):
+    """
+    The first row after (value, product_id) in ranking order, or None at the end.
+
+    Each step is a lookup on the (materialization, value, product) index:
+    the next product with the same value, else the first product of the
+    next value, else the first product without a value. last_of_value
+    skips the first step for a product known to have the highest id.
+    """
+    if value is not None:
+        if not last_of_value:
+            row = ranks.filter(**{field: value}, product_id__gt=product_id).order_by('product_id').first()
+            if row is not None:
+                return row
+        beyond = ranks.filter(**{f'{field}__lt' if descending else f'{field}__gt': value})
+        next_value = beyond.aggregate(value=Max(field) if descending else Min(field))['value']
+        if next_value is not None:
+            return ranks.filter(**{field: next_value}).order_by('product_id').first()
+        product_id = 0
+    return ranks.filter(**{f'{field}__isnull': True}, product_id__gt=product_id).order_by('product_id').first()
+
+
+def _move(materialization, product_id, value):
+    """
+    Move a product to the position of its new value.
+
+    Products between the old and new position shift by one in a single
+    UPDATE; nothing is re-sorted. Returns False if the product has no row.
+    """
+    field = _value_field(materialization.attribute)
+    row = materialization.ranks.filter(product_id=product_id).first()
+    if row is None:
+        return False
+    others = materialization.ranks.exclude(product_id=product_id)
+    successor = _successor(others, field, materialization.descending, value, product_id)
+    if successor is None:
+        position = materialization.ranks.aggregate(last=Max('position'))['last']
+    else:
+        position = successor.position - 1 if successor.position > row.position else successor.position
+
+    if position > row.position:
+        others.filter(position__gt=row.position, position__lte=position).update(position=F('position') - 1)
+    elif position < row.position:
+        others.filter(position__gte=position, position__lt=row.position).update(position=F('position') + 1)
+    row.position = position
+    setattr(row, field, value)
+    row.save(update_fields=['position', field])
+    return True
+
+
+def _insert(materialization, product_id, value):
+    """Add a row for a new product at the position of its value, shifting the rows after it by one"""
+    field = _value_field(materialization.attribute)
+    ranks = materialization.ranks
+    # New products have the highest ids, so they come after every product with the same value
+    successor = _successor(ranks, field, materialization.descending, value, product_id, last_of_value=value is not None)
+    if successor is None:
+        position = (ranks.aggregate(last=Max('position'))['last'] or 0) + 1
+    else:
+        position = successor.position
+        ranks.filter(position__gte=position).update(position=F('position') + 1)
+    ProductRank.objects.create(materialization=materialization, product_id=product_id, position=position,
+                               **{field: value})
+
+
+def _current_values(cells):
+    """Sort values of (product_id, attribute_id) cells as stored now; deleted cells have None"""
+    values = {cell: (None, None) for cell in cells}
+    rows = ProductAttributeData.objects.filter(
+        product_id__in={product_id for product_id, _ in cells},
+        attribute_id__in={attribute_id for _, attribute_id in cells},
+    ).values_list('product_id', 'attribute_id', 'numeric_value', Lower('value'))
+    for product_id, attribute_id, numeric_value, text_value in rows:
+        if (product_id, attribute_id) in values:
+            values[(product_id, attribute_id)] = (numeric_value, text_value)
+    return values
+
+
+def record_changes(comparison_id, cells=(), added_product_ids=()):
+    """
+    Bump a comparison's version after a write, keeping its valid materializations valid.
+
+    cells are the (product_id, attribute_id) pairs whose values changed (or
+    were deleted) and added_product_ids the products created, whose values
+    (if any) are among cells.
+    Writes touching more than RANKING_MATERIALIZED_MAX_MOVES of them leave the
+    materializations to be rebuilt on read instead.
+    """
+    cells = list(dict.fromkeys(cells))
+    with transaction.atomic():
+        valid = list(
+            RankingMaterialization.objects
+            .filter(attribute__comparison_id=comparison_id, version=F('attribute__comparison__version'))
+            .select_related('attribute')
+        )
+        if valid and len(cells) + len(added_product_ids) <= settings.RANKING_MATERIALIZED_MAX_MOVES:
+            added = set(added_product_ids)
+            values = _current_values(cells) if cells else {}
+            # Materializations whose products all moved follow the comparison to its next version
+            current = []
+            for materialization in valid:
+                text = materialization.attribute.data_type == 'text'
+                moves = {
+                    product_id: text_value if text else numeric_value
+                    for (product_id, attribute_id), (numeric_value, text_value) in values.items()
+                    if attribute_id == materialization.attribute_id
+                }
+                # New products are inserted at their place, in id order so each goes after the ones before it
+                for product_id in sorted(added):
+                    _insert(materialization, product_id, moves.pop(product_id, None))
+                if all(_move(materialization, product_id, value) for product_id, value in moves.items()):
+                    current.append(materialization.id)
+            RankingMaterialization.objects.filter(id__in=current).update(version=F('version') + 1)
+        bump_version(comparison_id)
+
+
+def page(materialization, rank_method='row_number', after=None, limit=None):
+    """
+    Return ([(product_id, [sort value])], start) for a page of the ranking.
+
+    'after' is a keyset cursor state ({'value': [sort value], 'id'});
+    start is the assign_ranks() state just before the first row, so the
+    page's ranks continue from the materialized positions.
+    """
+    attribute = materialization.attribute
+    field = _value_field(attribute)
+    columns = ('product_id', 'position', 'numeric_value', 'text_value')
+    ranks = materialization.ranks.order_by('position')
+    if after is not None:
+        value = after['value'][0]
+        last = materialization.ranks.filter(product_id=after['id']).values_list(*columns).first()
+        if last is not None and _sort_value(attribute, *last[2:]) == value:
+            ranks = ranks.filter(position__gt=last[1])
+        else:
+            # The cursor's product moved since the page was issued; continue from its old sort key
+            successor = _successor(materialization.ranks, field, materialization.descending, value, after['id'])
+            ranks = ranks.filter(position__gte=successor.position) if successor else ranks.none()
+
+    rows = list((ranks[:limit] if limit else ranks).values_list(*columns))
+    results = [(product_id, [_sort_value(attribute, *values)]) for product_id, _, *values in rows]
+    if not rows:
+        return results, None
+    position, first_value = rows[0][1], results[0][1][0]
+    rank = position - 1
+    if rank_method == 'rank' and position > 1:
+        # Products tied with the first row share the rank of the first of them
+        stored = rows[0][3] if field == 'text_value' else rows[0][2]
+        tied = materialization.ranks.filter(**{f'{field}__isnull': True} if stored is None else {field: stored})
+        rank = tied.aggregate(first=Min('position'))['first']
+    return results, {'position': position - 1, 'value': [first_value], 'rank': rank}
@@ -0,0 +1,82 @@
+"""In-process request metrics: per-view histograms of time and query counts"""
+import bisect
+import threading
+
+
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket counts are reported cumulatively like Prometheus 'le' buckets"""
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        buckets, total = [], 0
+        for bound, count in zip((*self.bounds, '+Inf'), self.counts):
+            total += count
+            buckets.append([bound, total])
+        return {'count': self.count, 'sum': round(self.sum, 3), 'buckets': buckets}
+
+
+class MetricsRegistry:
+    """Histograms per (view, metric), safe to update from several threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, values):
+        """Record one request: values maps metric names to numbers; '*_ms' metrics use time buckets"""
+        with self._lock:
+            histograms = self._views.setdefault(view, {'over_budget': 0})
+            for metric, value in values.items():
+                histogram = histograms.get(metric)
+                if histogram is None:
+                    histogram = histograms[metric] = Histogram(
+                        TIME_BUCKETS_MS if metric.endswith('_ms') else QUERY_BUCKETS
+                    )
+                histogram.observe(value)
+
+    def over_budget(self, view):
+        with self._lock:
+            self._views.setdefault(view, {'over_budget': 0})['over_budget'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: {
+                    metric: value.as_dict() if isinstance(value, Histogram) else value
+                    for metric, value in histograms.items()
+                }
+                for view, histograms in sorted(self._views.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(timings, queries=None):
+    """Server-Timing header value from {name: milliseconds}; the db entry describes the query count"""
+    parts = []
+    for name, duration in timings.items():
+        part = f'{name};dur={duration:.2f}'
+        if name == 'db' and queries is not None:
+            part += f';desc="{queries} queries"'
+        parts.append(part)
+    return ', '.join(parts)
@@ -0,0 +1,117 @@
+"""Per-request instrumentation: query count, DB, serialization and total time"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from .metrics import registry, server_timing
+
+
+logger = logging.getLogger('ranking.metrics')
+
+
+class _QueryTimer:
+    """Database execute wrapper counting queries and the time spent in them"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def _install_wrapper(timer):
+    connection.execute_wrappers.append(timer)
+
+
+def _remove_wrapper(timer):
+    connection.execute_wrappers.remove(timer)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record per-view query count, DB time, serialization (render) time and
+    total time of every request.
+
+    Timings are sent as a Server-Timing header, logged to 'ranking.metrics'
+    and collected in the in-process registry served by the metrics endpoint.
+    Requests issuing more than settings.RANKING_QUERY_BUDGET queries are
+    logged as warnings, which is how N+1 regressions show up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        request._serialize_seconds = 0.0
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        return self._finish(request, response, timer, started)
+
+    async def __acall__(self, request):
+        # The ORM runs in the request's sync worker thread, whose connection is not the event loop's
+        timer = _QueryTimer()
+        request._serialize_seconds = 0.0
+        started = time.perf_counter()
+        await sync_to_async(_install_wrapper)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_remove_wrapper)(timer)
+        return self._finish(request, response, timer, started)
+
+    def _finish(self, request, response, timer, started):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = (match.url_name or match.route) if match else 'unresolved'
+        db_ms, serialize_ms, total_ms = timer.seconds * 1000, request._serialize_seconds * 1000, total * 1000
+        timings = {
+            'db': db_ms,
+            'serialize': serialize_ms,
+            'app': max(total_ms - db_ms - serialize_ms, 0.0),
+            'total': total_ms,
+        }
+        response['Server-Timing'] = server_timing(timings, timer.queries)
+        registry.observe(view, {
+            'queries': timer.queries, 'db_ms': db_ms, 'serialize_ms': serialize_ms, 'total_ms': total_ms,
+        })
+
+        logger.info(
+            'method=%s path=%s view=%s status=%s queries=%d db_ms=%.2f serialize_ms=%.2f total_ms=%.2f',
+            request.method, request.path, view, response.status_code, timer.queries, db_ms, serialize_ms, total_ms,
+        )
+        budget = settings.RANKING_QUERY_BUDGET
+        if budget is not None and timer.queries > budget:
+            registry.over_budget(view)
+            logger.warning(
+                'Query budget exceeded: view=%s path=%s queries=%d budget=%d',
+                view, request.path, timer.queries, budget,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook; time it with a post-render callback
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._serialize_seconds += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
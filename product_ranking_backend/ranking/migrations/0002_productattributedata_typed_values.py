@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:23
+
+import math
+
+from django.db import migrations, models
+
+
+# Frozen copy of ranking.values as of this migration, so later changes to the parser do not change it
+
+BOOLEAN_TRUE_VALUES = ('true', '1', 'yes', 'on')
+BOOLEAN_FALSE_VALUES = ('false', '0', 'no', 'off')
+
+
+def parse_numeric(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower() if value is not None else ''
+    if text in BOOLEAN_TRUE_VALUES:
+        return True
+    if text in BOOLEAN_FALSE_VALUES:
+        return False
+    return None
+
+
+def typed_values(value, data_type):
+    if data_type == 'boolean':
+        boolean = parse_boolean(value)
+        return (None if boolean is None else float(boolean)), boolean
+    return parse_numeric(value), None
+
+
+def fill_typed_values(apps, schema_editor):
+    ProductAttributeData = apps.get_model('ranking', 'ProductAttributeData')
+    batch = []
+    for row in ProductAttributeData.objects.select_related('attribute').only('id', 'value', 'attribute__data_type').iterator(chunk_size=2000):
+        row.numeric_value, row.boolean_value = typed_values(row.value, row.attribute.data_type)
+        batch.append(row)
+        if len(batch) >= 2000:
+            ProductAttributeData.objects.bulk_update(batch, ['numeric_value', 'boolean_value'])
+            batch = []
+    if batch:
+        ProductAttributeData.objects.bulk_update(batch, ['numeric_value', 'boolean_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productattributedata',
+            name='boolean_value',
+            field=models.BooleanField(blank=True, editable=False, help_text='Value parsed as a boolean, filled in on save', null=True),
+        ),
+        migrations.AddField(
+            model_name='productattributedata',
+            name='numeric_value',
+            field=models.FloatField(blank=True, editable=False, help_text='Value parsed as a number, filled in on save', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='productattributedata',
+            index=models.Index(fields=['attribute', 'numeric_value'], name='ranking_pad_attr_numeric_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productattributedata',
+            index=models.Index(fields=['attribute', 'boolean_value'], name='ranking_pad_attr_boolean_idx'),
+        ),
+        migrations.RunPython(fill_typed_values, migrations.RunPython.noop),
+    ]
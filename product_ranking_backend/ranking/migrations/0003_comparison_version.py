@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0002_productattributedata_typed_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comparison',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped on every write to the comparison or its data, used for caching'),
+        ),
+    ]
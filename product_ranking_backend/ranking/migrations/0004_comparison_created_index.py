@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0003_comparison_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comparison',
+            index=models.Index(fields=['created_at', 'id'], name='ranking_comparison_created_idx'),
+        ),
+    ]
@@ -0,0 +1,144 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:53
+
+import math
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copy of ranking.values as of this migration, so later changes to the parser do not change it
+
+BOOLEAN_TRUE_VALUES = ('true', '1', 'yes', 'on')
+BOOLEAN_FALSE_VALUES = ('false', '0', 'no', 'off')
+
+UNIT_DIMENSIONS = {
+    'data': {
+        'B': 1, 'KB': 1e3, 'MB': 1e6, 'GB': 1e9, 'TB': 1e12, 'PB': 1e15,
+        'KiB': 2 ** 10, 'MiB': 2 ** 20, 'GiB': 2 ** 30, 'TiB': 2 ** 40,
+    },
+    'frequency': {'Hz': 1, 'kHz': 1e3, 'MHz': 1e6, 'GHz': 1e9},
+    'length': {'m': 1, 'mm': 1e-3, 'cm': 1e-2, 'km': 1e3, 'in': 0.0254, 'inch': 0.0254, '"': 0.0254, 'ft': 0.3048},
+    'mass': {'kg': 1, 'mg': 1e-6, 'g': 1e-3, 'lb': 0.45359237, 'lbs': 0.45359237, 'oz': 0.028349523125},
+    'time': {'s': 1, 'ms': 1e-3, 'sec': 1, 'min': 60, 'h': 3600, 'hr': 3600},
+    'power': {'W': 1, 'mW': 1e-3, 'kW': 1e3},
+    'energy': {'Wh': 1, 'kWh': 1e3},
+    'charge': {'mAh': 1, 'Ah': 1e3},
+    'currency': {'USD': 1, 'EUR': 1.08, 'GBP': 1.27, 'CHF': 1.13, 'CAD': 0.73, 'AUD': 0.66, 'JPY': 0.0067, 'CNY': 0.14, 'INR': 0.012},
+}
+CURRENCY_SYMBOLS = {'$': 'USD', '€': 'EUR', '£': 'GBP', '¥': 'JPY', '₹': 'INR'}
+
+QUANTITY_PATTERN = re.compile(
+    r'^\s*(?P<symbol>[^\w\s.+-])?\s*'
+    r'(?P<number>[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)?(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+    r'\s*(?P<unit>[^\d\s.,+-].*?)?\s*$'
+)
+
+
+def unit_table():
+    dimensions = {dimension: dict(factors) for dimension, factors in UNIT_DIMENSIONS.items()}
+    dimensions['currency'].update(getattr(settings, 'RANKING_CURRENCY_RATES', {}))
+    units = {
+        name: (dimension, float(factor))
+        for dimension, factors in dimensions.items() for name, factor in factors.items()
+    }
+    names = {}
+    for name in units:
+        names.setdefault(name.lower(), []).append(name)
+    aliases = {alias: found[0] for alias, found in names.items() if len(found) == 1}
+    return units, aliases
+
+
+def parse_numeric(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def lookup_unit(units, unit):
+    units, aliases = units
+    if not unit:
+        return None
+    unit = unit.strip()
+    if unit in units:
+        return units[unit]
+    if unit == unit.lower() and unit in aliases:
+        return units[aliases[unit]]
+    return None
+
+
+def parse_quantity(units, value):
+    number = parse_numeric(value)
+    if number is not None:
+        return number, None
+    if value is None or isinstance(value, bool):
+        return None
+    match = QUANTITY_PATTERN.match(str(value))
+    if match is None or not any(c.isdigit() for c in match.group('number')):
+        return None
+    number = parse_numeric(match.group('number').replace(',', ''))
+    symbol, unit = match.group('symbol'), match.group('unit')
+    if symbol is not None:
+        if symbol not in CURRENCY_SYMBOLS or (
+                unit and lookup_unit(units, unit) != lookup_unit(units, CURRENCY_SYMBOLS[symbol])):
+            return None
+        unit = CURRENCY_SYMBOLS[symbol]
+    return (number, unit) if number is not None else None
+
+
+def canonical_number(units, value, unit=None):
+    quantity = parse_quantity(units, value)
+    if quantity is None:
+        return None
+    number, value_unit = quantity
+    if value_unit is None:
+        return number
+    source, target = lookup_unit(units, value_unit), lookup_unit(units, unit)
+    if source is None or target is None:
+        if unit and (value_unit.strip() == unit.strip() or (
+                source is None and target is None and value_unit.strip().lower() == unit.strip().lower())):
+            return number
+        return number * source[1] if source is not None and not unit else None
+    if source[0] != target[0]:
+        return None
+    return parse_numeric(f'{number * source[1] / target[1]:.12g}')
+
+
+def fill_canonical_values(apps, schema_editor):
+    ProductAttributeData = apps.get_model('ranking', 'ProductAttributeData')
+    units = unit_table()
+    batch = []
+    rows = (
+        ProductAttributeData.objects.exclude(attribute__data_type='boolean')
+        .select_related('attribute').only('id', 'value', 'numeric_value', 'attribute__data_type', 'attribute__unit')
+    )
+    for row in rows.iterator(chunk_size=2000):
+        numeric_value = canonical_number(units, row.value, row.attribute.unit)
+        if numeric_value != row.numeric_value:
+            row.numeric_value = numeric_value
+            batch.append(row)
+        if len(batch) >= 2000:
+            ProductAttributeData.objects.bulk_update(batch, ['numeric_value'])
+            batch = []
+    if batch:
+        ProductAttributeData.objects.bulk_update(batch, ['numeric_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0004_comparison_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productattributedata',
+            name='numeric_value',
+            field=models.FloatField(blank=True, editable=False, help_text="Value parsed as a number in the attribute's unit, filled in on save", null=True),
+        ),
+        migrations.RunPython(fill_canonical_values, migrations.RunPython.noop),
+    ]
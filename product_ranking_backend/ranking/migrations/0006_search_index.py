@@ -0,0 +1,140 @@
+from django.db import DatabaseError, migrations, transaction
+
+
+# Rows are keyed by rowid = object id * 4 + kind code (1 comparison, 2 product, 3 text value),
+# so the triggers below update single rows by rowid
+INDEX_COLUMNS = 'rowid, kind, comparison_id, product_id, attribute_id, name, description'
+
+TEXT_VALUES = '''
+    SELECT d.id * 4 + 3, 'value', p.comparison_id, d.product_id, d.attribute_id, d.value, NULL
+    FROM ranking_productattributedata d
+    JOIN ranking_product p ON p.id = d.product_id
+    JOIN ranking_attribute a ON a.id = d.attribute_id
+    WHERE a.data_type = 'text'
+'''
+
+CREATE_SQL = [
+    '''
+    CREATE VIRTUAL TABLE ranking_search_index USING fts5(
+        kind UNINDEXED, comparison_id UNINDEXED, product_id UNINDEXED, attribute_id UNINDEXED,
+        name, description,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    ''',
+    f'''
+    CREATE TRIGGER ranking_search_comparison_insert AFTER INSERT ON ranking_comparison BEGIN
+        INSERT INTO ranking_search_index ({INDEX_COLUMNS})
+        VALUES (new.id * 4 + 1, 'comparison', new.id, NULL, NULL, new.name, new.description);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER ranking_search_comparison_update AFTER UPDATE OF name, description ON ranking_comparison BEGIN
+        DELETE FROM ranking_search_index WHERE rowid = old.id * 4 + 1;
+        INSERT INTO ranking_search_index ({INDEX_COLUMNS})
+        VALUES (new.id * 4 + 1, 'comparison', new.id, NULL, NULL, new.name, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER ranking_search_comparison_delete AFTER DELETE ON ranking_comparison BEGIN
+        DELETE FROM ranking_search_index WHERE rowid = old.id * 4 + 1;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER ranking_search_product_insert AFTER INSERT ON ranking_product BEGIN
+        INSERT INTO ranking_search_index ({INDEX_COLUMNS})
+        VALUES (new.id * 4 + 2, 'product', new.comparison_id, new.id, NULL, new.name, new.description);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER ranking_search_product_update AFTER UPDATE OF name, description ON ranking_product BEGIN
+        DELETE FROM ranking_search_index WHERE rowid = old.id * 4 + 2;
+        INSERT INTO ranking_search_index ({INDEX_COLUMNS})
+        VALUES (new.id * 4 + 2, 'product', new.comparison_id, new.id, NULL, new.name, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER ranking_search_product_delete AFTER DELETE ON ranking_product BEGIN
+        DELETE FROM ranking_search_index WHERE rowid = old.id * 4 + 2;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER ranking_search_value_insert AFTER INSERT ON ranking_productattributedata BEGIN
+        INSERT INTO ranking_search_index ({INDEX_COLUMNS}) {TEXT_VALUES} AND d.id = new.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER ranking_search_value_update AFTER UPDATE OF value, attribute_id ON ranking_productattributedata BEGIN
+        DELETE FROM ranking_search_index WHERE rowid = old.id * 4 + 3;
+        INSERT INTO ranking_search_index ({INDEX_COLUMNS}) {TEXT_VALUES} AND d.id = new.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER ranking_search_value_delete AFTER DELETE ON ranking_productattributedata BEGIN
+        DELETE FROM ranking_search_index WHERE rowid = old.id * 4 + 3;
+    END
+    ''',
+    # Only text values are indexed, so a data type change adds or removes an attribute's values
+    f'''
+    CREATE TRIGGER ranking_search_attribute_update AFTER UPDATE OF data_type ON ranking_attribute
+    WHEN old.data_type IS NOT new.data_type BEGIN
+        DELETE FROM ranking_search_index
+        WHERE rowid IN (SELECT id * 4 + 3 FROM ranking_productattributedata WHERE attribute_id = new.id);
+        INSERT INTO ranking_search_index ({INDEX_COLUMNS}) {TEXT_VALUES} AND d.attribute_id = new.id;
+    END
+    ''',
+    f'''
+    INSERT INTO ranking_search_index ({INDEX_COLUMNS})
+    SELECT id * 4 + 1, 'comparison', id, NULL, NULL, name, description FROM ranking_comparison
+    ''',
+    f'''
+    INSERT INTO ranking_search_index ({INDEX_COLUMNS})
+    SELECT id * 4 + 2, 'product', comparison_id, id, NULL, name, description FROM ranking_product
+    ''',
+    f'INSERT INTO ranking_search_index ({INDEX_COLUMNS}) {TEXT_VALUES}',
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS ranking_search_{name}'
+    for name in (
+        'comparison_insert', 'comparison_update', 'comparison_delete',
+        'product_insert', 'product_update', 'product_delete',
+        'value_insert', 'value_update', 'value_delete', 'attribute_update',
+    )
+] + ['DROP TABLE IF EXISTS ranking_search_index']
+
+
+def _has_fts5(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # FTS5 may also be loaded as an extension
+        try:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute('CREATE VIRTUAL TABLE temp.ranking_fts5_probe USING fts5(x)')
+                cursor.execute('DROP TABLE temp.ranking_fts5_probe')
+        except DatabaseError:
+            return False
+    return True
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 needs SQLite built with it; other databases keep the plain admin search and no search endpoint
+        if _has_fts5(schema_editor.connection):
+            for statement in statements:
+                schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0005_canonical_numeric_values'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
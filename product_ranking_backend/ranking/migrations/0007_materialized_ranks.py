@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingMaterialization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descending', models.BooleanField()),
+                ('version', models.PositiveIntegerField(help_text='Comparison version the ranks reflect; rebuilt on read when it falls behind')),
+                ('attribute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='materializations', to='ranking.attribute')),
+            ],
+            options={
+                'unique_together': {('attribute', 'descending')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(help_text="1-based position, the product's row_number rank")),
+                ('numeric_value', models.FloatField(blank=True, help_text='Sort value of number and boolean attributes', null=True)),
+                ('text_value', models.TextField(blank=True, help_text='Lowercased sort value of text attributes', null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ranking.product')),
+                ('materialization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranks', to='ranking.rankingmaterialization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['materialization', 'position'], name='ranking_rank_position_idx'), models.Index(fields=['materialization', 'numeric_value', 'product'], name='ranking_rank_numeric_idx'), models.Index(fields=['materialization', 'text_value', 'product'], name='ranking_rank_text_idx')],
+                'unique_together': {('materialization', 'product')},
+            },
+        ),
+    ]
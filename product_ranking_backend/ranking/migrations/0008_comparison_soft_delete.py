@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0007_materialized_ranks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComparisonDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comparison_id', models.PositiveIntegerField(db_index=True)),
+                ('comparison_name', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('stage', models.CharField(blank=True, help_text='Table currently being emptied', max_length=30)),
+                ('total_rows', models.PositiveIntegerField(blank=True, help_text='Rows to delete, counted when the removal starts', null=True)),
+                ('deleted_rows', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-requested_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='comparison',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Set when the comparison is deleted; its rows are then removed in batches', null=True),
+        ),
+    ]
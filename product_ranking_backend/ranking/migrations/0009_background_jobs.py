@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:22
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranking', '0008_comparison_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('results', 'Ranking results'), ('pareto', 'Pareto frontier'), ('export', 'Export'), ('import', 'Import')], max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Query parameters of the computation, as lists of values')),
+                ('version', models.PositiveIntegerField(blank=True, help_text='Comparison version when the job was queued', null=True)),
+                ('key', models.CharField(blank=True, editable=False, help_text='Digest of the kind, params and comparison versions; equal jobs share one computation', max_length=32, null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('result_file', models.CharField(blank=True, help_text='Output file in RANKING_JOB_FILES_DIR, for exports', max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, help_text='host:pid of the worker that ran the job', max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('comparison', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='ranking.comparison')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='ranking_job_queue_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'failed'), _negated=True), fields=('key',), name='ranking_job_unique_key')],
+            },
+        ),
+    ]
@@ -1,6 +1,38 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from .values import typed_values
+
+
+def _count_per_comparison(model):
+    """Correlated COUNT subquery of a model's rows for the outer comparison"""
+    counts = (
+        model.objects.filter(comparison=OuterRef('pk'))
+        .order_by().values('comparison').annotate(count=Count('*')).values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+class ComparisonQuerySet(models.QuerySet):
+    def with_counts(self, products=True, attributes=True):
+        """Annotate product_count and/or attribute_count in the same query"""
+        counts = {}
+        if products:
+            counts['product_count'] = _count_per_comparison(Product)
+        if attributes:
+            counts['attribute_count'] = _count_per_comparison(Attribute)
+        return self.annotate(**counts)
+
+
+class ComparisonManager(models.Manager.from_queryset(ComparisonQuerySet)):
+    """Hides comparisons marked deleted while their rows are purged in the background"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class Comparison(models.Model):
     """Model to store comparison projects"""
@@ -8,13 +40,31 @@ class Comparison(models.Model):
     description = models.TextField(blank=True, null=True, help_text="Optional description of the comparison")
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False, help_text="Bumped on every write to the comparison or its data, used for caching")
+    deleted_at = models.DateTimeField(blank=True, null=True, editable=False, help_text="Set when the comparison is deleted; its rows are then removed in batches")
+
+    objects = ComparisonManager()
+    all_objects = ComparisonQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='ranking_comparison_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # version and deleted_at are only written with UPDATEs (bump_version(), mark_deleted()), so an instance
+        # loaded before them must not write its old values back
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name not in ('version', 'deleted_at')]
+        super().save(*args, **kwargs)
+
 
 class Attribute(models.Model):
     """Model to store attributes for comparison"""
@@ -36,6 +86,13 @@ class Attribute(models.Model):
     def __str__(self):
         return f"{self.comparison.name} - {self.name}"
 
+    def refresh_typed_values(self):
+        """Re-parse the typed values of all data for this attribute, e.g. after data_type or unit changed"""
+        rows = list(self.productattributedata_set.only('id', 'value'))
+        for row in rows:
+            row.set_typed_values(self)
+        ProductAttributeData.objects.bulk_update(rows, ['numeric_value', 'boolean_value'], batch_size=500)
+
 
 class Product(models.Model):
     """Model to store products in a comparison"""
@@ -58,16 +115,131 @@ class ProductAttributeData(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attribute_data')
     attribute = models.ForeignKey(Attribute, on_delete=models.CASCADE)
     value = models.TextField(help_text="Value of the attribute for this product")
+    numeric_value = models.FloatField(blank=True, null=True, editable=False, help_text="Value parsed as a number in the attribute's unit, filled in on save")
+    boolean_value = models.BooleanField(blank=True, null=True, editable=False, help_text="Value parsed as a boolean, filled in on save")
 
     class Meta:
         unique_together = ['product', 'attribute']
+        indexes = [
+            models.Index(fields=['attribute', 'numeric_value'], name='ranking_pad_attr_numeric_idx'),
+            models.Index(fields=['attribute', 'boolean_value'], name='ranking_pad_attr_boolean_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.attribute.name}: {self.value}"
 
+    def save(self, *args, **kwargs):
+        self.set_typed_values()
+        super().save(*args, **kwargs)
+
+    def set_typed_values(self, attribute=None):
+        """Fill the typed columns from value; bulk_create() skips save(), so call this before it"""
+        if attribute is None:
+            attribute = self.attribute
+        self.numeric_value, self.boolean_value = typed_values(self.value, attribute.data_type, attribute.unit)
+
     def get_numeric_value(self):
         """Convert value to numeric if possible, for sorting purposes"""
-        try:
-            return float(self.value)
-        except (ValueError, TypeError):
-            return 0
+        return self.numeric_value if self.numeric_value is not None else 0
+
+
+class RankingMaterialization(models.Model):
+    """A materialized ranking of a comparison's products by one attribute in one direction"""
+    attribute = models.ForeignKey(Attribute, on_delete=models.CASCADE, related_name='materializations')
+    descending = models.BooleanField()
+    version = models.PositiveIntegerField(help_text="Comparison version the ranks reflect; rebuilt on read when it falls behind")
+
+    class Meta:
+        unique_together = ['attribute', 'descending']
+
+    def __str__(self):
+        return f"{self.attribute} ({'desc' if self.descending else 'asc'})"
+
+
+class ProductRank(models.Model):
+    """Position of a product in a materialized ranking: by value, missing values last, ties by product id"""
+    materialization = models.ForeignKey(RankingMaterialization, on_delete=models.CASCADE, related_name='ranks')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    position = models.PositiveIntegerField(help_text="1-based position, the product's row_number rank")
+    numeric_value = models.FloatField(blank=True, null=True, help_text="Sort value of number and boolean attributes")
+    text_value = models.TextField(blank=True, null=True, help_text="Lowercased sort value of text attributes")
+
+    class Meta:
+        unique_together = ['materialization', 'product']
+        indexes = [
+            models.Index(fields=['materialization', 'position'], name='ranking_rank_position_idx'),
+            models.Index(fields=['materialization', 'numeric_value', 'product'], name='ranking_rank_numeric_idx'),
+            models.Index(fields=['materialization', 'text_value', 'product'], name='ranking_rank_text_idx'),
+        ]
+
+
+class ComparisonDeletion(models.Model):
+    """Progress of removing a deleted comparison's rows in batches"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    # Not a foreign key: the comparison row is deleted at the end, the progress record stays
+    comparison_id = models.PositiveIntegerField(db_index=True)
+    comparison_name = models.CharField(max_length=200)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    stage = models.CharField(max_length=30, blank=True, help_text="Table currently being emptied")
+    total_rows = models.PositiveIntegerField(blank=True, null=True, help_text="Rows to delete, counted when the removal starts")
+    deleted_rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-requested_at']
+
+    def __str__(self):
+        return f"{self.comparison_name} ({self.status})"
+
+
+class Job(models.Model):
+    """A ranking computation queued for the background worker (manage.py run_job_worker)"""
+    KIND_CHOICES = [
+        ('results', 'Ranking results'),
+        ('pareto', 'Pareto frontier'),
+        ('export', 'Export'),
+        ('import', 'Import'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Null for exports of every comparison
+    comparison = models.ForeignKey(Comparison, on_delete=models.CASCADE, blank=True, null=True, related_name='jobs')
+    params = models.JSONField(default=dict, blank=True, help_text="Query parameters of the computation, as lists of values")
+    version = models.PositiveIntegerField(blank=True, null=True, help_text="Comparison version when the job was queued")
+    key = models.CharField(max_length=32, blank=True, null=True, editable=False, help_text="Digest of the kind, params and comparison versions; equal jobs share one computation")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    result_file = models.CharField(max_length=255, blank=True, help_text="Output file in RANKING_JOB_FILES_DIR, for exports")
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True, help_text="host:pid of the worker that ran the job")
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='ranking_job_queue_idx'),
+        ]
+        constraints = [
+            # Failed jobs step aside so the computation can be queued again
+            models.UniqueConstraint(fields=['key'], condition=~Q(status='failed'), name='ranking_job_unique_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
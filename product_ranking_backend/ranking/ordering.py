@@ -0,0 +1,175 @@
+"""SQL ordering and window-function ranking of products by one or more attribute values"""
+from django.db.models import F, FilteredRelation, Q, Window
+from django.db.models.functions import DenseRank, Lower, Rank, RowNumber
+
+
+RANK_FUNCTIONS = {
+    'row_number': RowNumber,
+    'rank': Rank,
+    'dense_rank': DenseRank,
+}
+
+
+SORT_DIRECTIONS = ('asc', 'desc')
+NULL_PLACEMENTS = ('nulls_first', 'nulls_last')
+
+
+class SortKey:
+    """One attribute of a composite sort, with its direction and where missing values go"""
+    __slots__ = ('attribute', 'descending', 'nulls_first')
+
+    def __init__(self, attribute, descending=True, nulls_first=False):
+        self.attribute = attribute
+        self.descending = descending
+        self.nulls_first = nulls_first
+
+    def as_dict(self):
+        return {
+            'attribute': self.attribute.name,
+            'direction': 'desc' if self.descending else 'asc',
+            'nulls': 'nulls_first' if self.nulls_first else 'nulls_last',
+        }
+
+
+def parse_sort_by(raw, default_order='desc'):
+    """
+    Parse 'Price:asc,RAM:desc:nulls_first' into [(name, descending, nulls_first)].
+
+    Keys without a direction use default_order (the sort_order parameter);
+    missing values sort last unless nulls_first is given.
+    """
+    keys = []
+    for item in filter(None, (part.strip() for part in (raw or '').split(','))):
+        name, direction, nulls = item, default_order, 'nulls_last'
+        # Options are peeled off the right so attribute names may contain ':'
+        while ':' in name:
+            head, _, option = name.rpartition(':')
+            option = option.strip().lower()
+            if option in SORT_DIRECTIONS:
+                direction = option
+            elif option in NULL_PLACEMENTS:
+                nulls = option
+            else:
+                break
+            name = head
+        name = name.strip()
+        if not name:
+            raise ValueError(f"Missing attribute name in sort key '{item}'")
+        if any(key[0] == name for key in keys):
+            raise ValueError(f"Attribute '{name}' appears more than once in sort_by")
+        keys.append((name, direction == 'desc', nulls == 'nulls_first'))
+    return keys
+
+
+def resolve_sort_keys(parsed, attributes):
+    """Turn parse_sort_by() output into SortKeys given {name: Attribute}; unknown names raise ValueError"""
+    lowercase = {name.lower(): attribute for name, attribute in attributes.items()}
+    sort_keys = []
+    for name, descending, nulls_first in parsed:
+        attribute = attributes.get(name) or lowercase.get(name.lower())
+        if attribute is None:
+            raise ValueError(f"Unknown attribute '{name}'")
+        sort_keys.append(SortKey(attribute, descending, nulls_first))
+    return sort_keys
+
+
+def sort_value_expression(attribute, relation='sort_data'):
+    """Typed column to sort on for an attribute, read through a filtered attribute data relation"""
+    if attribute.data_type == 'number':
+        return F(f'{relation}__numeric_value')
+    if attribute.data_type == 'boolean':
+        return F(f'{relation}__boolean_value')
+    return Lower(f'{relation}__value')
+
+
+def _never():
+    return Q(pk__in=[])
+
+
+def keyset_filter(keys, values, product_id):
+    """
+    Keyset predicate for rows after (values, product_id) in a composite ordering.
+
+    keys holds (field, descending, nulls_first) per sort key and values the
+    last row's value for each; ties on every key are broken by id.
+    """
+    condition = _never()
+    equal = Q()
+    for (field, descending, nulls_first), value in zip(keys, values):
+        if value is None:
+            beyond = Q(**{f'{field}__isnull': False}) if nulls_first else _never()
+            same = Q(**{f'{field}__isnull': True})
+        else:
+            beyond = Q(**{f'{field}__lt' if descending else f'{field}__gt': value})
+            if not nulls_first:
+                beyond |= Q(**{f'{field}__isnull': True})
+            same = Q(**{field: value})
+        condition |= equal & beyond
+        equal &= same
+    return condition | (equal & Q(id__gt=product_id))
+
+
+def after_filter(field, value, product_id, descending=False):
+    """Keyset predicate for rows after (value, product_id) in a nulls-last ordering"""
+    return keyset_filter([(field, descending, False)], [value], product_id)
+
+
+def sort_values(product, count):
+    """The values a product annotated by rank_products() is sorted by"""
+    return [getattr(product, f'sort_value_{i}') for i in range(count)]
+
+
+def rank_products(queryset, sort_keys, rank_method='row_number', after=None):
+    """
+    Order a Product queryset by one or more SortKeys in SQL.
+
+    Each key's typed value is annotated as 'sort_value_<i>' (see
+    sort_values()); ties on every key are broken by product id so the order
+    is deterministic. Without a keyset cursor ('after' state) each product
+    is also annotated with its window-function 'rank'; past a cursor the
+    window would only see the remaining rows, so ranks are continued with
+    assign_ranks() instead.
+    """
+    annotations, value_order = {}, []
+    for i, key in enumerate(sort_keys):
+        relation, field = f'sort_data_{i}', f'sort_value_{i}'
+        annotations[relation] = FilteredRelation(
+            'attribute_data', condition=Q(attribute_data__attribute=key.attribute)
+        )
+        annotations[field] = sort_value_expression(key.attribute, relation)
+        placement = {'nulls_first': True} if key.nulls_first else {'nulls_last': True}
+        value_order.append(F(field).desc(**placement) if key.descending else F(field).asc(**placement))
+    queryset = queryset.annotate(**annotations)
+
+    if after is not None:
+        keys = [(f'sort_value_{i}', key.descending, key.nulls_first) for i, key in enumerate(sort_keys)]
+        return queryset.filter(keyset_filter(keys, after['value'], after['id'])).order_by(*value_order, 'id')
+
+    # RANK/DENSE_RANK must see ties, ROW_NUMBER follows the final ordering exactly
+    window_order = [*value_order, F('id').asc()] if rank_method == 'row_number' else value_order
+    return queryset.annotate(
+        rank=Window(expression=RANK_FUNCTIONS[rank_method](), order_by=window_order),
+    ).order_by(*value_order, 'id')
+
+
+def assign_ranks(results, key, rank_method='row_number', start=None):
+    """
+    Set 'rank' on already sorted results, treating equal keys as ties.
+
+    'start' is the state returned for the previous page, so ranks continue
+    across keyset pages; the state after the last result is returned.
+    """
+    start = start or {}
+    position = start.get('position', 0)
+    previous = start['value'] if position else object()
+    rank = start.get('rank', 0)
+    for result in results:
+        position += 1
+        value = key(result)
+        if rank_method == 'row_number':
+            rank = position
+        elif value != previous:
+            rank = position if rank_method == 'rank' else rank + 1
+        previous = value
+        result['rank'] = rank
+    return {'position': position, 'value': previous, 'rank': rank}
@@ -0,0 +1,73 @@
+"""Keyset pagination cursors and top-K selection for ranking results"""
+import base64
+import binascii
+import heapq
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+def parse_limit(raw):
+    """Validate the 'limit' query parameter; None means no limit"""
+    if raw in (None, ''):
+        return None
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= settings.RANKING_MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {settings.RANKING_MAX_PAGE_SIZE}')
+    return limit
+
+
+def encode_cursor(sort_key, state):
+    """Encode the position after the last returned row as an opaque cursor"""
+    payload = json.dumps({'sort': sort_key, **state}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(raw, sort_key):
+    """Decode a cursor, checking it was issued for the same sort parameters"""
+    if not raw:
+        return None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)))
+        cursor_sort_key = state.pop('sort')
+        state['id'], state['position'], state['value'], state['rank']
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError('Invalid cursor')
+    if cursor_sort_key != sort_key:
+        raise ValueError('Cursor does not match the current sort parameters')
+    return state
+
+
+def top_k(keys, k, after=None):
+    """
+    Return the k smallest (key, product_id) pairs that come after the cursor position.
+
+    Uses a bounded heap, O(n log k), instead of sorting every product.
+    """
+    candidates = ((key, product_id) for product_id, key in keys.items())
+    if after is not None:
+        after = tuple(after)
+        candidates = (item for item in candidates if item > after)
+    if k is None:
+        return sorted(candidates)
+    return heapq.nsmallest(k, candidates)
+
+
+class ComparisonCursorPagination(CursorPagination):
+    """Cursor pagination for the comparison list, newest first"""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        # DRF reads any base64 text as a cursor; one without offset, direction or position is not one of ours
+        if cursor is not None and not (cursor.offset or cursor.reverse or cursor.position is not None):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
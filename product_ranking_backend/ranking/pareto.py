@@ -0,0 +1,156 @@
+"""Pareto frontier (skyline) computation over a products x attributes matrix"""
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from .scoring import DIRECTIONS, _parse_options
+
+
+BLOCK_SIZE = 64
+MAX_LAYERS = 50
+
+
+def _dominance(candidates, points):
+    """Boolean matrix [i, j]: whether points[j] dominates candidates[i] (>= everywhere, > somewhere)"""
+    at_least = np.ones((len(candidates), len(points)), dtype=bool)
+    better = np.zeros((len(candidates), len(points)), dtype=bool)
+    # One column at a time keeps memory at candidates x points
+    for j in range(candidates.shape[1]):
+        at_least &= points[None, :, j] >= candidates[:, None, j]
+        better |= points[None, :, j] > candidates[:, None, j]
+    return at_least & better
+
+
+def _skyline_2d(x, y):
+    """
+    Skyline of two columns with a sort and a running maximum.
+
+    Rows sorted by x then y, both descending, are dominated by a row before
+    them: one with the same x and a higher y, or one with a higher x and at
+    least the same y. Returns indices into x and y.
+    """
+    order = np.lexsort((-y, -x))
+    xs, ys = x[order], y[order]
+    # First row of each row's x group, and the best y of the rows before that group
+    start = np.searchsorted(-xs, -xs, side='left')
+    best_before = np.concatenate(([-np.inf], np.maximum.accumulate(ys)))[start]
+    return order[(ys == ys[start]) & (ys > best_before)]
+
+
+def _covered(stair_y, stair_z, y, z):
+    """Whether a stair is at least as high as (y, z) in both columns"""
+    k = bisect_left(stair_y, y)
+    return k < len(stair_y) and stair_z[k] >= z
+
+
+def _skyline_3d(matrix):
+    """
+    Skyline of three columns, sweeping the rows by descending first column.
+
+    The (second, third) column pairs of the skyline rows seen so far are
+    kept as a staircase, ascending in the second column and descending in
+    the third. A row is dominated by an earlier x group if the first stair
+    at or right of its second value is at least as high in the third;
+    rows with the same first value are resolved among themselves in 2-D.
+    """
+    order = np.argsort(-matrix[:, 0], kind='stable')
+    bounds = np.flatnonzero(np.diff(matrix[order, 0])) + 1
+    stair_y, stair_z = [], []
+    kept = []
+    for group in np.split(order, bounds):
+        candidates = [
+            i for i, y, z in zip(group.tolist(), matrix[group, 1].tolist(), matrix[group, 2].tolist())
+            if not _covered(stair_y, stair_z, y, z)
+        ]
+        if len(candidates) > 1:
+            candidates = np.array(candidates)[_skyline_2d(matrix[candidates, 1], matrix[candidates, 2])].tolist()
+        kept.extend(candidates)
+        for i in candidates:
+            y, z = matrix[i, 1], matrix[i, 2]
+            if _covered(stair_y, stair_z, y, z):
+                continue
+            # Stairs the new one covers end at the last stair with y' <= y
+            end = bisect_right(stair_y, y)
+            first = end
+            while first > 0 and stair_z[first - 1] <= z:
+                first -= 1
+            stair_y[first:end], stair_z[first:end] = [y], [z]
+    return np.array(kept, dtype=np.int64)
+
+
+def skyline(matrix):
+    """
+    Indices of the rows of matrix (higher is better in every column) that no other row dominates.
+
+    One to three columns are swept in O(n log n). Wider matrices use
+    sort-filter-skyline: rows are presorted so that a row can only be
+    dominated by rows before it. The head block of the remaining rows is
+    then resolved against itself, which yields skyline rows, and used to
+    eliminate every remaining row it dominates in one vectorized step.
+    Strong rows come first, so most rows are discarded by the first blocks.
+    """
+    if matrix.shape[0] == 0:
+        return np.array([], dtype=np.int64)
+    if matrix.shape[1] == 1:
+        return np.flatnonzero(matrix[:, 0] == matrix[:, 0].max())
+    if matrix.shape[1] == 2:
+        return _skyline_2d(matrix[:, 0], matrix[:, 1])
+    if matrix.shape[1] == 3:
+        return _skyline_3d(matrix)
+
+    # Monotone presort: sum of min-max normalized values, ties broken lexicographically,
+    # all descending, so any dominating row comes first
+    low = matrix.min(axis=0)
+    span = matrix.max(axis=0) - low
+    normalized = np.divide(matrix - low, span, out=np.zeros_like(matrix), where=span > 0)
+    remaining = np.lexsort(tuple(-matrix[:, j] for j in reversed(range(matrix.shape[1]))) + (-normalized.sum(axis=1),))
+
+    kept = []
+    while remaining.size:
+        block, rest = remaining[:BLOCK_SIZE], remaining[BLOCK_SIZE:]
+        # Within the block only earlier rows can dominate later ones
+        block = block[~np.tril(_dominance(matrix[block], matrix[block]), k=-1).any(axis=1)]
+        kept.append(block)
+        remaining = rest[~_dominance(matrix[rest], matrix[block]).any(axis=1)]
+    return np.concatenate(kept)
+
+
+def dominance_layers(matrix, directions, max_layers=1):
+    """
+    Peel successive Pareto layers off a matrix of raw values.
+
+    directions holds 'asc' (lower is better) or 'desc' (higher is better) per
+    column; missing values (NaN) count as worse than any real value. Returns
+    a list of row index arrays, best layer first.
+    """
+    matrix = np.array(matrix, dtype=float, ndmin=2)
+    flip = np.asarray(directions) == 'asc'
+    matrix[:, flip] *= -1
+    missing = np.isnan(matrix)
+    lowest = np.where(missing, np.inf, matrix).min(axis=0, initial=np.inf)
+    worst = np.where(np.isinf(lowest), 0.0, lowest) - 1
+    matrix = np.where(missing, worst, matrix)
+
+    remaining = np.arange(matrix.shape[0])
+    layers = []
+    while remaining.size and len(layers) < max_layers:
+        layer = remaining[skyline(matrix[remaining])]
+        layers.append(np.sort(layer))
+        remaining = np.setdiff1d(remaining, layer, assume_unique=True)
+    return layers
+
+
+def parse_pareto_params(params):
+    """Build (attribute, direction) criteria from ?directions=Price:asc,RAM:desc and the layer count from ?layers="""
+    default, directions = _parse_options(params.get('directions'), DIRECTIONS)
+    if default is not None:
+        raise ValueError("Directions must name their attribute, e.g. 'Price:asc'")
+    if not directions:
+        raise ValueError("At least one attribute direction is required, e.g. 'directions=Price:asc,RAM:desc'")
+    try:
+        layers = int(params.get('layers', 1))
+    except ValueError:
+        raise ValueError('layers must be an integer')
+    if not 1 <= layers <= MAX_LAYERS:
+        raise ValueError(f'layers must be between 1 and {MAX_LAYERS}')
+    return [{'attribute': name, 'direction': direction} for name, direction in directions.items()], layers
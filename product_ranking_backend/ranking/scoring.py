@@ -0,0 +1,136 @@
+"""Weighted multi-criteria scoring for ranking results"""
+import warnings
+
+import numpy as np
+
+from .snapshot import get_snapshot
+
+
+DIRECTIONS = ('asc', 'desc')
+NORMALIZATIONS = ('minmax', 'zscore', 'rank')
+
+
+def _parse_options(raw, allowed=None, cast=str):
+    """Parse 'Name:option,Name2:option' into (default, {name: option})"""
+    default = None
+    options = {}
+    for item in filter(None, (part.strip() for part in (raw or '').split(','))):
+        name, sep, option = item.rpartition(':')
+        if not sep:
+            name, option = None, item
+        try:
+            option = cast(option.strip())
+        except ValueError:
+            raise ValueError(f"Invalid value '{option}' in '{item}'")
+        if allowed and option not in allowed:
+            raise ValueError(f"Invalid option '{option}', expected one of: {', '.join(allowed)}")
+        if name is None:
+            default = option
+        else:
+            options[name.strip()] = option
+    return default, options
+
+
+def parse_scoring_params(params):
+    """Build scoring criteria from the weights, directions and normalization query parameters"""
+    default_weight, weights = _parse_options(params.get('weights'), cast=float)
+    if default_weight is not None:
+        raise ValueError("Weights must name their attribute, e.g. 'Price:2'")
+    default_direction, directions = _parse_options(params.get('directions'), DIRECTIONS)
+    default_normalization, normalizations = _parse_options(params.get('normalization'), NORMALIZATIONS)
+
+    criteria = []
+    for name, weight in weights.items():
+        if weight < 0 or not np.isfinite(weight):
+            raise ValueError(f"Weight for '{name}' must be a non-negative number")
+        criteria.append({
+            'attribute': name,
+            'weight': weight,
+            'direction': directions.get(name, default_direction or 'desc'),
+            'normalization': normalizations.get(name, default_normalization or 'minmax'),
+        })
+    if criteria and not sum(c['weight'] for c in criteria):
+        raise ValueError('At least one weight must be greater than zero')
+    return criteria
+
+
+def _minmax(columns):
+    low = np.nanmin(columns, axis=0)
+    span = np.nanmax(columns, axis=0) - low
+    return np.divide(columns - low, span, out=np.zeros_like(columns), where=span > 0)
+
+
+def _zscore(columns):
+    std = np.nanstd(columns, axis=0)
+    return np.divide(columns - np.nanmean(columns, axis=0), std, out=np.zeros_like(columns), where=std > 0)
+
+
+def _rank(columns):
+    """Average-tie percentile rank per column, scaled to [0, 1]"""
+    result = np.empty_like(columns)
+    for j in range(columns.shape[1]):
+        column = columns[:, j]
+        present = np.sort(column[~np.isnan(column)])
+        if present.size < 2:
+            result[:, j] = 0.0
+            continue
+        positions = (np.searchsorted(present, column, 'left') + np.searchsorted(present, column, 'right') - 1) / 2
+        result[:, j] = np.where(np.isnan(column), np.nan, positions / (present.size - 1))
+    return result
+
+
+NORMALIZERS = {
+    'minmax': _minmax,
+    'zscore': _zscore,
+    'rank': _rank,
+}
+
+
+def compute_scores(matrix, weights, directions, normalizations):
+    """
+    Compute a composite score per row of a products x attributes matrix.
+
+    Missing values are NaN; they take the worst normalized value of their
+    column so that products without data never outrank products with it.
+    """
+    matrix = np.array(matrix, dtype=float, ndmin=2)
+    if matrix.size == 0:
+        return np.zeros(matrix.shape[0])
+
+    weights = np.asarray(weights, dtype=float)
+    directions = np.asarray(directions)
+    normalizations = np.asarray(normalizations)
+
+    # Lower is better for 'asc': flip the sign so every column is "higher is better"
+    matrix[:, directions == 'asc'] *= -1
+
+    normalized = np.empty_like(matrix)
+    with warnings.catch_warnings():
+        # All-NaN columns (no product has a value) are expected and handled below
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for mode in np.unique(normalizations):
+            columns = normalizations == mode
+            normalized[:, columns] = NORMALIZERS[mode](matrix[:, columns])
+
+        worst = np.nanmin(normalized, axis=0)
+    worst = np.where(np.isnan(worst), 0.0, worst)
+    normalized = np.where(np.isnan(normalized), worst, normalized)
+
+    return normalized @ (weights / weights.sum())
+
+
+def score_products(comparison, criteria):
+    """
+    Score every product of a comparison from its columnar snapshot.
+
+    Returns (product_ids, scores) arrays; each criterion needs its 'attribute_id'.
+    """
+    snapshot = get_snapshot(comparison.id, comparison.version)
+    matrix = snapshot.matrix([c['attribute_id'] for c in criteria])
+    scores = compute_scores(
+        matrix,
+        [c['weight'] for c in criteria],
+        [c['direction'] for c in criteria],
+        [c['normalization'] for c in criteria],
+    )
+    return snapshot.product_ids, np.round(scores, 6)
@@ -0,0 +1,145 @@
+"""
+Full-text search over comparisons, products and text attribute values.
+
+On SQLite the index is the FTS5 table ranking_search_index, kept in sync
+by triggers (see migration 0006) so that every write path, including
+bulk_create(), queryset update() and cascading deletes, updates it. Hits
+are ordered by BM25 with product and comparison names weighted above
+descriptions.
+"""
+import html
+import re
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models.expressions import RawSQL
+
+
+INDEX_TABLE = 'ranking_search_index'
+KINDS = ('comparison', 'product', 'value')
+# bm25() takes one weight per column: kind, comparison_id, product_id, attribute_id, name, description
+COLUMN_WEIGHTS = (0.0, 0.0, 0.0, 0.0, 10.0, 1.0)
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# FTS5 marks matches with private-use characters, which survive HTML escaping of the stored text
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+SNIPPET_TOKENS = 16
+DEFAULT_LIMIT = 20
+
+
+# Databases where the index was found, see search_available()
+_available = set()
+
+
+def search_available():
+    """Whether the database has a usable FTS5 index: SQLite built with FTS5 and migration 0006 applied"""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _available:
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Fails with 'no such table' or 'no such module: fts5'
+                cursor.execute(f'SELECT rowid FROM {INDEX_TABLE} LIMIT 0')
+        except DatabaseError:
+            # Not remembered, the index may be created by a later migrate
+            return False
+        _available.add(name)
+    return True
+
+
+def highlight_html(text):
+    """HTML-escape indexed text and turn the FTS5 match markers into <mark> tags"""
+    if text is None:
+        return None
+    return html.escape(text).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query where every term must match and the last one may be a prefix"""
+    terms = [f'"{term}"' for term in re.findall(r'\w+', text or '')]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def parse_kinds(raw):
+    """Parse ?type=product,value into a tuple of index kinds; empty means all of them"""
+    kinds = tuple(dict.fromkeys(kind.strip() for kind in (raw or '').split(',') if kind.strip()))
+    for kind in kinds:
+        if kind not in KINDS:
+            raise ValueError(f"Invalid type '{kind}', expected one of: {', '.join(KINDS)}")
+    return kinds or KINDS
+
+
+def search_index(match, comparison_id=None, kinds=KINDS, limit=DEFAULT_LIMIT, after=None):
+    """
+    Return (hits, after) for up to limit hits of an FTS5 match query, best first.
+
+    Each hit carries the names of its comparison, product and attribute,
+    the highlighted name and a snippet of the description, HTML-escaped. 'after' is the
+    keyset state ({'value': bm25 score, 'id': index rowid}) to pass back
+    for the next page, or None when there are no more hits.
+    """
+    conditions = [f'{INDEX_TABLE} MATCH %s', f'kind IN ({", ".join(["%s"] * len(kinds))})']
+    params = [match, *kinds]
+    if comparison_id is not None:
+        conditions.append('comparison_id = %s')
+        params.append(comparison_id)
+    # bm25() is lower for better hits; the rowid breaks ties so pages never overlap
+    page_condition = ''
+    if after is not None:
+        page_condition = 'WHERE hit.score > %s OR (hit.score = %s AND hit.id > %s)'
+        params += [after['value'], after['value'], after['id']]
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    sql = f'''
+        SELECT hit.*, c.name, p.name, a.name FROM (
+            SELECT rowid AS id, kind, comparison_id, product_id, attribute_id,
+                   bm25({INDEX_TABLE}, {weights}) AS score,
+                   highlight({INDEX_TABLE}, 4, %s, %s),
+                   snippet({INDEX_TABLE}, 5, %s, %s, '…', {SNIPPET_TOKENS})
+            FROM {INDEX_TABLE}
+            WHERE {' AND '.join(conditions)}
+        ) hit
+        JOIN ranking_comparison c ON c.id = hit.comparison_id AND c.deleted_at IS NULL
+        LEFT JOIN ranking_product p ON p.id = hit.product_id
+        LEFT JOIN ranking_attribute a ON a.id = hit.attribute_id
+        {page_condition}
+        ORDER BY hit.score, hit.id
+        LIMIT %s
+    '''
+    # One extra row tells whether there is a next page
+    params = [MATCH_START, MATCH_END, MATCH_START, MATCH_END, *params, limit + 1]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    hits = []
+    for (_, kind, hit_comparison_id, product_id, attribute_id, score, name, description,
+         comparison_name, product_name, attribute_name) in rows[:limit]:
+        hits.append({
+            'type': kind,
+            'score': -score,  # reported as higher is better
+            'comparison': {'id': hit_comparison_id, 'name': comparison_name},
+            'product': {'id': product_id, 'name': product_name} if product_id is not None else None,
+            'attribute': {'id': attribute_id, 'name': attribute_name} if attribute_id is not None else None,
+            'highlight': {'name': highlight_html(name), 'description': highlight_html(description or None)},
+        })
+    after = {'value': rows[limit - 1][5], 'id': rows[limit - 1][0]} if len(rows) > limit else None
+    return hits, after
+
+
+def matching_ids(field, kinds, text):
+    """
+    Subquery of the comparison_id or product_id of index rows matching text,
+    for filtering querysets with field__in; None if text has no search terms.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return None
+    placeholders = ', '.join(['%s'] * len(kinds))
+    return RawSQL(
+        f'SELECT {field} FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s AND kind IN ({placeholders})',
+        (match, *kinds),
+    )
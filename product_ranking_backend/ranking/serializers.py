@@ -1,5 +1,7 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Comparison, Attribute, Product, ProductAttributeData
+from .models import Comparison, ComparisonDeletion, Attribute, Job, Product, ProductAttributeData
+from .upserts import create_product
 
 
 class AttributeSerializer(serializers.ModelSerializer):
@@ -25,33 +27,114 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'attribute_data']
 
 
-class ComparisonSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """Takes an optional 'fields' argument that limits which fields are serialized"""
+    
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ComparisonSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     attributes = AttributeSerializer(many=True, read_only=True)
     products = ProductSerializer(many=True, read_only=True)
     product_count = serializers.SerializerMethodField()
     
+    RELATIONS = ['attributes', 'products']
+    
     class Meta:
         model = Comparison
         fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'attributes', 'products', 'product_count']
     
     def get_product_count(self, obj):
+        # Prefer the count annotation or the prefetched products over a COUNT query
+        if getattr(obj, 'product_count', None) is not None:
+            return obj.product_count
+        if 'products' in getattr(obj, '_prefetched_objects_cache', {}):
+            return len(obj.products.all())
         return obj.products.count()
+    
+    @classmethod
+    def select_fields(cls, params, default_include=RELATIONS):
+        """
+        Resolve the ?fields= and ?include= query parameters into the fields to render.
+
+        'fields' picks top-level fields (all non-relation fields by default) and
+        'include' the nested relations to embed (default_include by default).
+        """
+        def split(name, default):
+            if name not in params:
+                return list(default)
+            return [part.strip() for part in params.get(name).split(',') if part.strip()]
+        
+        header = [name for name in cls.Meta.fields if name not in cls.RELATIONS]
+        fields = split('fields', header)
+        include = split('include', default_include)
+        errors = {}
+        unknown_fields = [name for name in fields if name not in cls.Meta.fields]
+        if unknown_fields:
+            errors['fields'] = f"Unknown fields: {', '.join(unknown_fields)}"
+        unknown_include = [name for name in include if name not in cls.RELATIONS]
+        if unknown_include:
+            errors['include'] = f"Unknown relations: {', '.join(unknown_include)}"
+        if errors:
+            raise serializers.ValidationError(errors)
+        selected = set(fields) | set(include)
+        return [name for name in cls.Meta.fields if name in selected]
+    
+    @staticmethod
+    def setup_eager_loading(queryset, fields):
+        """Load only the columns and relations the selected fields need"""
+        columns = {field.name for field in Comparison._meta.concrete_fields}
+        queryset = queryset.only('id', 'version', *(name for name in fields if name in columns))
+        if 'attributes' in fields:
+            queryset = queryset.prefetch_related('attributes')
+        if 'products' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'products', queryset=Product.objects.prefetch_related('attribute_data__attribute')
+            ))
+        elif 'product_count' in fields:
+            queryset = queryset.with_counts(attributes=False)
+        return queryset
 
 
 class ComparisonListSerializer(serializers.ModelSerializer):
-    """Simplified serializer for listing comparisons"""
-    product_count = serializers.SerializerMethodField()
-    attribute_count = serializers.SerializerMethodField()
+    """Simplified serializer for listing comparisons; counts come from queryset annotations"""
+    product_count = serializers.IntegerField(read_only=True)
+    attribute_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Comparison
         fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'product_count', 'attribute_count']
+
+
+class ComparisonDeletionSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
     
-    def get_product_count(self, obj):
-        return obj.products.count()
+    class Meta:
+        model = ComparisonDeletion
+        fields = ['id', 'comparison_id', 'comparison_name', 'status', 'stage', 'total_rows', 'deleted_rows',
+                  'progress', 'error', 'requested_at', 'started_at', 'finished_at']
     
-    def get_attribute_count(self, obj):
-        return obj.attributes.count()
+    def get_progress(self, obj):
+        # Share of rows removed, unknown until the purge has counted them
+        if obj.status == 'done':
+            return 1.0
+        if not obj.total_rows:
+            return None
+        return round(obj.deleted_rows / obj.total_rows, 4)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Job status; the result itself is served by the job result endpoint"""
+    
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'comparison', 'params', 'version', 'status', 'error', 'worker',
+                  'created_at', 'started_at', 'finished_at']
 
 
 class ProductCreateSerializer(serializers.ModelSerializer):
@@ -74,22 +157,9 @@ class ProductCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         print(f"Creating product with validated data: {validated_data}")
         attribute_data = validated_data.pop('attribute_data', [])
-        product = Product.objects.create(**validated_data)
-        
-        # Create attribute data
-        for attr_data in attribute_data:
-            attribute_id = attr_data.get('attribute_id')
-            value = attr_data.get('value')
-            if attribute_id and value is not None:
-                try:
-                    attribute = Attribute.objects.get(id=attribute_id, comparison=product.comparison)
-                    ProductAttributeData.objects.create(
-                        product=product,
-                        attribute=attribute,
-                        value=str(value)
-                    )
-                except Attribute.DoesNotExist:
-                    pass
+        comparison_id = validated_data.pop('comparison_id')
+        values = [(attr_data.get('attribute_id'), attr_data.get('value')) for attr_data in attribute_data]
+        product = create_product(comparison_id, values, **validated_data)
         
         return product
 
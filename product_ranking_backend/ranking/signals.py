@@ -0,0 +1,56 @@
+"""
+Keep Comparison.version in step with writes made through model instances.
+
+ProductAttributeData deletions have no receiver on purpose: a post_delete
+receiver would stop Django from fast-deleting those rows when products or
+attributes are deleted (which bumps the version anyway). Code that deletes
+or bulk-writes attribute data calls cache.bump_version() itself.
+
+Adding a product and saving a value are recorded with
+materialized.record_changes() instead, which also keeps the comparison's
+materialized rankings up to date. The product endpoint creates a product
+and its values in bulk with upserts.create_product(), which records them
+with one call instead of one per saved row.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .materialized import record_changes
+from .models import Attribute, Comparison, Product, ProductAttributeData
+
+
+@receiver(post_save, sender=Comparison)
+def comparison_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_version(instance.pk)
+        instance.refresh_from_db(fields=['version'])
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+@receiver(post_delete, sender=Product)
+def comparison_child_changed(sender, instance, origin=None, **kwargs):
+    # Nothing to invalidate when the whole comparison is being deleted
+    if isinstance(origin, Comparison) or getattr(origin, 'model', None) is Comparison:
+        return
+    bump_version(instance.comparison_id)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    # Renaming a product does not change any ranking
+    record_changes(instance.comparison_id, added_product_ids=[instance.pk] if created else ())
+
+
+def _comparison_id(instance):
+    """The comparison of a value, from a related object already loaded if possible"""
+    for field in ('product', 'attribute'):
+        if ProductAttributeData._meta.get_field(field).is_cached(instance):
+            return getattr(instance, field).comparison_id
+    return Product.objects.filter(pk=instance.product_id).values_list('comparison_id', flat=True).first()
+
+
+@receiver(post_save, sender=ProductAttributeData)
+def attribute_data_saved(sender, instance, **kwargs):
+    record_changes(_comparison_id(instance), cells=[(instance.product_id, instance.attribute_id)])
@@ -0,0 +1,219 @@
+"""
+Columnar in-memory snapshots of comparisons for fast re-sorting.
+
+A snapshot holds a comparison's product ids and one typed NumPy column per
+attribute with a null mask, built with one query each for the products,
+the attributes and their typed and text values, and kept per process until
+the comparison version changes. Sorting by one or more attributes is then
+a single lexsort over their columns, with the most recently used key
+combinations cached, instead of an ORM query and a Python sort over
+nested dicts.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models.functions import Lower
+
+from .models import Attribute, Product, ProductAttributeData
+
+
+class Column:
+    """
+    One attribute's values aligned with the snapshot's product ids.
+
+    Numbers are stored as floats, booleans as 0/1 and text as codes into
+    the sorted 'labels' array, so every column sorts the same way.
+    """
+    __slots__ = ('data_type', 'values', 'present', 'labels')
+
+    def __init__(self, data_type, values, present, labels=None):
+        self.data_type = data_type
+        self.values = values
+        self.present = present
+        self.labels = labels
+
+    def key(self, value):
+        """Position of a sort value in this column's key space"""
+        if self.data_type != 'text':
+            return float(value)
+        position = int(np.searchsorted(self.labels, value))
+        exact = position < len(self.labels) and self.labels[position] == value
+        # Values missing from the column fall between two codes
+        return float(position) if exact else position - 0.5
+
+    def sort_value(self, index):
+        """The value results are ranked by, as the SQL ordering would report it"""
+        if not self.present[index]:
+            return None
+        value = self.values[index]
+        if self.data_type == 'boolean':
+            return bool(value)
+        if self.data_type == 'text':
+            return str(self.labels[int(value)])
+        return float(value)
+
+
+class ComparisonSnapshot:
+    """Read-only columnar view of one version of a comparison"""
+
+    def __init__(self, comparison_id, version, product_ids, columns):
+        self.comparison_id = comparison_id
+        self.version = version
+        self.product_ids = product_ids
+        self.columns = columns
+        self._orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, comparison_id, version):
+        product_ids = np.fromiter(
+            Product.objects.filter(comparison_id=comparison_id).order_by('id').values_list('id', flat=True),
+            dtype=np.int64,
+        )
+        attributes = dict(Attribute.objects.filter(comparison_id=comparison_id).values_list('id', 'data_type'))
+        text_ids = [attribute_id for attribute_id, data_type in attributes.items() if data_type == 'text']
+        typed_ids = [attribute_id for attribute_id in attributes if attribute_id not in text_ids]
+
+        typed_rows = np.array(list(
+            ProductAttributeData.objects
+            .filter(attribute_id__in=typed_ids, numeric_value__isnull=False)
+            .values_list('product_id', 'attribute_id', 'numeric_value')
+        ), dtype=float).reshape(-1, 3)
+        text_rows = list(
+            ProductAttributeData.objects
+            .filter(attribute_id__in=text_ids)
+            .values_list('product_id', 'attribute_id', Lower('value'))
+        )
+
+        columns = {}
+        for attribute_id, data_type in attributes.items():
+            columns[attribute_id] = Column(
+                data_type, np.zeros(product_ids.size), np.zeros(product_ids.size, dtype=bool)
+            )
+
+        # Scatter typed rows into their columns, one attribute group at a time
+        order = np.argsort(typed_rows[:, 1], kind='stable')
+        typed_rows = typed_rows[order]
+        group_ids, starts = np.unique(typed_rows[:, 1], return_index=True)
+        for attribute_id, rows in zip(group_ids.astype(np.int64), np.split(typed_rows, starts[1:])):
+            column = columns[int(attribute_id)]
+            index = np.searchsorted(product_ids, rows[:, 0].astype(np.int64))
+            column.values[index] = rows[:, 2]
+            column.present[index] = True
+
+        # Text values become codes into a sorted array of distinct lowercase labels
+        if text_rows:
+            labels, codes = np.unique(np.array([row[2] for row in text_rows], dtype=str), return_inverse=True)
+            text_products = np.array([row[0] for row in text_rows], dtype=np.int64)
+            text_attributes = np.array([row[1] for row in text_rows], dtype=np.int64)
+            for attribute_id in text_ids:
+                column = columns[attribute_id]
+                selected = text_attributes == attribute_id
+                index = np.searchsorted(product_ids, text_products[selected])
+                column_labels, column_codes = np.unique(codes[selected], return_inverse=True)
+                column.labels = labels[column_labels]
+                column.values[index] = column_codes
+                column.present[index] = True
+        for column in columns.values():
+            if column.data_type == 'text' and column.labels is None:
+                column.labels = np.array([], dtype=str)
+
+        return cls(comparison_id, version, product_ids, columns)
+
+    def _column(self, attribute_id):
+        column = self.columns.get(attribute_id)
+        if column is None:
+            column = Column('number', np.zeros(self.product_ids.size), np.zeros(self.product_ids.size, dtype=bool))
+        return column
+
+    def _ordering(self, keys):
+        """
+        Sorted (indices, sort tuple columns) for (attribute_id, descending, nulls_first) keys,
+        keeping the last RANKING_SNAPSHOT_ORDERINGS key combinations.
+
+        Each key contributes a null flag and a value column; the product id
+        is the last column, so every product has a distinct composite key.
+        """
+        with self._lock:
+            ordering = self._orders.get(keys)
+            if ordering is not None:
+                self._orders.move_to_end(keys)
+        if ordering is None:
+            columns = []
+            for attribute_id, descending, nulls_first in keys:
+                column = self._column(attribute_id)
+                present = column.present
+                columns.append((present if nulls_first else ~present).astype(np.int8))
+                columns.append(np.where(present, -column.values if descending else column.values, 0.0))
+            columns.append(self.product_ids)
+            # lexsort's primary key is the last one it is given
+            order = np.lexsort(columns[::-1])
+            ordering = (order, [column[order] for column in columns])
+            with self._lock:
+                self._orders[keys] = ordering
+                self._orders.move_to_end(keys)
+                while len(self._orders) > settings.RANKING_SNAPSHOT_ORDERINGS:
+                    self._orders.popitem(last=False)
+        return ordering
+
+    def page(self, keys, after=None, limit=None):
+        """
+        Return [(product_id, [sort values])] in ranking order.
+
+        keys is a tuple of (attribute_id, descending, nulls_first). 'after'
+        is a keyset cursor state ({'value': [sort values], 'id'}); its
+        position is found by binary search, so a page costs O(log n + limit).
+        """
+        keys = tuple(keys)
+        sort_columns = [self._column(attribute_id) for attribute_id, _, _ in keys]
+        order, columns = self._ordering(keys)
+        start = 0
+        if after is not None:
+            target = []
+            for (_, descending, nulls_first), column, value in zip(keys, sort_columns, after['value']):
+                if value is None:
+                    target += [0 if nulls_first else 1, 0.0]
+                else:
+                    key = column.key(value)
+                    target += [1 if nulls_first else 0, -key if descending else key]
+            target.append(after['id'])
+            start = bisect.bisect_right(
+                range(order.size), tuple(target), key=lambda i: tuple(column[i] for column in columns)
+            )
+        stop = order.size if limit is None else start + limit
+        return [
+            (int(self.product_ids[index]), [column.sort_value(index) for column in sort_columns])
+            for index in order[start:stop]
+        ]
+
+    def matrix(self, attribute_ids):
+        """Products x attributes float matrix of the given columns, NaN where a value is missing"""
+        matrix = np.full((self.product_ids.size, len(attribute_ids)), np.nan)
+        for j, attribute_id in enumerate(attribute_ids):
+            column = self._column(attribute_id)
+            matrix[column.present, j] = column.values[column.present]
+        return matrix
+
+
+_snapshots = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(comparison_id, version):
+    """Snapshot for the given comparison version, rebuilt when the version changed"""
+    with _snapshots_lock:
+        snapshot = _snapshots.get(comparison_id)
+        if snapshot is not None and snapshot.version == version:
+            _snapshots.move_to_end(comparison_id)
+            return snapshot
+
+    snapshot = ComparisonSnapshot.build(comparison_id, version)
+    with _snapshots_lock:
+        _snapshots[comparison_id] = snapshot
+        _snapshots.move_to_end(comparison_id)
+        while len(_snapshots) > settings.RANKING_SNAPSHOT_CACHE_SIZE:
+            _snapshots.popitem(last=False)
+    return snapshot
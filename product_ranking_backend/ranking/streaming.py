@@ -0,0 +1,57 @@
+"""
+Incremental JSON rendering of ranking results.
+
+Streamed responses never hold more than one chunk of products: products
+are read with QuerySet.iterator(chunk_size=...) or fetched by id chunk by
+chunk, and each chunk is encoded and sent before the next one is loaded.
+"""
+from django.db.models import Prefetch
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import ProductAttributeData
+
+
+def _with_attribute_data(queryset):
+    return queryset.prefetch_related(
+        Prefetch('attribute_data', queryset=ProductAttributeData.objects.select_related('attribute'))
+    )
+
+
+def iter_queryset_chunks(queryset, chunk_size):
+    """Lists of products from an ordered queryset with their attribute data, chunk_size at a time"""
+    chunk = []
+    for product in _with_attribute_data(queryset).iterator(chunk_size=chunk_size):
+        chunk.append(product)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_id_chunks(queryset, product_ids, chunk_size):
+    """Lists of products in the order of product_ids with their attribute data, chunk_size at a time"""
+    for start in range(0, len(product_ids), chunk_size):
+        chunk_ids = product_ids[start:start + chunk_size]
+        products = _with_attribute_data(queryset).in_bulk(chunk_ids)
+        # Products deleted since the ordering was computed are skipped
+        yield [products[product_id] for product_id in chunk_ids if product_id in products]
+
+
+def stream_json(header, key, chunks):
+    """
+    Yield the JSON text of header with an extra 'key' array member.
+
+    The array is rendered from 'chunks', an iterable of lists of items, one
+    string per chunk.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    head = encoder.encode(header)
+    yield head[:-1] + (',' if header else '') + encoder.encode(key) + ':['
+    first = True
+    for items in chunks:
+        if not items:
+            continue
+        yield ('' if first else ',') + ','.join(encoder.encode(item) for item in items)
+        first = False
+    yield ']}'
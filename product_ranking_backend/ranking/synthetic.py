@@ -0,0 +1,83 @@
+"""Deterministic synthetic comparisons for load testing and benchmarks"""
+import random
+
+from django.db import transaction
+
+from .models import Attribute, Comparison, Product, ProductAttributeData
+from .scoring import _parse_options
+
+
+DATA_TYPES = ('number', 'boolean', 'text')
+DEFAULT_TYPE_MIX = 'number:6,boolean:2,text:2'
+TEXT_VALUES = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel')
+UNITS = ('USD', 'GB', 'GHz', 'mAh', 'g', 'mm', None)
+
+
+def parse_type_mix(raw):
+    """Parse 'number:6,boolean:2,text:2' into relative weights per data type"""
+    _, mix = _parse_options(raw or DEFAULT_TYPE_MIX, cast=float)
+    unknown = set(mix) - set(DATA_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown data type(s): {', '.join(sorted(unknown))}")
+    if any(weight < 0 for weight in mix.values()) or not sum(mix.values()):
+        raise ValueError('Type weights must be non-negative and not all zero')
+    return mix
+
+
+def synthetic_comparisons(comparisons=1, products=100, attributes=8, type_mix=None, missing=0.05, seed=0):
+    """
+    Yield comparison specs: {'name', 'description', 'attributes': [(name, data_type, unit)],
+    'products': [(name, description, [value or None per attribute])]}.
+
+    The same arguments always produce the same data.
+    """
+    rng = random.Random(seed)
+    mix = parse_type_mix(type_mix) if isinstance(type_mix, str) or type_mix is None else type_mix
+    types, weights = zip(*mix.items())
+    for c in range(comparisons):
+        spec_attributes = []
+        for a in range(attributes):
+            data_type = rng.choices(types, weights)[0]
+            spec_attributes.append((f'attr_{a:03d}', data_type, rng.choice(UNITS) if data_type == 'number' else None))
+        spec_products = []
+        for p in range(products):
+            values = []
+            for _, data_type, _ in spec_attributes:
+                if rng.random() < missing:
+                    values.append(None)
+                elif data_type == 'number':
+                    values.append(str(round(rng.lognormvariate(5, 1), 2)))
+                elif data_type == 'boolean':
+                    values.append(rng.choice(('true', 'false')))
+                else:
+                    values.append(rng.choice(TEXT_VALUES))
+            spec_products.append((f'Product {p:06d}', f'Synthetic product {p}', values))
+        yield {
+            'name': f'Synthetic comparison {c:04d}',
+            'description': f'{products} products x {attributes} attributes (seed {seed})',
+            'attributes': spec_attributes,
+            'products': spec_products,
+        }
+
+
+def create_comparison(spec, batch_size=1000):
+    """Store a comparison spec with bulk inserts and return the Comparison"""
+    with transaction.atomic():
+        comparison = Comparison.objects.create(name=spec['name'], description=spec['description'])
+        attributes = Attribute.objects.bulk_create([
+            Attribute(comparison=comparison, name=name, data_type=data_type, unit=unit)
+            for name, data_type, unit in spec['attributes']
+        ])
+        products = Product.objects.bulk_create([
+            Product(comparison=comparison, name=name, description=description)
+            for name, description, _ in spec['products']
+        ], batch_size=batch_size)
+        rows = []
+        for product, (_, _, values) in zip(products, spec['products']):
+            for attribute, value in zip(attributes, values):
+                if value is not None:
+                    row = ProductAttributeData(product=product, attribute=attribute, value=value)
+                    row.set_typed_values(attribute)
+                    rows.append(row)
+        ProductAttributeData.objects.bulk_create(rows, batch_size=batch_size)
+    return comparison
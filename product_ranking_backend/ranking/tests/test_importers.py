@@ -0,0 +1,49 @@
+import io
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from ranking.importers import ImportAborted, import_products, open_rows
+from ranking.models import Attribute, Comparison, Product
+
+
+class ImportTests(TestCase):
+
+    def setUp(self):
+        self.comparison = Comparison.objects.create(name='Laptops')
+        Attribute.objects.create(comparison=self.comparison, name='Price', data_type='number')
+
+    def rows(self, count):
+        lines = ['name,Price'] + [f'Laptop {i},{100 + i}' for i in range(count)]
+        return open_rows(io.BytesIO('\n'.join(lines).encode()), 'csv')
+
+    def test_import_report(self):
+        report = import_products(self.comparison, self.rows(5), batch_size=2)
+        self.assertEqual((report['created'], report['values'], report['imported_through_row']), (5, 5, 6))
+        self.assertEqual(Product.objects.filter(comparison=self.comparison).count(), 5)
+
+    def test_conflict_in_first_batch_reports_its_first_row(self):
+        with mock.patch('ranking.importers.Product.objects.bulk_create', side_effect=IntegrityError('UNIQUE')):
+            with self.assertRaises(ImportAborted) as aborted:
+                import_products(self.comparison, self.rows(5), batch_size=2)
+        # Line 1 is the header, so the first product is on line 2
+        self.assertEqual(aborted.exception.report['stopped_at_row'], 2)
+        self.assertEqual(aborted.exception.report['created'], 0)
+
+    def test_conflict_in_later_batch_reports_its_first_row(self):
+        bulk_create = Product.objects.bulk_create
+        calls = []
+
+        def conflict_on_second_batch(products, *args, **kwargs):
+            calls.append(products)
+            if len(calls) == 2:
+                raise IntegrityError('UNIQUE')
+            return bulk_create(products, *args, **kwargs)
+
+        with mock.patch('ranking.importers.Product.objects.bulk_create', side_effect=conflict_on_second_batch):
+            with self.assertRaises(ImportAborted) as aborted:
+                import_products(self.comparison, self.rows(5), batch_size=2)
+        report = aborted.exception.report
+        self.assertEqual((report['created'], report['imported_through_row'], report['stopped_at_row']), (2, 3, 4))
+        self.assertEqual(Product.objects.filter(comparison=self.comparison).count(), 2)
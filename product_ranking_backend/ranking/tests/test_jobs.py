@@ -0,0 +1,117 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+
+from ranking import jobs
+from ranking.cache import bump_version
+from ranking.models import Attribute, Comparison, Job, Product, ProductAttributeData
+
+
+@mock.patch.object(jobs, 'close_old_connections', lambda: None)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        self.comparison = Comparison.objects.create(name='Laptops')
+        price = Attribute.objects.create(comparison=self.comparison, name='Price', data_type='number')
+        for i, value in enumerate(['999', '499', '1500']):
+            product = Product.objects.create(comparison=self.comparison, name=f'Laptop {i}')
+            ProductAttributeData.objects.create(product=product, attribute=price, value=value)
+
+    def expire(self, job_id):
+        expired = timezone.now() - timedelta(seconds=settings.RANKING_JOB_TIMEOUT + 60)
+        Job.objects.filter(pk=job_id).update(started_at=expired)
+
+    def test_enqueue_shares_equal_jobs(self):
+        job, created = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        self.assertTrue(created)
+        same, created = jobs.enqueue('results', str(self.comparison.id), {'sort_by': ['Price']})
+        self.assertFalse(created)
+        self.assertEqual(same.pk, job.pk)
+        other, created = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price', 'sort_order': 'asc'})
+        self.assertTrue(created)
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_enqueue_after_a_write_or_failure_queues_again(self):
+        job, _ = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        bump_version(self.comparison.id)
+        newer, created = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        self.assertTrue(created)
+        Job.objects.filter(pk=newer.pk).update(status='failed')
+        retried, created = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        self.assertTrue(created)
+        self.assertNotIn(retried.pk, (job.pk, newer.pk))
+
+    def test_enqueue_rejects_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('import', self.comparison.id)
+        with self.assertRaises(ValueError):
+            jobs.enqueue('pareto')
+        with self.assertRaises(Comparison.DoesNotExist):
+            jobs.enqueue('results', self.comparison.id + 1)
+
+    def test_claim_takes_oldest_queued_job_once(self):
+        first, _ = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        second, _ = jobs.enqueue('export', self.comparison.id)
+        self.assertEqual(jobs.claim_next('a'), first.pk)
+        self.assertEqual(jobs.claim_next('b'), second.pk)
+        self.assertIsNone(jobs.claim_next('c'))
+        self.assertEqual(Job.objects.get(pk=first.pk).worker, 'a')
+
+    def test_run_job_stores_result(self):
+        job, _ = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        self.assertEqual(jobs.run_job(jobs.claim_next('a')), 'done')
+        job.refresh_from_db()
+        self.assertEqual([row['product_name'] for row in job.result['results']], ['Laptop 2', 'Laptop 0', 'Laptop 1'])
+        done, created = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        self.assertFalse(created)
+        self.assertEqual(done.status, 'done')
+
+    def test_expired_job_is_taken_over_and_the_first_run_discarded(self):
+        job, _ = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        jobs.claim_next('a')
+        self.expire(job.pk)
+        view = jobs.RUNNERS['results']
+
+        def slow_run(running):
+            # Worker b takes the job over while a is still computing
+            self.assertEqual(jobs.claim_next('b'), job.pk)
+            return {'from': 'a'}
+
+        with mock.patch.dict(jobs.RUNNERS, {'results': slow_run}):
+            self.assertEqual(jobs.run_job(job.pk), 'taken over')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.result), ('running', 'b', None))
+
+        with mock.patch.dict(jobs.RUNNERS, {'results': view}):
+            self.assertEqual(jobs.run_job(job.pk), 'done')
+        job.refresh_from_db()
+        self.assertEqual(job.worker, 'b')
+        self.assertEqual(len(job.result['results']), 3)
+
+    def test_fail_job_leaves_taken_over_jobs_alone(self):
+        job, _ = jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        jobs.claim_next('a')
+        self.expire(job.pk)
+        jobs.claim_next('b')
+        jobs.fail_job(job.pk, 'Worker process died', 'a')
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'running')
+        jobs.fail_job(job.pk, 'Worker process died', 'b')
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'failed')
+
+    def test_running_jobs_are_not_taken_over_before_they_expire(self):
+        jobs.enqueue('results', self.comparison.id, {'sort_by': 'Price'})
+        jobs.claim_next('a')
+        self.assertIsNone(jobs.claim_next('b'))
+
+    def test_expired_imports_fail_instead_of_running_twice(self):
+        job = Job.objects.create(kind='import', comparison=self.comparison, version=self.comparison.version,
+                                 params={'batch_size': ['10'], 'input_format': ['csv']})
+        self.assertEqual(jobs.claim_next('a'), job.pk)
+        self.expire(job.pk)
+        self.assertIsNone(jobs.claim_next('b'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), ('failed', 'a'))
+        self.assertTrue(job.error)
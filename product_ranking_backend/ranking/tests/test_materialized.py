@@ -0,0 +1,116 @@
+import random
+
+from django.test import TestCase
+
+from ranking.materialized import build, get_materialization, record_changes
+from ranking.models import Attribute, Comparison, Product, ProductAttributeData, RankingMaterialization
+from ranking.upserts import create_product, upsert_attribute_values
+
+
+def _ranks(materialization):
+    return list(
+        materialization.ranks.order_by('position').values_list('product_id', 'position', 'numeric_value', 'text_value')
+    )
+
+
+class IncrementalRankingTests(TestCase):
+    """Materializations kept up to date by record_changes() must equal a rebuild from scratch"""
+
+    def setUp(self):
+        self.rng = random.Random(7)
+        self.comparison = Comparison.objects.create(name='Laptops')
+        self.attributes = [
+            Attribute.objects.create(comparison=self.comparison, name='Price', data_type='number'),
+            Attribute.objects.create(comparison=self.comparison, name='CPU', data_type='text'),
+            Attribute.objects.create(comparison=self.comparison, name='Wifi', data_type='boolean'),
+        ]
+        for i in range(30):
+            create_product(self.comparison.id, [
+                (attribute.id, self.random_value(attribute)) for attribute in self.attributes
+            ], name=f'Laptop {i}')
+        self.comparison.refresh_from_db()
+        for attribute in self.attributes:
+            for descending in (False, True):
+                build(attribute, descending, self.comparison.version)
+
+    def random_value(self, attribute):
+        """Few distinct values, so there are many ties, and about one in five missing"""
+        if self.rng.random() < 0.2:
+            return None
+        if attribute.data_type == 'number':
+            return self.rng.choice(['100', '250', '250.0', '999', '-5'])
+        if attribute.data_type == 'text':
+            return self.rng.choice(['i5', 'I5', 'i7', 'M2', 'm3'])
+        return self.rng.choice(['true', 'false', 'yes'])
+
+    def random_cells(self, count):
+        product_ids = list(Product.objects.filter(comparison=self.comparison).values_list('id', flat=True))
+        return [
+            (self.rng.choice(product_ids), attribute.id, self.random_value(attribute))
+            for attribute in self.rng.sample(self.attributes, 2) for _ in range(count)
+        ]
+
+    def assertMatchesRebuild(self):
+        self.comparison.refresh_from_db()
+        materializations = RankingMaterialization.objects.filter(attribute__comparison=self.comparison)
+        self.assertEqual(materializations.count(), 6)
+        for materialization in materializations.select_related('attribute'):
+            with self.subTest(attribute=materialization.attribute.name, descending=materialization.descending):
+                # Still valid, so reads do not rebuild it
+                self.assertEqual(materialization.version, self.comparison.version)
+                incremental = _ranks(materialization)
+                self.assertEqual(incremental, _ranks(build(materialization.attribute, materialization.descending,
+                                                           self.comparison.version)))
+
+    def test_updates_and_deletes(self):
+        for _ in range(15):
+            # None values delete the cell
+            upsert_attribute_values(self.comparison.id, self.random_cells(3))
+            self.assertMatchesRebuild()
+
+    def test_inserts(self):
+        for i in range(10):
+            create_product(self.comparison.id, [
+                (attribute.id, self.random_value(attribute)) for attribute in self.attributes
+            ], name=f'New laptop {i}')
+            self.assertMatchesRebuild()
+
+    def test_products_added_without_values(self):
+        for i in range(3):
+            Product.objects.create(comparison=self.comparison, name=f'Bare laptop {i}')
+        self.assertMatchesRebuild()
+        product = Product.objects.get(name='Bare laptop 1')
+        ProductAttributeData.objects.create(product=product, attribute=self.attributes[0], value='250')
+        self.assertMatchesRebuild()
+
+    def test_saved_values(self):
+        for data in ProductAttributeData.objects.filter(product__comparison=self.comparison).order_by('?')[:10]:
+            data.value = self.random_value(data.attribute) or '0'
+            data.save()
+            self.assertMatchesRebuild()
+
+    def test_mixed_changes_in_one_record(self):
+        product = create_product(self.comparison.id, name='Laptop without values')
+        cells = [(product.id, self.attributes[0].id, '250')] + self.random_cells(4)
+        upsert_attribute_values(self.comparison.id, cells)
+        self.assertMatchesRebuild()
+
+    def test_large_writes_leave_materializations_to_rebuild(self):
+        with self.settings(RANKING_MATERIALIZED_MAX_MOVES=2):
+            upsert_attribute_values(self.comparison.id, self.random_cells(5))
+        self.comparison.refresh_from_db()
+        attribute = self.attributes[0]
+        materialization = RankingMaterialization.objects.get(attribute=attribute, descending=False)
+        self.assertLess(materialization.version, self.comparison.version)
+        rebuilt = get_materialization(attribute, False, self.comparison.version)
+        self.assertEqual(rebuilt.version, self.comparison.version)
+
+    def test_product_missing_from_materialization_makes_it_stale(self):
+        product = Product.objects.filter(comparison=self.comparison).first()
+        materialization = RankingMaterialization.objects.get(attribute=self.attributes[0], descending=True)
+        materialization.ranks.filter(product=product).delete()
+        ProductAttributeData.objects.filter(product=product, attribute=self.attributes[0]).update(value='1', numeric_value=1)
+        record_changes(self.comparison.id, cells=[(product.id, self.attributes[0].id)])
+        materialization.refresh_from_db()
+        self.comparison.refresh_from_db()
+        self.assertLess(materialization.version, self.comparison.version)
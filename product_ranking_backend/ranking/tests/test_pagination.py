@@ -0,0 +1,175 @@
+import random
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ranking import snapshot, views
+from ranking.models import Attribute, Comparison, Product, RankingMaterialization
+from ranking.pagination import encode_cursor
+from ranking.upserts import create_product
+
+
+# Orderings over tied and missing values; the first four can be read from materializations
+SORTS = [
+    'sort_by=Price',
+    'sort_by=Price&sort_order=asc&rank_method=rank',
+    'sort_by=CPU&sort_order=asc',
+    'sort_by=Wifi&rank_method=rank',
+    'sort_by=RAM:desc:nulls_first',
+    'sort_by=Price:asc,RAM&rank_method=dense_rank',
+    'sort_by=Wifi,CPU:asc:nulls_first,Price',
+]
+
+
+class CursorPaginationTests(TestCase):
+    """Paging through results with cursors must return the unpaged ranking, page by page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(3)
+        cls.comparison = Comparison.objects.create(name='Laptops')
+        attributes = [
+            Attribute.objects.create(comparison=cls.comparison, name='Price', data_type='number', unit='USD'),
+            Attribute.objects.create(comparison=cls.comparison, name='RAM', data_type='number', unit='GB'),
+            Attribute.objects.create(comparison=cls.comparison, name='Wifi', data_type='boolean'),
+            Attribute.objects.create(comparison=cls.comparison, name='CPU', data_type='text'),
+        ]
+        choices = {'Price': ['499', '999', '999.00', '1500'], 'RAM': ['8', '16', '16'], 'Wifi': ['true', 'false'],
+                   'CPU': ['i5', 'I5', 'i7', 'M2']}
+        for i in range(37):
+            # Few distinct values for many ties, and about a quarter of the values missing
+            values = [
+                (attribute.id, rng.choice(choices[attribute.name]))
+                for attribute in attributes if rng.random() > 0.25
+            ]
+            create_product(cls.comparison.id, values, name=f'Laptop {i:02d}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = f'/api/comparisons/{self.comparison.id}/results/'
+        cache.clear()
+        snapshot._snapshots.clear()
+
+    def results(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def assertPagesMatch(self, query):
+        full = [(row['product_id'], row['rank']) for row in self.results(query)['results']]
+        self.assertTrue(full)
+        for limit in (1, 5, 9):
+            with self.subTest(query=query, limit=limit):
+                offset, cursor = 0, None
+                while True:
+                    data = self.results(f'{query}&limit={limit}' + (f'&cursor={cursor}' if cursor else ''))
+                    page = [(row['product_id'], row['rank']) for row in data['results']]
+                    self.assertEqual(page, full[offset:offset + limit])
+                    offset += len(page)
+                    cursor = data['next_cursor']
+                    if cursor is None:
+                        break
+                self.assertEqual(offset, len(full))
+
+    @override_settings(RANKING_MATERIALIZED_RANKS=False, RANKING_SNAPSHOTS=False)
+    def test_sql_path(self):
+        with mock.patch.object(views, 'rank_products', wraps=views.rank_products) as rank_products:
+            for query in SORTS:
+                self.assertPagesMatch(query)
+        self.assertTrue(rank_products.called)
+
+    @override_settings(RANKING_MATERIALIZED_RANKS=False, RANKING_SNAPSHOTS=True)
+    def test_snapshot_path(self):
+        with mock.patch.object(views, 'get_snapshot', wraps=views.get_snapshot) as get_snapshot, \
+                mock.patch.object(views, 'rank_products') as rank_products:
+            for query in SORTS:
+                self.assertPagesMatch(query)
+        self.assertTrue(get_snapshot.called)
+        rank_products.assert_not_called()
+
+    @override_settings(RANKING_MATERIALIZED_RANKS=False, RANKING_SNAPSHOTS=True, RANKING_SNAPSHOT_ORDERINGS=2)
+    def test_snapshot_orderings_are_capped(self):
+        for query in SORTS:
+            self.assertPagesMatch(query)
+        orders = snapshot._snapshots[self.comparison.id]._orders
+        self.assertEqual(len(orders), 2)
+        # The most recently used sort is kept, so asking for it again evicts nothing
+        kept = list(orders)
+        self.results(f'{SORTS[-1]}&limit=1')
+        self.assertEqual(list(orders), kept)
+
+    @override_settings(RANKING_MATERIALIZED_RANKS=True, RANKING_SNAPSHOTS=False)
+    def test_materialized_path(self):
+        with mock.patch.object(views, 'materialized_page', wraps=views.materialized_page) as materialized_page:
+            for query in SORTS[:4]:
+                self.assertPagesMatch(query)
+        self.assertTrue(materialized_page.called)
+        self.assertEqual(RankingMaterialization.objects.filter(attribute__comparison=self.comparison).count(), 4)
+
+    def test_filtered_results(self):
+        self.assertPagesMatch('sort_by=Price&filter=RAM>=16')
+        self.assertPagesMatch('weights=Price:1,RAM:1&directions=Price:asc&rank_method=rank')
+
+    def test_default_order(self):
+        self.assertPagesMatch('rank_method=row_number')
+
+    def test_invalid_cursors(self):
+        first = self.results('sort_by=Price&limit=5')
+        two_keys = ['Price:asc,RAM', 'desc', 'row_number', '', '', '', []]
+        one_key = ['Price', 'desc', 'row_number', '', '', '', []]
+        queries = (
+            'sort_by=Price&limit=5&cursor=abc',
+            'sort_by=Price&limit=5&cursor=e30',  # {}
+            f"sort_by=RAM&limit=5&cursor={first['next_cursor']}",
+            f"sort_by=Price&sort_order=asc&limit=5&cursor={first['next_cursor']}",
+            # One sort value for two sort keys
+            'sort_by=Price:asc,RAM&limit=5&cursor='
+            + encode_cursor(two_keys, {'id': 1, 'position': 1, 'value': [999.0], 'rank': 1}),
+            # Text where the sort value is a number
+            'sort_by=Price&limit=5&cursor=' + encode_cursor(one_key, {'id': 1, 'position': 1, 'value': ['x'], 'rank': 1}),
+        )
+        for materialized, snapshots in ((False, False), (False, True), (True, False)):
+            with self.settings(RANKING_MATERIALIZED_RANKS=materialized, RANKING_SNAPSHOTS=snapshots):
+                for query in queries:
+                    with self.subTest(query=query, materialized=materialized, snapshots=snapshots):
+                        cache.clear()
+                        response = self.client.get(f'{self.url}?{query}')
+                        self.assertEqual(response.status_code, 400)
+                        self.assertIn('cursor', response.data['error'].lower())
+
+    def test_cursor_follows_moved_product(self):
+        # A product on a returned page that moves before the next page is requested does not break the walk
+        first = self.results('sort_by=Price&limit=5')
+        moved = Product.objects.get(id=first['results'][-1]['product_id'])
+        price = Attribute.objects.get(comparison=self.comparison, name='Price')
+        moved.attribute_data.filter(attribute=price).delete()
+        create_product(self.comparison.id, [(price.id, '1')], name='Cheap laptop')
+        second = self.results(f"sort_by=Price&limit=5&cursor={first['next_cursor']}")
+        ids = [row['product_id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+
+
+class ComparisonListTests(TestCase):
+    """The sync and async comparison lists filter alike and reject each other's cursors"""
+
+    def setUp(self):
+        for i in range(5):
+            Comparison.objects.create(name=f'Laptops {i}' if i % 2 else f'Phones {i}')
+
+    def test_lists_match(self):
+        for query in ('name=laptops&page_size=1', 'created_after=2000-01-01&page_size=2', 'created_before=2000-01-01'):
+            with self.subTest(query=query):
+                sync = self.client.get(f'/api/comparisons/?{query}').json()
+                async_ = self.client.get(f'/api/async/comparisons/?{query}').json()
+                self.assertEqual(sync['results'], async_['results'])
+                self.assertEqual(sync['next'] is None, async_['next'] is None)
+        self.assertEqual(self.client.get('/api/comparisons/?created_after=soon').status_code, 400)
+        self.assertEqual(self.client.get('/api/async/comparisons/?created_after=soon').status_code, 400)
+
+    def test_cursors_are_not_interchangeable(self):
+        sync = self.client.get('/api/comparisons/?page_size=2').json()['next']
+        async_ = self.client.get('/api/async/comparisons/?page_size=2').json()['next']
+        self.assertEqual(self.client.get(async_.replace('/api/async/comparisons/', '/api/comparisons/')).status_code, 404)
+        self.assertEqual(self.client.get(sync.replace('/api/comparisons/', '/api/async/comparisons/')).status_code, 400)
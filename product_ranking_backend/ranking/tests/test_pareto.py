@@ -0,0 +1,65 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from ranking.pareto import dominance_layers, skyline
+
+
+def brute_force_skyline(matrix):
+    """Rows that no other row is at least as good as everywhere and better than somewhere"""
+    return [
+        i for i in range(len(matrix))
+        if not any((matrix[j] >= matrix[i]).all() and (matrix[j] > matrix[i]).any() for j in range(len(matrix)))
+    ]
+
+
+def brute_force_layers(matrix, directions, max_layers):
+    matrix = np.array(matrix, dtype=float)
+    for column, direction in enumerate(directions):
+        if direction == 'asc':
+            matrix[:, column] *= -1
+    # Missing values are worse than any real value
+    matrix = np.where(np.isnan(matrix), -np.inf, matrix)
+    remaining = list(range(len(matrix)))
+    layers = []
+    while remaining and len(layers) < max_layers:
+        layer = [remaining[i] for i in brute_force_skyline(matrix[remaining])]
+        layers.append(layer)
+        remaining = [i for i in remaining if i not in layer]
+    return layers
+
+
+class SkylineTests(SimpleTestCase):
+
+    def random_matrices(self, rng, count):
+        for n in range(count):
+            rows, columns = rng.integers(1, 80), rng.integers(1, 6)
+            if n % 3 == 0:
+                # Few distinct values: ties and duplicate rows
+                yield rng.integers(0, 4, size=(rows, columns)).astype(float)
+            elif n % 3 == 1:
+                # Anti-correlated: most rows are on the frontier
+                u = rng.random((rows, columns))
+                yield u - u.mean(axis=1, keepdims=True) + rng.normal(scale=0.05, size=(rows, columns))
+            else:
+                yield rng.normal(size=(rows, columns))
+
+    def test_skyline_matches_brute_force(self):
+        rng = np.random.default_rng(12)
+        for matrix in self.random_matrices(rng, 300):
+            with self.subTest(shape=matrix.shape):
+                self.assertEqual(sorted(skyline(matrix).tolist()), brute_force_skyline(matrix))
+
+    def test_dominance_layers_match_brute_force(self):
+        rng = np.random.default_rng(13)
+        for matrix in self.random_matrices(rng, 150):
+            matrix[rng.random(matrix.shape) < 0.1] = np.nan
+            directions = rng.choice(['asc', 'desc'], size=matrix.shape[1]).tolist()
+            with self.subTest(shape=matrix.shape, directions=directions):
+                layers = [layer.tolist() for layer in dominance_layers(matrix, directions, max_layers=4)]
+                self.assertEqual(layers, brute_force_layers(matrix, directions, 4))
+
+    def test_edge_cases(self):
+        self.assertEqual(skyline(np.empty((0, 3))).tolist(), [])
+        self.assertEqual(sorted(skyline(np.ones((4, 3))).tolist()), [0, 1, 2, 3])
+        self.assertEqual(sorted(skyline(np.array([[1.0], [3.0], [3.0], [2.0]])).tolist()), [1, 2])
+        self.assertEqual(dominance_layers([[np.nan, np.nan], [1, np.nan]], ['asc', 'desc'], 5), [[1], [0]])
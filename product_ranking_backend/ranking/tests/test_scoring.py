@@ -0,0 +1,75 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from ranking.scoring import compute_scores, parse_scoring_params
+
+
+def scores(column, direction='desc', normalization='minmax'):
+    return compute_scores([[value] for value in column], [1], [direction], [normalization])
+
+
+class ComputeScoresTests(SimpleTestCase):
+
+    def test_minmax(self):
+        np.testing.assert_allclose(scores([1, 2, 3]), [0, 0.5, 1])
+
+    def test_zscore(self):
+        np.testing.assert_allclose(scores([1, 2, 3], normalization='zscore'), [-np.sqrt(1.5), 0, np.sqrt(1.5)])
+
+    def test_rank_averages_ties(self):
+        np.testing.assert_allclose(scores([10, 30, 20], normalization='rank'), [0, 1, 0.5])
+        np.testing.assert_allclose(scores([1, 1, 2], normalization='rank'), [0.25, 0.25, 1])
+
+    def test_asc_prefers_lower_values(self):
+        for normalization in ('minmax', 'zscore', 'rank'):
+            with self.subTest(normalization=normalization):
+                self.assertEqual(list(np.argsort(scores([1, 3, 2], 'asc', normalization))), [1, 2, 0])
+
+    def test_constant_column_scores_every_product_alike(self):
+        np.testing.assert_allclose(scores([5, 5, 5]), [0, 0, 0])
+        np.testing.assert_allclose(scores([5, 5, 5], normalization='zscore'), [0, 0, 0])
+        np.testing.assert_allclose(scores([5, 5, 5], normalization='rank'), [0.5, 0.5, 0.5])
+
+    def test_missing_values_take_the_worst_value(self):
+        np.testing.assert_allclose(scores([1, np.nan, 3]), [0, 0, 1])
+        np.testing.assert_allclose(scores([1, np.nan, 3], 'asc'), [1, 0, 0])
+        np.testing.assert_allclose(scores([1, np.nan, 3], normalization='zscore'), [-1, -1, 1])
+
+    def test_all_nan_column_adds_nothing(self):
+        matrix = [[1, np.nan], [3, np.nan]]
+        for normalization in ('minmax', 'zscore', 'rank'):
+            with self.subTest(normalization=normalization):
+                result = compute_scores(matrix, [1, 1], ['desc', 'desc'], ['minmax', normalization])
+                np.testing.assert_allclose(result, [0, 0.5])
+
+    def test_weights_are_normalized(self):
+        matrix = [[1, 20], [3, 10]]
+        np.testing.assert_allclose(compute_scores(matrix, [3, 1], ['desc', 'desc'], ['minmax', 'minmax']), [0.25, 0.75])
+
+    def test_mixed_normalizations(self):
+        matrix = [[1, 10], [2, 30], [3, 20]]
+        result = compute_scores(matrix, [1, 1], ['desc', 'asc'], ['minmax', 'rank'])
+        np.testing.assert_allclose(result, [0.5, 0.25, 0.75])
+
+    def test_empty_matrix(self):
+        self.assertEqual(compute_scores(np.empty((3, 0)), [], [], []).tolist(), [0, 0, 0])
+
+
+class ParseScoringParamsTests(SimpleTestCase):
+
+    def test_defaults_apply_to_every_weight(self):
+        criteria = parse_scoring_params({'weights': 'Price:2,RAM:1', 'directions': 'Price:asc', 'normalization': 'rank'})
+        self.assertEqual(criteria, [
+            {'attribute': 'Price', 'weight': 2.0, 'direction': 'asc', 'normalization': 'rank'},
+            {'attribute': 'RAM', 'weight': 1.0, 'direction': 'desc', 'normalization': 'rank'},
+        ])
+
+    def test_weight_without_attribute_is_rejected(self):
+        for weights in ('2', 'Price:1,2'):
+            with self.subTest(weights=weights), self.assertRaisesMessage(ValueError, 'must name their attribute'):
+                parse_scoring_params({'weights': weights})
+
+    def test_invalid_weights(self):
+        for weights in ('Price:x', 'Price:-1', 'Price:inf', 'Price:0'):
+            with self.subTest(weights=weights), self.assertRaises(ValueError):
+                parse_scoring_params({'weights': weights})
@@ -0,0 +1,87 @@
+import copy
+
+from django.test import SimpleTestCase
+
+from ranking import values
+from ranking.values import canonical_number, lookup_unit, parse_boolean, parse_quantity, register_units, typed_values
+
+
+class UnitParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        # register_units() changes module state shared by every test
+        saved = (copy.deepcopy(values.UNIT_DIMENSIONS), dict(values._units), dict(values._lowercase_aliases))
+
+        def restore():
+            dimensions, units, aliases = saved
+            values.UNIT_DIMENSIONS.clear()
+            values.UNIT_DIMENSIONS.update(dimensions)
+            values._units.clear()
+            values._units.update(units)
+            values._lowercase_aliases.clear()
+            values._lowercase_aliases.update(aliases)
+        self.addCleanup(restore)
+
+    def test_parse_quantity(self):
+        self.assertEqual(parse_quantity('512GB'), (512, 'GB'))
+        self.assertEqual(parse_quantity(' 1.5 kg '), (1.5, 'kg'))
+        self.assertEqual(parse_quantity('$1,299'), (1299, 'USD'))
+        self.assertEqual(parse_quantity('€ 5 EUR'), (5, 'EUR'))
+        self.assertEqual(parse_quantity('2e3 mAh'), (2000, 'mAh'))
+        self.assertEqual(parse_quantity('15.6"'), (15.6, '"'))
+        self.assertEqual(parse_quantity(42), (42, None))
+        self.assertIsNone(parse_quantity('$5 GB'))
+        self.assertIsNone(parse_quantity('fast'))
+        self.assertIsNone(parse_quantity(True))
+        self.assertIsNone(parse_quantity(None))
+
+    def test_units_are_case_sensitive(self):
+        self.assertEqual(lookup_unit('mW'), ('power', 1e-3))
+        self.assertIsNone(lookup_unit('MW'))
+        self.assertEqual(lookup_unit('MB'), ('data', 1e6))
+        self.assertIsNone(lookup_unit('Mb'))
+        self.assertIsNone(lookup_unit('Gb'))
+        self.assertIsNone(lookup_unit('GHZ'))
+
+    def test_lowercase_names_match_the_only_unit_with_that_form(self):
+        self.assertEqual(lookup_unit('gb'), ('data', 1e9))
+        self.assertEqual(lookup_unit(' ghz '), ('frequency', 1e9))
+        self.assertEqual(lookup_unit('usd'), ('currency', 1))
+        self.assertIsNone(lookup_unit('furlong'))
+        self.assertIsNone(lookup_unit(''))
+
+    def test_ambiguous_lowercase_names_match_nothing(self):
+        register_units('power', {'MW': 1e6})
+        register_units('bits', {'b': 1, 'Mb': 1e6})
+        self.assertEqual(lookup_unit('MW'), ('power', 1e6))
+        self.assertEqual(lookup_unit('mW'), ('power', 1e-3))
+        self.assertIsNone(lookup_unit('mw'))
+        self.assertEqual(lookup_unit('Mb'), ('bits', 1e6))
+        self.assertIsNone(lookup_unit('mb'))
+        self.assertEqual(lookup_unit('MB'), ('data', 1e6))
+
+    def test_canonical_number_converts_within_a_dimension(self):
+        self.assertEqual(canonical_number('1 TB', 'GB'), 1000)
+        self.assertEqual(canonical_number('2048 MiB', 'GiB'), 2)
+        self.assertEqual(canonical_number('120 EUR', 'USD'), 129.6)
+        self.assertEqual(canonical_number('16 gb', 'GB'), 16)
+        self.assertEqual(canonical_number('3.2', 'GHz'), 3.2)
+        self.assertEqual(canonical_number('1 TB'), 1e12)
+        self.assertIsNone(canonical_number('5 kg', 'GB'))
+
+    def test_canonical_number_keeps_case_of_registered_units(self):
+        self.assertIsNone(canonical_number('5 MW', 'mW'))
+        self.assertIsNone(canonical_number('100 Mb', 'MB'))
+        self.assertEqual(canonical_number('5 mW', 'W'), 0.005)
+
+    def test_unregistered_units_only_match_themselves(self):
+        self.assertEqual(canonical_number('300 pages', 'pages'), 300)
+        self.assertEqual(canonical_number('300 Pages', 'pages'), 300)
+        self.assertIsNone(canonical_number('300 pages', 'GB'))
+        self.assertIsNone(canonical_number('300 pages'))
+
+    def test_typed_values(self):
+        self.assertEqual(typed_values('yes', 'boolean'), (1.0, True))
+        self.assertEqual(typed_values('maybe', 'boolean'), (None, None))
+        self.assertEqual(typed_values('1.5 kg', 'number', 'g'), (1500, None))
+        self.assertEqual(parse_boolean(' Off '), False)
@@ -0,0 +1,41 @@
+from django.test import TestCase
+
+from ranking.cache import bump_version, get_version
+from ranking.deletion import mark_deleted
+from ranking.models import Comparison
+
+
+class ComparisonVersionTests(TestCase):
+
+    def setUp(self):
+        self.comparison = Comparison.objects.create(name='Laptops')
+
+    def test_save_bumps_version(self):
+        self.comparison.name = 'Notebooks'
+        self.comparison.save()
+        self.assertEqual(get_version(self.comparison.id), 2)
+        self.assertEqual(self.comparison.version, 2)
+
+    def test_stale_instance_does_not_move_version_back(self):
+        stale = Comparison.objects.get(pk=self.comparison.pk)
+        bump_version(self.comparison.id)
+        bump_version(self.comparison.id)
+        stale.name = 'Notebooks'
+        stale.save()
+        self.assertEqual(get_version(self.comparison.id), 4)
+        self.assertEqual(stale.version, 4)
+        self.assertEqual(Comparison.objects.get(pk=self.comparison.pk).name, 'Notebooks')
+
+    def test_update_fields_cannot_write_version(self):
+        stale = Comparison.objects.get(pk=self.comparison.pk)
+        bump_version(self.comparison.id)
+        stale.save(update_fields=['name', 'version'])
+        self.assertEqual(get_version(self.comparison.id), 3)
+
+    def test_stale_instance_does_not_undelete(self):
+        stale = Comparison.objects.get(pk=self.comparison.pk)
+        with self.settings(RANKING_DELETION_THREADS=False):
+            mark_deleted(stale)
+        stale.save()
+        self.assertFalse(Comparison.objects.filter(pk=self.comparison.pk).exists())
+        self.assertIsNotNone(Comparison.all_objects.get(pk=self.comparison.pk).deleted_at)
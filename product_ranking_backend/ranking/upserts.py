@@ -0,0 +1,151 @@
+"""Diff-based writes of product attribute values and creation of products with their values"""
+from django.db import transaction
+
+from .materialized import record_changes
+from .models import Attribute, Product, ProductAttributeData
+
+
+TYPED_FIELDS = ['value', 'numeric_value', 'boolean_value']
+
+
+def _to_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_cells(raw, max_cells):
+    """Validate a list of {'product_id', 'attribute_id', 'value'} objects into (product_id, attribute_id, value) cells"""
+    if not isinstance(raw, list):
+        raise ValueError("'cells' must be a list of {product_id, attribute_id, value} objects")
+    if len(raw) > max_cells:
+        raise ValueError(f'At most {max_cells} cells can be written at once')
+    cells = []
+    for index, cell in enumerate(raw):
+        if not isinstance(cell, dict) or 'value' not in cell:
+            raise ValueError(f'Cell {index} must be an object with product_id, attribute_id and value')
+        product_id, attribute_id = _to_id(cell.get('product_id')), _to_id(cell.get('attribute_id'))
+        if product_id is None or attribute_id is None:
+            raise ValueError(f'Cell {index} needs integer product_id and attribute_id')
+        value = cell['value']
+        if value is not None and not isinstance(value, (str, int, float, bool)):
+            raise ValueError(f'Cell {index} value must be a string, number, boolean or null')
+        cells.append((product_id, attribute_id, value))
+    return cells
+
+
+def resolve_cell_ids(comparison_id, cells):
+    """
+    Check that every cell's product and attribute belong to the comparison, with one query per model.
+
+    Returns ({id: Attribute} of the cells' attributes, unknown product ids, unknown attribute ids).
+    """
+    product_ids = {product_id for product_id, _, _ in cells}
+    attribute_ids = {attribute_id for _, attribute_id, _ in cells}
+    known_products = set(
+        Product.objects.filter(comparison_id=comparison_id, id__in=product_ids).values_list('id', flat=True)
+    )
+    attributes = Attribute.objects.filter(comparison_id=comparison_id, id__in=attribute_ids).in_bulk()
+    return attributes, sorted(product_ids - known_products), sorted(attribute_ids - attributes.keys())
+
+
+def upsert_attribute_values(comparison_id, cells, replace_product_ids=(), attributes=None):
+    """
+    Apply (product_id, attribute_id, value) cells to the stored attribute data.
+
+    Only differences are written: new and changed cells in one bulk upsert
+    and cells set to None deleted, all in one transaction. Products listed
+    in replace_product_ids also lose every value that is not in cells.
+    Attribute ids outside the comparison are ignored; product ids must
+    already be validated by the caller. Existing rows and attributes (unless
+    passed in as {id: Attribute}) are fetched with one query each. Returns
+    the changed cells.
+    """
+    wanted = {}
+    for product_id, attribute_id, value in cells:
+        product_id, attribute_id = _to_id(product_id), _to_id(attribute_id)
+        if product_id is not None and attribute_id is not None:
+            wanted[(product_id, attribute_id)] = None if value is None else str(value)
+
+    if attributes is None:
+        attributes = Attribute.objects.filter(
+            comparison_id=comparison_id, id__in={attribute_id for _, attribute_id in wanted}
+        ).in_bulk()
+    wanted = {key: value for key, value in wanted.items() if key[1] in attributes}
+
+    product_ids = {product_id for product_id, _ in wanted} | set(replace_product_ids)
+    existing_rows = ProductAttributeData.objects.filter(product_id__in=product_ids).only(
+        'id', 'product_id', 'attribute_id', 'value'
+    )
+    if not replace_product_ids:
+        existing_rows = existing_rows.filter(attribute_id__in={attribute_id for _, attribute_id in wanted})
+    existing = {(row.product_id, row.attribute_id): row for row in existing_rows}
+
+    to_write, to_delete, changes = [], [], []
+    for (product_id, attribute_id), value in wanted.items():
+        row = existing.get((product_id, attribute_id))
+        change = {'product_id': product_id, 'attribute_id': attribute_id, 'value': value}
+        if value is None:
+            if row is not None:
+                to_delete.append(row.id)
+                changes.append({**change, 'action': 'deleted'})
+        elif row is None or row.value != value:
+            # New and changed cells are written alike: the insert updates the row it conflicts with
+            data = ProductAttributeData(product_id=product_id, attribute_id=attribute_id, value=value)
+            data.set_typed_values(attributes[attribute_id])
+            to_write.append(data)
+            changes.append({**change, 'action': 'created' if row is None else 'updated'})
+
+    replaced = set(replace_product_ids)
+    for (product_id, attribute_id), row in existing.items():
+        if product_id in replaced and (product_id, attribute_id) not in wanted:
+            to_delete.append(row.id)
+            changes.append({'product_id': product_id, 'attribute_id': attribute_id, 'value': None,
+                            'action': 'deleted'})
+
+    if not changes:
+        return changes
+
+    with transaction.atomic():
+        if to_delete:
+            ProductAttributeData.objects.filter(id__in=to_delete).delete()
+        if to_write:
+            # INSERT ... ON CONFLICT (product, attribute) DO UPDATE
+            ProductAttributeData.objects.bulk_create(
+                to_write, update_conflicts=True,
+                unique_fields=['product', 'attribute'], update_fields=TYPED_FIELDS,
+            )
+        record_changes(comparison_id, cells=[(change['product_id'], change['attribute_id']) for change in changes])
+    return changes
+
+
+def create_product(comparison_id, values=(), **fields):
+    """
+    Create a product with (attribute_id, value) pairs in one transaction.
+
+    Pairs with attributes outside the comparison or a None value are
+    skipped. The product and its values are inserted in bulk, without
+    post_save signals, and recorded with a single record_changes(), so the
+    cost does not grow with the number of values.
+    """
+    wanted = {}
+    for attribute_id, value in values:
+        attribute_id = _to_id(attribute_id)
+        if attribute_id is not None and value is not None:
+            wanted[attribute_id] = str(value)
+    attributes = Attribute.objects.filter(comparison_id=comparison_id, id__in=list(wanted)).in_bulk() if wanted else {}
+
+    with transaction.atomic():
+        product, = Product.objects.bulk_create([Product(comparison_id=comparison_id, **fields)])
+        rows = []
+        for attribute_id, value in wanted.items():
+            if attribute_id in attributes:
+                data = ProductAttributeData(product=product, attribute=attributes[attribute_id], value=value)
+                data.set_typed_values(attributes[attribute_id])
+                rows.append(data)
+        ProductAttributeData.objects.bulk_create(rows)
+        record_changes(
+            comparison_id, added_product_ids=[product.pk], cells=[(product.pk, row.attribute_id) for row in rows]
+        )
+    return product
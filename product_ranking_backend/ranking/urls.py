@@ -1,10 +1,12 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Comparison URLs
     path('comparisons/', views.ComparisonListCreateView.as_view(), name='comparison-list-create'),
+    path('comparisons/export/', views.export_comparisons_view, name='export-comparisons'),
     path('comparisons/<int:pk>/', views.ComparisonDetailView.as_view(), name='comparison-detail'),
+    path('deletions/<int:pk>/', views.ComparisonDeletionDetailView.as_view(), name='comparison-deletion-detail'),
     
     # Attribute URLs
     path('comparisons/<int:comparison_id>/attributes/', views.AttributeListCreateView.as_view(), name='attribute-list-create'),
@@ -16,8 +18,31 @@ urlpatterns = [
     
     # Product attribute data
     path('comparisons/<int:comparison_id>/products/<int:product_id>/attributes/', views.update_product_attributes, name='update-product-attributes'),
+    path('comparisons/<int:comparison_id>/attribute-data/', views.update_attribute_matrix, name='attribute-matrix'),
+    
+    # Bulk import
+    path('comparisons/<int:comparison_id>/import/', views.import_products_view, name='import-products'),
+    
+    # Export
+    path('comparisons/<int:comparison_id>/export/', views.export_comparisons_view, name='export-comparison'),
     
     # Ranking results
     path('comparisons/<int:comparison_id>/results/', views.get_ranking_results, name='ranking-results'),
+    path('comparisons/<int:comparison_id>/pareto/', views.get_pareto_frontier, name='pareto-frontier'),
+    
+    # Background jobs
+    path('jobs/', views.enqueue_job, name='job-enqueue'),
+    path('jobs/<int:pk>/', views.JobDetailView.as_view(), name='job-detail'),
+    path('jobs/<int:pk>/result/', views.job_result, name='job-result'),
+    
+    # Full-text search
+    path('search/', views.search_view, name='search'),
+    
+    # Async read endpoints for ASGI deployments
+    path('async/comparisons/', async_views.comparison_list, name='async-comparison-list'),
+    path('async/comparisons/<int:pk>/', async_views.comparison_detail, name='async-comparison-detail'),
+    path('async/comparisons/<int:comparison_id>/results/', async_views.ranking_results, name='async-ranking-results'),
+    
+    # Instrumentation
+    path('metrics/', views.request_metrics, name='request-metrics'),
 ]
-
@@ -0,0 +1,149 @@
+"""Parsing of raw attribute values into typed values"""
+import math
+import re
+
+
+BOOLEAN_TRUE_VALUES = ('true', '1', 'yes', 'on')
+BOOLEAN_FALSE_VALUES = ('false', '0', 'no', 'off')
+
+
+def parse_numeric(value):
+    """Return value as a finite float, or None if it is not numeric"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_boolean(value):
+    """Return value as a bool, or None if it is not a recognised boolean"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower() if value is not None else ''
+    if text in BOOLEAN_TRUE_VALUES:
+        return True
+    if text in BOOLEAN_FALSE_VALUES:
+        return False
+    return None
+
+
+# Units per dimension with their factor to the dimension's first (base) unit
+UNIT_DIMENSIONS = {
+    'data': {
+        'B': 1, 'KB': 1e3, 'MB': 1e6, 'GB': 1e9, 'TB': 1e12, 'PB': 1e15,
+        'KiB': 2 ** 10, 'MiB': 2 ** 20, 'GiB': 2 ** 30, 'TiB': 2 ** 40,
+    },
+    'frequency': {'Hz': 1, 'kHz': 1e3, 'MHz': 1e6, 'GHz': 1e9},
+    'length': {'m': 1, 'mm': 1e-3, 'cm': 1e-2, 'km': 1e3, 'in': 0.0254, 'inch': 0.0254, '"': 0.0254, 'ft': 0.3048},
+    'mass': {'kg': 1, 'mg': 1e-6, 'g': 1e-3, 'lb': 0.45359237, 'lbs': 0.45359237, 'oz': 0.028349523125},
+    'time': {'s': 1, 'ms': 1e-3, 'sec': 1, 'min': 60, 'h': 3600, 'hr': 3600},
+    'power': {'W': 1, 'mW': 1e-3, 'kW': 1e3},
+    'energy': {'Wh': 1, 'kWh': 1e3},
+    'charge': {'mAh': 1, 'Ah': 1e3},
+    # Value of one unit in USD; replaced from settings.RANKING_CURRENCY_RATES at startup
+    'currency': {'USD': 1, 'EUR': 1.08, 'GBP': 1.27, 'CHF': 1.13, 'CAD': 0.73, 'AUD': 0.66, 'JPY': 0.0067, 'CNY': 0.14, 'INR': 0.012},
+}
+CURRENCY_SYMBOLS = {'$': 'USD', '€': 'EUR', '£': 'GBP', '¥': 'JPY', '₹': 'INR'}
+
+QUANTITY_PATTERN = re.compile(
+    r'^\s*(?P<symbol>[^\w\s.+-])?\s*'
+    r'(?P<number>[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)?(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+    r'\s*(?P<unit>[^\d\s.,+-].*?)?\s*$'
+)
+
+_units = {}
+# Lowercased unit names shared by no other unit, e.g. 'ghz' -> 'GHz'
+_lowercase_aliases = {}
+
+
+def register_units(dimension, factors):
+    """Add or replace units of a dimension, e.g. register_units('currency', {'USD': 1, 'EUR': 1.1})"""
+    UNIT_DIMENSIONS.setdefault(dimension, {}).update(factors)
+    for name, factor in UNIT_DIMENSIONS[dimension].items():
+        _units[name] = (dimension, float(factor))
+    names = {}
+    for name in _units:
+        names.setdefault(name.lower(), []).append(name)
+    _lowercase_aliases.clear()
+    _lowercase_aliases.update({alias: found[0] for alias, found in names.items() if len(found) == 1})
+
+
+for _dimension, _factors in UNIT_DIMENSIONS.items():
+    register_units(_dimension, _factors)
+
+
+def lookup_unit(unit):
+    """
+    Return the (dimension, factor) of a unit name, or None if it is not registered.
+
+    Names written in lowercase also match the one unit with that lowercase
+    form ('gb' is GB). Capitals are taken as meant: MW is not mW and Mb
+    (megabit) is not MB, so other spellings do not match.
+    """
+    if not unit:
+        return None
+    unit = unit.strip()
+    if unit in _units:
+        return _units[unit]
+    if unit == unit.lower() and unit in _lowercase_aliases:
+        return _units[_lowercase_aliases[unit]]
+    return None
+
+
+def parse_quantity(value):
+    """Split '1 TB', '512GB' or '$1,299' into (number, unit or None), or None if value has no leading number"""
+    number = parse_numeric(value)
+    if number is not None:
+        return number, None
+    if value is None or isinstance(value, bool):
+        return None
+    match = QUANTITY_PATTERN.match(str(value))
+    if match is None or not any(c.isdigit() for c in match.group('number')):
+        return None
+    number = parse_numeric(match.group('number').replace(',', ''))
+    symbol, unit = match.group('symbol'), match.group('unit')
+    if symbol is not None:
+        if symbol not in CURRENCY_SYMBOLS or (unit and lookup_unit(unit) != lookup_unit(CURRENCY_SYMBOLS[symbol])):
+            return None
+        unit = CURRENCY_SYMBOLS[symbol]
+    return (number, unit) if number is not None else None
+
+
+def canonical_number(value, unit=None):
+    """
+    Return value as a number expressed in unit, or None if it is not numeric.
+
+    Values without a unit are taken to be in unit already. Values with a
+    registered unit are converted when it has the same dimension ('1 TB'
+    is 1000 for a 'GB' attribute) and rejected when it does not; without an
+    attribute unit they are stored in their dimension's base unit, so that
+    '1 TB' and '512 GB' still compare correctly.
+    """
+    quantity = parse_quantity(value)
+    if quantity is None:
+        return None
+    number, value_unit = quantity
+    if value_unit is None:
+        return number
+    source, target = lookup_unit(value_unit), lookup_unit(unit)
+    if source is None or target is None:
+        # Unregistered units only match themselves, ignoring case unless one of them is registered ('MW' for 'mW')
+        if unit and (value_unit.strip() == unit.strip() or (
+                source is None and target is None and value_unit.strip().lower() == unit.strip().lower())):
+            return number
+        return number * source[1] if source is not None and not unit else None
+    if source[0] != target[0]:
+        return None
+    # 12 significant digits drop float noise from the factors (1.08 * 120 = 129.60000000000002)
+    return parse_numeric(f'{number * source[1] / target[1]:.12g}')
+
+
+def typed_values(value, data_type, unit=None):
+    """Return the (numeric_value, boolean_value) pair stored alongside a raw value"""
+    if data_type == 'boolean':
+        boolean = parse_boolean(value)
+        return (None if boolean is None else float(boolean)), boolean
+    return canonical_number(value, unit), None
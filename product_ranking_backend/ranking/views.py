@@ -1,18 +1,107 @@
+from datetime import datetime, time
+
 from rest_framework import generics, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Comparison, Attribute, Product, ProductAttributeData
+from django.conf import settings
+from django.db.models import Q, prefetch_related_objects
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from .models import Comparison, ComparisonDeletion, Attribute, Job, Product, ProductAttributeData
 from .serializers import (
-    ComparisonSerializer, ComparisonListSerializer, AttributeSerializer,
-    ProductSerializer, ProductCreateSerializer, ProductAttributeDataSerializer,
+    ComparisonSerializer, ComparisonListSerializer, ComparisonDeletionSerializer, AttributeSerializer,
+    JobSerializer, ProductSerializer, ProductCreateSerializer, ProductAttributeDataSerializer,
     RankingResultSerializer
 )
+from .cache import (
+    comparison_etag, get_cached_results, get_version, pareto_etag, results_etag, set_cached_results
+)
+from .deletion import mark_deleted
+from .exporters import CONTENT_TYPES, FILE_EXTENSIONS, export_comparisons
+from .filtering import (
+    compute_facets, filter_products, parse_facet_params, parse_filters, resolve_facets, resolve_filters
+)
+from .importers import ImportAborted, detect_format, import_products, open_rows
+from .jobs import enqueue, enqueue_import, files_dir
+from .materialized import get_materialization, is_materializable, page as materialized_page
+from .metrics import registry
+from .ordering import (
+    RANK_FUNCTIONS, after_filter, assign_ranks, parse_sort_by, rank_products, resolve_sort_keys, sort_values
+)
+from .pagination import ComparisonCursorPagination, decode_cursor, encode_cursor, parse_limit, top_k
+from .pareto import dominance_layers, parse_pareto_params
+from .scoring import parse_scoring_params, score_products
+from .search import DEFAULT_LIMIT, build_match_query, parse_kinds, search_available, search_index
+from .snapshot import get_snapshot
+from .streaming import iter_id_chunks, iter_queryset_chunks, stream_json
+from .upserts import parse_cells, resolve_cell_ids, upsert_attribute_values
+from .values import parse_boolean
+
+
+def _parse_datetime_param(name, raw, end_of_day=False):
+    """Parse an ISO date or datetime query parameter into an aware datetime"""
+    value = parse_datetime(raw)
+    if value is None:
+        day = parse_date(raw)
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO date or datetime'})
+        value = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def filter_comparisons(queryset, params):
+    """Apply the comparison list's ?name= (substring), ?created_after= and ?created_before= filters"""
+    name = params.get('name')
+    if name:
+        queryset = queryset.filter(name__icontains=name)
+    for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lte')):
+        raw = params.get(param)
+        if raw:
+            queryset = queryset.filter(**{lookup: _parse_datetime_param(param, raw, end_of_day=lookup.endswith('lte'))})
+    return queryset
+
+
+def _ranking_result(product, scores=None):
+    """Result entry for a product whose attribute data is prefetched"""
+    attribute_values = {}
+    for attr_data in product.attribute_data.all():
+        attribute_values[attr_data.attribute.name] = {
+            'value': attr_data.value,
+            'unit': attr_data.attribute.unit,
+            'data_type': attr_data.attribute.data_type
+        }
+    
+    result = {
+        'product_id': product.id,
+        'product_name': product.name,
+        'attribute_values': attribute_values
+    }
+    if scores is not None:
+        result['score'] = scores[product.id]
+    return result
 
 
 class ComparisonListCreateView(generics.ListCreateAPIView):
-    """List all comparisons or create a new comparison"""
-    queryset = Comparison.objects.all()
+    """
+    List all comparisons or create a new comparison.
+
+    The list is cursor-paginated and can be filtered with ?name= (substring)
+    and ?created_after= / ?created_before= (ISO date or datetime).
+    """
+    pagination_class = ComparisonCursorPagination
+    
+    def get_queryset(self):
+        queryset = Comparison.objects.all()
+        if self.request.method != 'GET':
+            return queryset
+        return filter_comparisons(queryset, self.request.query_params).with_counts()
     
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -20,10 +109,49 @@ class ComparisonListCreateView(generics.ListCreateAPIView):
         return ComparisonSerializer
 
 
+@method_decorator(condition(etag_func=comparison_etag), name='get')
 class ComparisonDetailView(generics.RetrieveUpdateDestroyAPIView):
-    """Retrieve, update or delete a comparison"""
-    queryset = Comparison.objects.all()
+    """
+    Retrieve, update or delete a comparison.
+
+    GET accepts ?fields= (top-level fields) and ?include= (attributes,
+    products) so clients only load and receive what they need.
+
+    With RANKING_BACKGROUND_DELETION, DELETE hides the comparison at once and
+    answers 202 with the deletion's progress (see deletions/<id>/) while its
+    rows are removed in the background.
+    """
     serializer_class = ComparisonSerializer
+    
+    def get_queryset(self):
+        queryset = Comparison.objects.all()
+        if self.request.method == 'GET':
+            fields = ComparisonSerializer.select_fields(self.request.query_params)
+            queryset = ComparisonSerializer.setup_eager_loading(queryset, fields)
+        return queryset
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs['fields'] = ComparisonSerializer.select_fields(self.request.query_params)
+        return super().get_serializer(*args, **kwargs)
+    
+    def destroy(self, request, *args, **kwargs):
+        if not settings.RANKING_BACKGROUND_DELETION:
+            return super().destroy(request, *args, **kwargs)
+        deletion = mark_deleted(self.get_object())
+        return Response(ComparisonDeletionSerializer(deletion).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ComparisonDeletionDetailView(generics.RetrieveAPIView):
+    """Progress of a deleted comparison's background removal"""
+    serializer_class = ComparisonDeletionSerializer
+    queryset = ComparisonDeletion.objects.all()
+
+
+def _check_comparison(comparison_id):
+    """Raise NotFound unless the comparison exists and is not deleted"""
+    if not Comparison.objects.filter(id=comparison_id).exists():
+        raise NotFound('Comparison not found')
 
 
 class AttributeListCreateView(generics.ListCreateAPIView):
@@ -32,10 +160,11 @@ class AttributeListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         comparison_id = self.kwargs.get('comparison_id')
-        return Attribute.objects.filter(comparison_id=comparison_id)
+        return Attribute.objects.filter(comparison_id=comparison_id, comparison__deleted_at__isnull=True)
     
     def perform_create(self, serializer):
         comparison_id = self.kwargs.get('comparison_id')
+        _check_comparison(comparison_id)
         serializer.save(comparison_id=comparison_id)
 
 
@@ -45,7 +174,14 @@ class AttributeDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         comparison_id = self.kwargs.get('comparison_id')
-        return Attribute.objects.filter(comparison_id=comparison_id)
+        return Attribute.objects.filter(comparison_id=comparison_id, comparison__deleted_at__isnull=True)
+    
+    def perform_update(self, serializer):
+        previous = (serializer.instance.data_type, serializer.instance.unit)
+        attribute = serializer.save()
+        # Typed values depend on the data type and unit, so re-parse them when either changes
+        if (attribute.data_type, attribute.unit) != previous:
+            attribute.refresh_typed_values()
 
 
 class ProductListCreateView(generics.ListCreateAPIView):
@@ -58,10 +194,11 @@ class ProductListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         comparison_id = self.kwargs.get('comparison_id')
-        return Product.objects.filter(comparison_id=comparison_id)
+        return Product.objects.filter(comparison_id=comparison_id, comparison__deleted_at__isnull=True)
     
     def perform_create(self, serializer):
         comparison_id = self.kwargs.get('comparison_id')
+        _check_comparison(comparison_id)
         print(f"Creating product for comparison {comparison_id}")
         print(f"Request data: {self.request.data}")
         serializer.save(comparison_id=comparison_id)
@@ -73,92 +210,561 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         comparison_id = self.kwargs.get('comparison_id')
-        return Product.objects.filter(comparison_id=comparison_id)
+        return Product.objects.filter(comparison_id=comparison_id, comparison__deleted_at__isnull=True)
 
 
-@api_view(['POST'])
+@api_view(['POST', 'PATCH'])
 def update_product_attributes(request, comparison_id, product_id):
-    """Update attribute data for a product"""
+    """
+    Update attribute data for a product.
+
+    POST replaces the product's attribute data with the payload; PATCH only
+    touches the attributes in the payload (a null value removes one).
+    """
     try:
-        product = Product.objects.get(id=product_id, comparison_id=comparison_id)
+        product = Product.objects.get(id=product_id, comparison_id=comparison_id, comparison__deleted_at__isnull=True)
     except Product.DoesNotExist:
         return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
     
     attribute_data = request.data.get('attribute_data', [])
     
-    # Clear existing attribute data
-    ProductAttributeData.objects.filter(product=product).delete()
-    
-    # Create new attribute data
-    for attr_data in attribute_data:
-        attribute_id = attr_data.get('attribute_id')
-        value = attr_data.get('value')
-        
-        if attribute_id and value is not None:
-            try:
-                attribute = Attribute.objects.get(id=attribute_id, comparison=product.comparison)
-                ProductAttributeData.objects.create(
-                    product=product,
-                    attribute=attribute,
-                    value=str(value)
-                )
-            except Attribute.DoesNotExist:
-                continue
+    # Apply only the differences to the stored attribute data
+    cells = [(product.id, attr_data.get('attribute_id'), attr_data.get('value')) for attr_data in attribute_data]
+    replace = [product.id] if request.method == 'POST' else []
+    upsert_attribute_values(comparison_id, cells, replace_product_ids=replace)
     
     # Return updated product
+    product = Product.objects.prefetch_related('attribute_data__attribute').get(id=product.id)
     serializer = ProductSerializer(product)
     return Response(serializer.data)
 
 
+@api_view(['PATCH'])
+def update_attribute_matrix(request, comparison_id):
+    """
+    Write attribute values of many products in one transaction.
+
+    The body is a sparse matrix, {"cells": [{"product_id", "attribute_id",
+    "value"}]}; a null value removes a cell. Nothing is written unless every
+    product and attribute belongs to the comparison. Only the cells that
+    actually changed are returned.
+    """
+    if not Comparison.objects.filter(id=comparison_id).exists():
+        return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        cells = parse_cells(request.data.get('cells'), settings.RANKING_MATRIX_MAX_CELLS)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    attributes, unknown_products, unknown_attributes = resolve_cell_ids(comparison_id, cells)
+    if unknown_products or unknown_attributes:
+        return Response({
+            'error': 'Cells reference products or attributes outside this comparison',
+            'product_ids': unknown_products,
+            'attribute_ids': unknown_attributes
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    changes = upsert_attribute_values(comparison_id, cells, attributes=attributes)
+    return Response({'changes': changes, 'change_count': len(changes)})
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def import_products_view(request, comparison_id):
+    """
+    Bulk import products and attribute values from a CSV or JSON Lines upload.
+
+    Send the file as the multipart 'file' field or as the raw request body
+    (Content-Type text/csv or application/x-ndjson); it is read as a stream.
+    With ?background=true the upload is saved and imported by the job
+    worker instead, and the queued job is returned.
+    """
+    try:
+        comparison = Comparison.objects.get(id=comparison_id)
+    except Comparison.DoesNotExist:
+        return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        batch_size = int(request.GET.get('batch_size', settings.RANKING_IMPORT_BATCH_SIZE))
+    except ValueError:
+        return Response({'error': 'batch_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= batch_size <= settings.RANKING_IMPORT_MAX_BATCH_SIZE:
+        return Response({'error': f'batch_size must be between 1 and {settings.RANKING_IMPORT_MAX_BATCH_SIZE}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    if request.content_type.startswith('multipart/'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': "Missing 'file' upload"}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = detect_format(request.GET.get('input_format'), upload.name, upload.content_type)
+        stream = upload.file
+    else:
+        import_format = detect_format(request.GET.get('input_format'), content_type=request.content_type)
+        stream = request.stream
+    
+    if import_format is None:
+        return Response({'error': 'Unknown import format, expected csv or jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+    if stream is None:
+        return Response({'error': 'Empty upload'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    background = parse_boolean(request.GET.get('background', 'false'))
+    if background is None:
+        return Response({'error': 'background must be true or false'}, status=status.HTTP_400_BAD_REQUEST)
+    if background:
+        job = enqueue_import(comparison, stream, import_format, batch_size)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    try:
+        report = import_products(comparison, open_rows(stream, import_format), batch_size)
+    except ImportAborted as e:
+        # Batches before the failure are committed; the report says how far the import got
+        return Response({'error': str(e), 'report': e.report}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(report)
+
+
+@api_view(['GET'])
+def export_comparisons_view(request, comparison_id=None):
+    """
+    Export one comparison, or all of them, as a wide products x attributes table.
+
+    ?export_format= is csv (default), jsonl, or parquet / arrow when pyarrow
+    is installed. The file is streamed as it is written.
+    """
+    if comparison_id is None:
+        comparison_ids = list(Comparison.objects.order_by('id').values_list('id', flat=True))
+        filename = 'comparisons'
+    elif Comparison.objects.filter(id=comparison_id).exists():
+        comparison_ids = [comparison_id]
+        filename = f'comparison-{comparison_id}'
+    else:
+        return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    export_format = request.GET.get('export_format', 'csv')
+    try:
+        content = export_comparisons(comparison_ids, export_format, settings.RANKING_EXPORT_CHUNK_SIZE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{FILE_EXTENSIONS[export_format]}"'
+    return response
+
+
+@api_view(['POST'])
+def enqueue_job(request):
+    """
+    Queue a heavy computation for the job worker (manage.py run_job_worker).
+
+    The body names the kind (results, pareto or export), the comparison
+    (optional for exports) and the query parameters the endpoint would take,
+    e.g. {"kind": "results", "comparison_id": 1, "params": {"weights":
+    "Price:2,RAM:1"}}. An equal job at the current comparison version is
+    returned instead of queueing another: 200 when its result is ready, 202
+    while it is queued or running. Imports are queued with ?background=true
+    on the import endpoint.
+    """
+    try:
+        job, _ = enqueue(request.data.get('kind'), request.data.get('comparison_id'), request.data.get('params'))
+    except Comparison.DoesNotExist:
+        return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(JobSerializer(job).data,
+                    status=status.HTTP_200_OK if job.status == 'done' else status.HTTP_202_ACCEPTED)
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    """Status of a queued job"""
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+
+@api_view(['GET'])
+def job_result(request, pk):
+    """The output of a finished job: the endpoint's JSON response, or the export file"""
+    try:
+        job = Job.objects.get(pk=pk)
+    except Job.DoesNotExist:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status != 'done':
+        return Response({'error': f'Job is {job.status}', 'status': job.status, 'job_error': job.error or None},
+                        status=status.HTTP_409_CONFLICT)
+    if not job.result_file:
+        return Response(job.result)
+    
+    path = files_dir() / job.result_file
+    if not path.exists():
+        return Response({'error': 'Job output is no longer available'}, status=status.HTTP_404_NOT_FOUND)
+    export_format = job.params['export_format'][0]
+    filename = f'comparison-{job.comparison_id}' if job.comparison_id else 'comparisons'
+    return FileResponse(open(path, 'rb'), as_attachment=True, content_type=CONTENT_TYPES[export_format],
+                        filename=f'{filename}.{FILE_EXTENSIONS[export_format]}')
+
+
+@api_view(['GET'])
+def search_view(request):
+    """
+    Full-text search over comparisons, products and text attribute values.
+
+    ?q= is free text; every term must match and the last one may be a
+    prefix. Narrow with ?comparison=<id> and ?type=comparison,product,value.
+    Hits are ranked by BM25 and highlighted with <mark> in otherwise
+    HTML-escaped text. Pages with ?limit= and ?cursor= like ranking results.
+    """
+    if not search_available():
+        return Response({'error': 'Full-text search requires SQLite FTS5'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    
+    query = request.GET.get('q', '')
+    match = build_match_query(query)
+    if match is None:
+        return Response({'error': 'q must contain at least one word'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    sort_key = [query, request.GET.get('comparison', ''), request.GET.get('type', '')]
+    try:
+        kinds = parse_kinds(request.GET.get('type'))
+        limit = parse_limit(request.GET.get('limit')) or DEFAULT_LIMIT
+        cursor = decode_cursor(request.GET.get('cursor'), sort_key)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    comparison_id = request.GET.get('comparison')
+    if comparison_id and not comparison_id.isdigit():
+        return Response({'error': 'comparison must be a comparison id'}, status=status.HTTP_400_BAD_REQUEST)
+    comparison_id = int(comparison_id) if comparison_id else None
+    
+    hits, after = search_index(match, comparison_id, kinds, limit, after=cursor)
+    position = (cursor['position'] if cursor else 0) + len(hits)
+    next_cursor = encode_cursor(sort_key, {**after, 'position': position, 'rank': position}) if after else None
+    
+    return Response({
+        'query': query,
+        'results': hits,
+        'limit': limit,
+        'next_cursor': next_cursor
+    })
+
+
+@api_view(['GET', 'DELETE'])
+def request_metrics(request):
+    """In-process request metrics per view; DELETE resets them"""
+    if request.method == 'DELETE':
+        registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({'query_budget': settings.RANKING_QUERY_BUDGET, 'views': registry.snapshot()})
+
+
+def _iter_ranked_results(products, sort_keys, descending, rank_method, criteria, scores):
+    """Ranked result entries for every product, in lists of RANKING_STREAM_CHUNK_SIZE"""
+    chunk_size = settings.RANKING_STREAM_CHUNK_SIZE
+    if sort_keys:
+        # The SQL window ranks rows as they are read
+        for chunk in iter_queryset_chunks(rank_products(products, sort_keys, rank_method), chunk_size):
+            results = []
+            for product in chunk:
+                result = _ranking_result(product, scores if criteria else None)
+                result['rank'] = product.rank
+                results.append(result)
+            yield results
+        return
+    
+    if criteria:
+        # Only ids and scores are held in memory; products are loaded per chunk
+        sign = -1 if descending else 1
+        product_ids = sorted(scores, key=lambda product_id: (sign * scores[product_id], product_id))
+        chunks = iter_id_chunks(products, product_ids, chunk_size)
+        key = lambda result: result['score']
+    else:
+        chunks = iter_queryset_chunks(products.order_by('name', 'id'), chunk_size)
+        key = lambda result: result['product_name']
+    
+    state = None
+    for chunk in chunks:
+        results = [_ranking_result(product, scores if criteria else None) for product in chunk]
+        state = assign_ranks(results, key, rank_method, state)
+        yield results
+
+
+@condition(etag_func=results_etag)
 @api_view(['GET'])
 def get_ranking_results(request, comparison_id):
-    """Get ranking results for a comparison"""
+    """
+    Get ranking results for a comparison.
+
+    The embedded comparison honours ?fields= and ?include= like the detail
+    endpoint, but only includes its attributes by default since the results
+    already carry every product's values.
+
+    ?filter=Price<=1000,RAM>=16,Wifi=true restricts the results in SQL and
+    ?facets=Price,Wifi (or '*') adds facet counts over the filtered products.
+    """
+    fields = ComparisonSerializer.select_fields(request.GET, default_include=['attributes'])
+    
+    version = get_version(comparison_id)
+    if version is None:
+        return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    # Results only change when the comparison version does
+    cached = get_cached_results(comparison_id, version, request.GET)
+    if cached is not None:
+        return Response(cached)
+    
     try:
-        comparison = Comparison.objects.get(id=comparison_id)
+        comparison = ComparisonSerializer.setup_eager_loading(Comparison.objects.all(), fields).get(id=comparison_id)
     except Comparison.DoesNotExist:
         return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Get sorting parameters
-    sort_by = request.GET.get('sort_by')  # attribute name
-    sort_order = request.GET.get('sort_order', 'desc')  # 'asc' or 'desc'
+    sort_by = request.GET.get('sort_by')  # attribute names, e.g. 'Price:asc,RAM:desc:nulls_first'
+    sort_order = request.GET.get('sort_order', 'desc')  # default direction: 'asc' or 'desc'
+    rank_method = request.GET.get('rank_method', 'row_number')  # 'row_number', 'rank' or 'dense_rank'
     
-    products = Product.objects.filter(comparison=comparison).prefetch_related('attribute_data__attribute')
+    if rank_method not in RANK_FUNCTIONS:
+        return Response({'error': f"Invalid rank_method '{rank_method}'"}, status=status.HTTP_400_BAD_REQUEST)
     
-    results = []
-    for product in products:
-        attribute_values = {}
-        for attr_data in product.attribute_data.all():
-            attribute_values[attr_data.attribute.name] = {
-                'value': attr_data.value,
-                'unit': attr_data.attribute.unit,
-                'data_type': attr_data.attribute.data_type
-            }
-        
-        results.append({
-            'product_id': product.id,
-            'product_name': product.name,
-            'attribute_values': attribute_values
-        })
+    # Get scoring parameters, e.g. ?weights=Price:2,RAM:1&directions=Price:asc&normalization=zscore
+    try:
+        criteria = parse_scoring_params(request.GET)
+        parsed_sort_by = parse_sort_by(sort_by, sort_order)
+        parsed_filters = parse_filters(request.GET.getlist('filter'))
+        facet_names, facet_buckets = parse_facet_params(request.GET)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Sort results if sort_by is specified
-    if sort_by:
-        def get_sort_value(item):
-            attr_value = item['attribute_values'].get(sort_by, {}).get('value', '')
-            try:
-                return float(attr_value)
-            except (ValueError, TypeError):
-                return attr_value.lower() if isinstance(attr_value, str) else ''
-        
-        reverse_order = sort_order == 'desc'
-        results.sort(key=get_sort_value, reverse=reverse_order)
-    
-    # Add ranking
-    for i, result in enumerate(results, 1):
-        result['rank'] = i
+    attributes = {}
+    if criteria or parsed_sort_by or parsed_filters or facet_names:
+        attributes = {attr.name: attr for attr in comparison.attributes.all()}
     
-    return Response({
-        'comparison': ComparisonSerializer(comparison).data,
+    for criterion in criteria:
+        attribute = attributes.get(criterion['attribute'])
+        if attribute is None:
+            return Response({'error': f"Unknown attribute '{criterion['attribute']}'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if attribute.data_type == 'text':
+            return Response({'error': f"Cannot score text attribute '{attribute.name}'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        criterion['attribute_id'] = attribute.id
+        criterion['data_type'] = attribute.data_type
+    
+    try:
+        sort_keys = resolve_sort_keys(parsed_sort_by, attributes)
+        filters = resolve_filters(parsed_filters, attributes)
+        facet_attributes = resolve_facets(facet_names, attributes)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Get paging parameters; cursors are only valid for the ordering and filters they were issued for
+    sort_key = [request.GET.get(name, '') for name in ('sort_by', 'sort_order', 'rank_method', 'weights',
+                                                       'directions', 'normalization')]
+    sort_key.append(request.GET.getlist('filter'))
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        cursor = decode_cursor(request.GET.get('cursor'), sort_key)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if cursor and sort_keys and not (isinstance(cursor['value'], list) and len(cursor['value']) == len(sort_keys)):
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    stream = parse_boolean(request.GET.get('stream', 'false'))
+    if stream is None:
+        return Response({'error': 'stream must be true or false'}, status=status.HTTP_400_BAD_REQUEST)
+    if stream and (limit or cursor):
+        return Response({'error': 'stream cannot be combined with limit or cursor'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    products = filter_products(Product.objects.filter(comparison=comparison), filters)
+    fetch = limit + 1 if limit else None  # one extra row tells whether there is a next page
+    # Materializations and snapshots hold every product, so filtered results are ranked in SQL
+    materialized = bool(sort_keys) and not filters and is_materializable(sort_keys, rank_method)
+    use_snapshot = settings.RANKING_SNAPSHOTS and not filters
+    
+    scores = {}
+    if criteria:
+        # Scores are normalized over the whole comparison, filters only select which products are listed
+        product_ids, product_scores = score_products(comparison, criteria)
+        scores = dict(zip(product_ids.tolist(), product_scores.tolist()))
+        if filters:
+            scores = {product_id: scores[product_id] for product_id in products.values_list('id', flat=True)}
+    
+    facets = compute_facets(products, facet_attributes, facet_buckets) if facet_attributes else None
+    
+    if stream:
+        header = {
+            'comparison': ComparisonSerializer(comparison, fields=fields).data,
+            'sort_by': sort_by,
+            'sort_order': sort_order,
+            'sort_keys': [key.as_dict() for key in sort_keys],
+            'rank_method': rank_method,
+            'scoring': criteria,
+            'filters': [attribute_filter.as_dict() for attribute_filter in filters],
+            'facets': facets,
+            'limit': None,
+            'next_cursor': None
+        }
+        chunks = _iter_ranked_results(products, sort_keys, sort_order == 'desc', rank_method, criteria, scores)
+        return StreamingHttpResponse(stream_json(header, 'results', chunks), content_type='application/json')
+    
+    # Select the page of products in ranking order
+    rank_start = cursor
+    if materialized:
+        # Read positions from the materialized ranking, which writes keep up to date
+        materialization = get_materialization(sort_keys[0].attribute, sort_keys[0].descending, comparison.version)
+        rows, rank_start = materialized_page(materialization, rank_method, after=cursor, limit=fetch)
+        sort_values_by_id = dict(rows)
+        products_by_id = products.in_bulk(list(sort_values_by_id))
+        page = [products_by_id[product_id] for product_id in sort_values_by_id]
+    elif sort_keys and use_snapshot:
+        # Sort on the comparison's cached columnar snapshot
+        snapshot = get_snapshot(comparison.id, comparison.version)
+        keys = [(key.attribute.id, key.descending, key.nulls_first) for key in sort_keys]
+        sort_values_by_id = dict(snapshot.page(keys, after=cursor, limit=fetch))
+        products_by_id = products.in_bulk(list(sort_values_by_id))
+        page = [products_by_id[product_id] for product_id in sort_values_by_id]
+    elif sort_keys:
+        # Sort in SQL on the typed value columns
+        page = rank_products(products, sort_keys, rank_method, after=cursor)
+        page = list(page[:fetch] if fetch else page)
+        sort_values_by_id = {product.id: sort_values(product, len(sort_keys)) for product in page}
+    elif criteria:
+        # Rank by score in memory, keeping only the top K with a heap
+        sign = -1 if sort_order == 'desc' else 1
+        after = (sign * cursor['value'], cursor['id']) if cursor else None
+        top = top_k({product_id: sign * score for product_id, score in scores.items()}, fetch, after)
+        products_by_id = products.in_bulk([product_id for _, product_id in top])
+        page = [products_by_id[product_id] for _, product_id in top]
+        sort_values_by_id = scores
+    else:
+        # Default product order
+        page = products.order_by('name', 'id')
+        if cursor:
+            page = page.filter(after_filter('name', cursor['value'], cursor['id']))
+        page = list(page[:fetch] if fetch else page)
+        sort_values_by_id = {product.id: product.name for product in page}
+    
+    has_more = limit is not None and len(page) > limit
+    page = page[:limit]
+    prefetch_related_objects(page, 'attribute_data__attribute')
+    
+    results = [_ranking_result(product, scores if criteria else None) for product in page]
+    
+    # Add ranking: from the SQL window on a first page, continued from the cursor otherwise
+    if sort_keys and cursor is None and not (materialized or use_snapshot):
+        for result, product in zip(results, page):
+            result['rank'] = product.rank
+        state = {'position': len(page), 'value': sort_values_by_id[page[-1].id], 'rank': page[-1].rank} if page else {}
+    else:
+        state = assign_ranks(results, lambda item: sort_values_by_id[item['product_id']], rank_method, rank_start)
+    
+    next_cursor = encode_cursor(sort_key, {**state, 'id': page[-1].id}) if has_more else None
+    
+    data = {
+        'comparison': ComparisonSerializer(comparison, fields=fields).data,
         'results': results,
         'sort_by': sort_by,
-        'sort_order': sort_order
-    })
+        'sort_order': sort_order,
+        'sort_keys': [key.as_dict() for key in sort_keys],
+        'rank_method': rank_method,
+        'scoring': criteria,
+        'filters': [attribute_filter.as_dict() for attribute_filter in filters],
+        'facets': facets,
+        'limit': limit,
+        'next_cursor': next_cursor
+    }
+    set_cached_results(comparison.id, comparison.version, request.GET, data)
+    return Response(data)
+
+
+@condition(etag_func=pareto_etag)
+@api_view(['GET'])
+def get_pareto_frontier(request, comparison_id):
+    """
+    Get the Pareto-optimal products of a comparison.
+
+    ?directions=Price:asc,RAM:desc names the attributes to trade off and
+    whether lower (asc) or higher (desc) is better. A product is on the
+    frontier when no other product is at least as good on every attribute
+    and better on one; ?layers=N also returns the next N-1 dominance layers.
+    Missing values count as worse than any real value.
+
+    Up to three attributes are swept in O(n log n). Wider requests over more
+    than RANKING_PARETO_MAX_SYNC_PRODUCTS products are queued as a pareto
+    job: the response is the job (202), or its result once it is done.
+    """
+    fields = ComparisonSerializer.select_fields(request.GET, default_include=['attributes'])
+    
+    version = get_version(comparison_id)
+    if version is None:
+        return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    cached = get_cached_results(comparison_id, version, request.GET, kind='pareto')
+    if cached is not None:
+        return Response(cached)
+    
+    try:
+        criteria, max_layers = parse_pareto_params(request.GET)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        comparison = ComparisonSerializer.setup_eager_loading(Comparison.objects.all(), fields).get(id=comparison_id)
+    except Comparison.DoesNotExist:
+        return Response({'error': 'Comparison not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    attributes = {attr.name: attr for attr in comparison.attributes.all()}
+    for criterion in criteria:
+        attribute = attributes.get(criterion['attribute'])
+        if attribute is None:
+            return Response({'error': f"Unknown attribute '{criterion['attribute']}'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if attribute.data_type == 'text':
+            return Response({'error': f"Cannot compare text attribute '{attribute.name}'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        criterion['attribute_id'] = attribute.id
+        criterion['data_type'] = attribute.data_type
+    
+    snapshot = get_snapshot(comparison.id, comparison.version)
+    if (len(criteria) > 3 and len(snapshot.product_ids) > settings.RANKING_PARETO_MAX_SYNC_PRODUCTS
+            and not getattr(request, 'in_job', False)):
+        job, _ = enqueue('pareto', comparison.id, dict(request.GET.lists()))
+        if job.status == 'done':
+            return Response(job.result)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    matrix = snapshot.matrix([criterion['attribute_id'] for criterion in criteria])
+    layers = dominance_layers(matrix, [criterion['direction'] for criterion in criteria], max_layers)
+    
+    rows = [(layer_number, index) for layer_number, layer in enumerate(layers, 1) for index in layer.tolist()]
+    names = dict(
+        Product.objects.filter(id__in=[int(snapshot.product_ids[index]) for _, index in rows])
+        .values_list('id', 'name')
+    )
+    
+    results = []
+    for layer_number, index in rows:
+        product_id = int(snapshot.product_ids[index])
+        values = {}
+        for criterion, value in zip(criteria, matrix[index].tolist()):
+            if value != value:  # NaN: no value stored
+                value = None
+            elif criterion['data_type'] == 'boolean':
+                value = bool(value)
+            values[criterion['attribute']] = value
+        results.append({
+            'product_id': product_id,
+            'product_name': names.get(product_id),
+            'layer': layer_number,
+            'values': values
+        })
+    
+    data = {
+        'comparison': ComparisonSerializer(comparison, fields=fields).data,
+        'criteria': criteria,
+        'layers': len(layers),
+        'pareto_size': len(layers[0]) if layers else 0,
+        'results': results
+    }
+    set_cached_results(comparison.id, comparison.version, request.GET, data, kind='pareto')
+    return Response(data)
@@ -0,0 +1,20 @@
+"""
+Entry points for job worker processes.
+
+Workers are spawned, not forked, so they never share the parent's
+database connections. A spawned process imports this module before
+Django is set up, so it must not import models at module level.
+"""
+import os
+
+
+def setup_process(settings_module):
+    """ProcessPoolExecutor initializer: set up Django in the new process"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def run_job(job_id):
+    from .jobs import run_job
+    return run_job(job_id)
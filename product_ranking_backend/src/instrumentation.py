@@ -0,0 +1,212 @@
+"""
+Per-request instrumentation for the Flask backend
+
+Mirrors ranking.middleware on the Django side: every request records its
+SQL statement count, time spent in SQLite, JSON serialization time and
+total time. Timings are sent as a Server-Timing header, logged to
+'ranking.metrics' and kept in per-endpoint histograms for /metrics.
+Requests over the query budget are logged as warnings.
+"""
+import bisect
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+logger = logging.getLogger('ranking.metrics')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Counters for the request being handled"""
+    __slots__ = ('queries', 'db_seconds', 'serialize_seconds', 'started')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.started = time.perf_counter()
+
+
+def _add_db_time(started, statements=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.db_seconds += time.perf_counter() - started
+        metrics.queries += statements
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor timing statement execution and fetches"""
+
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            _add_db_time(started, 1)
+
+    def executemany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            _add_db_time(started, 1)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _add_db_time(started)
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            _add_db_time(started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _add_db_time(started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the execute() shortcuts, are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider adding jsonify()'s encoding time to the request metrics"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.serialize_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket counts are reported cumulatively"""
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        buckets, total = [], 0
+        for bound, count in zip((*self.bounds, '+Inf'), self.counts):
+            total += count
+            buckets.append([bound, total])
+        return {'count': self.count, 'sum': round(self.sum, 3), 'buckets': buckets}
+
+
+class MetricsRegistry:
+    """Histograms per (endpoint, metric), safe to update from several threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, values, over_budget=False):
+        with self._lock:
+            histograms = self._views.setdefault(view, {'over_budget': 0})
+            histograms['over_budget'] += over_budget
+            for metric, value in values.items():
+                histogram = histograms.get(metric)
+                if histogram is None:
+                    histogram = histograms[metric] = Histogram(
+                        TIME_BUCKETS_MS if metric.endswith('_ms') else QUERY_BUCKETS
+                    )
+                histogram.observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: {
+                    metric: value.as_dict() if isinstance(value, Histogram) else value
+                    for metric, value in histograms.items()
+                }
+                for view, histograms in sorted(self._views.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry()
+
+
+def init_app(app, query_budget=None):
+    """Install the request hooks and the timed JSON provider on a Flask app"""
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics_token = _current.set(RequestMetrics())
+
+    @app.after_request
+    def finish_request_metrics(response):
+        metrics = _current.get()
+        if metrics is None:
+            return response
+        total_ms = (time.perf_counter() - metrics.started) * 1000
+        db_ms, serialize_ms = metrics.db_seconds * 1000, metrics.serialize_seconds * 1000
+        view = request.endpoint or 'unresolved'
+        over_budget = query_budget is not None and metrics.queries > query_budget
+
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{metrics.queries} queries", serialize;dur={serialize_ms:.2f}, '
+            f'app;dur={max(total_ms - db_ms - serialize_ms, 0.0):.2f}, total;dur={total_ms:.2f}'
+        )
+        registry.observe(view, {
+            'queries': metrics.queries, 'db_ms': db_ms, 'serialize_ms': serialize_ms, 'total_ms': total_ms,
+        }, over_budget)
+        logger.info(
+            'method=%s path=%s view=%s status=%s queries=%d db_ms=%.2f serialize_ms=%.2f total_ms=%.2f',
+            request.method, request.path, view, response.status_code, metrics.queries, db_ms, serialize_ms, total_ms,
+        )
+        if over_budget:
+            logger.warning(
+                'Query budget exceeded: view=%s path=%s queries=%d budget=%d',
+                view, request.path, metrics.queries, query_budget,
+            )
+        return response
+
+    @app.teardown_request
+    def clear_request_metrics(exception):
+        token = g.pop('request_metrics_token', None)
+        if token is not None:
+            _current.reset(token)
@@ -4,18 +4,50 @@ Product Ranking API - Flask Implementation
 A simple Flask API that provides product ranking functionality
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify
 from flask_cors import CORS
 import sqlite3
 import json
 from datetime import datetime
 import os
+import math
+import logging
+
+import instrumentation
+from db import ConnectionPool, PoolTimeout
+from repository import load_comparison
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['Server-Timing'])
 
 # Database setup
-DB_PATH = '/tmp/product_ranking.db'
+DB_PATH = os.environ.get('PRODUCT_RANKING_DB', '/tmp/product_ranking.db')
+DB_POOL_SIZE = int(os.environ.get('PRODUCT_RANKING_DB_POOL_SIZE', '8'))
+
+pool = ConnectionPool(DB_PATH, max_size=DB_POOL_SIZE, factory=instrumentation.InstrumentedConnection)
+
+# Requests issuing more SQL statements than this are logged as warnings
+QUERY_BUDGET = int(os.environ.get('PRODUCT_RANKING_QUERY_BUDGET', '25'))
+instrumentation.init_app(app, query_budget=QUERY_BUDGET)
+
+BOOLEAN_TRUE_VALUES = ('true', '1', 'yes', 'on')
+BOOLEAN_FALSE_VALUES = ('false', '0', 'no', 'off')
+
+# Typed column to sort on per attribute data type, for a product_attribute_data alias
+SORT_COLUMNS = {
+    'number': '{pad}.numeric_value',
+    'boolean': '{pad}.boolean_value',
+    'text': 'LOWER({pad}.value)',
+}
+
+SORT_DIRECTIONS = ('asc', 'desc')
+NULL_PLACEMENTS = ('nulls_first', 'nulls_last')
+
+RANK_FUNCTIONS = {
+    'row_number': 'ROW_NUMBER()',
+    'rank': 'RANK()',
+    'dense_rank': 'DENSE_RANK()',
+}
 
 def init_db():
     """Initialize SQLite database with required tables"""
@@ -62,22 +94,114 @@ def init_db():
             product_id INTEGER NOT NULL,
             attribute_id INTEGER NOT NULL,
             value TEXT NOT NULL,
+            numeric_value REAL,
+            boolean_value INTEGER,
             FOREIGN KEY (product_id) REFERENCES products (id),
             FOREIGN KEY (attribute_id) REFERENCES attributes (id)
         )
     ''')
     
+    # Typed value columns for databases created before they existed
+    cursor.execute('PRAGMA table_info(product_attribute_data)')
+    columns = {row[1] for row in cursor.fetchall()}
+    if 'numeric_value' not in columns:
+        cursor.execute('ALTER TABLE product_attribute_data ADD COLUMN numeric_value REAL')
+        cursor.execute('ALTER TABLE product_attribute_data ADD COLUMN boolean_value INTEGER')
+        cursor.execute('''
+            SELECT pad.id, pad.value, a.data_type
+            FROM product_attribute_data pad
+            JOIN attributes a ON pad.attribute_id = a.id
+        ''')
+        cursor.executemany(
+            'UPDATE product_attribute_data SET numeric_value = ?, boolean_value = ? WHERE id = ?',
+            [typed_values(value, data_type) + (row_id,) for row_id, value, data_type in cursor.fetchall()]
+        )
+    
+    # Foreign key indexes for loading a comparison's rows
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attributes_comparison ON attributes (comparison_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_comparison ON products (comparison_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pad_product ON product_attribute_data (product_id)')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pad_attribute_numeric
+        ON product_attribute_data (attribute_id, numeric_value)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pad_attribute_boolean
+        ON product_attribute_data (attribute_id, boolean_value)
+    ''')
+    
     conn.commit()
     conn.close()
 
+def typed_values(value, data_type):
+    """Parse a raw attribute value into its (numeric_value, boolean_value) columns"""
+    text = str(value).strip().lower()
+    if data_type == 'boolean':
+        if text in BOOLEAN_TRUE_VALUES:
+            return 1.0, 1
+        if text in BOOLEAN_FALSE_VALUES:
+            return 0.0, 0
+        return None, None
+    try:
+        number = float(text)
+    except ValueError:
+        return None, None
+    return (number if math.isfinite(number) else None), None
+
+def parse_sort_by(raw, default_order='desc'):
+    """Parse 'Price:asc,RAM:desc:nulls_first' into [(name, descending, nulls_first)]"""
+    keys = []
+    for item in filter(None, (part.strip() for part in (raw or '').split(','))):
+        name, direction, nulls = item, default_order, 'nulls_last'
+        # Options are peeled off the right so attribute names may contain ':'
+        while ':' in name:
+            head, _, option = name.rpartition(':')
+            option = option.strip().lower()
+            if option in SORT_DIRECTIONS:
+                direction = option
+            elif option in NULL_PLACEMENTS:
+                nulls = option
+            else:
+                break
+            name = head
+        name = name.strip()
+        if not name:
+            raise ValueError(f"Missing attribute name in sort key '{item}'")
+        if any(key[0] == name for key in keys):
+            raise ValueError(f"Attribute '{name}' appears more than once in sort_by")
+        keys.append((name, direction == 'desc', nulls == 'nulls_first'))
+    return keys
+
 def get_db():
-    """Get database connection"""
-    return sqlite3.connect(DB_PATH)
+    """Get the request's pooled database connection, released on teardown"""
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the request's connection to the pool, whatever path the view took"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(error):
+    return jsonify({'error': 'Database busy, try again'}), 503
 
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'Product Ranking API'})
+    return jsonify({'status': 'healthy', 'service': 'Product Ranking API', 'db_pool': pool.stats()})
+
+@app.route('/metrics', methods=['GET', 'DELETE'])
+def request_metrics():
+    """In-process request metrics per endpoint; DELETE resets them"""
+    if request.method == 'DELETE':
+        instrumentation.registry.reset()
+        return '', 204
+    return jsonify({'query_budget': QUERY_BUDGET, 'views': instrumentation.registry.snapshot()})
 
 @app.route('/api/comparisons/', methods=['GET'])
 def list_comparisons():
@@ -108,7 +232,6 @@ def list_comparisons():
             'attribute_count': row[6] or 0
         })
     
-    conn.close()
     return jsonify(comparisons)
 
 @app.route('/api/comparisons/', methods=['POST'])
@@ -144,81 +267,15 @@ def create_comparison():
         'attribute_count': 0
     }
     
-    conn.close()
     return jsonify(comparison), 201
 
 @app.route('/api/comparisons/<int:comparison_id>/', methods=['GET'])
 def get_comparison_detail(comparison_id):
     """Get comparison details with attributes and products"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get comparison
-    cursor.execute('SELECT * FROM comparisons WHERE id = ?', (comparison_id,))
-    comp_row = cursor.fetchone()
-    
-    if not comp_row:
+    comparison = load_comparison(get_db(), comparison_id)
+    if comparison is None:
         return jsonify({'error': 'Comparison not found'}), 404
     
-    # Get attributes
-    cursor.execute('SELECT * FROM attributes WHERE comparison_id = ?', (comparison_id,))
-    attributes = []
-    for row in cursor.fetchall():
-        attributes.append({
-            'id': row[0],
-            'name': row[2],
-            'data_type': row[3],
-            'unit': row[4]
-        })
-    
-    # Get products with attribute data
-    cursor.execute('SELECT * FROM products WHERE comparison_id = ?', (comparison_id,))
-    products = []
-    for row in cursor.fetchall():
-        product_id = row[0]
-        
-        # Get attribute data for this product
-        cursor.execute('''
-            SELECT pad.*, a.name, a.data_type, a.unit
-            FROM product_attribute_data pad
-            JOIN attributes a ON pad.attribute_id = a.id
-            WHERE pad.product_id = ?
-        ''', (product_id,))
-        
-        attribute_data = []
-        for attr_row in cursor.fetchall():
-            attribute_data.append({
-                'id': attr_row[0],
-                'attribute': {
-                    'id': attr_row[2],
-                    'name': attr_row[4],
-                    'data_type': attr_row[5],
-                    'unit': attr_row[6]
-                },
-                'value': attr_row[3]
-            })
-        
-        products.append({
-            'id': row[0],
-            'name': row[2],
-            'description': row[3],
-            'created_at': row[4],
-            'updated_at': row[5],
-            'attribute_data': attribute_data
-        })
-    
-    comparison = {
-        'id': comp_row[0],
-        'name': comp_row[1],
-        'description': comp_row[2],
-        'created_at': comp_row[3],
-        'updated_at': comp_row[4],
-        'attributes': attributes,
-        'products': products,
-        'product_count': len(products)
-    }
-    
-    conn.close()
     return jsonify(comparison)
 
 @app.route('/api/comparisons/<int:comparison_id>/attributes/', methods=['POST'])
@@ -257,7 +314,6 @@ def create_attribute(comparison_id):
         'comparison': row[1]
     }
     
-    conn.close()
     return jsonify(attribute), 201
 
 @app.route('/api/comparisons/<int:comparison_id>/products/', methods=['POST'])
@@ -286,11 +342,16 @@ def create_product(comparison_id):
     
     # Add attribute data if provided
     if data.get('attribute_data'):
+        cursor.execute('SELECT id, data_type FROM attributes WHERE comparison_id = ?', (comparison_id,))
+        data_types = dict(cursor.fetchall())
         for attr_data in data['attribute_data']:
+            numeric_value, boolean_value = typed_values(
+                attr_data['value'], data_types.get(attr_data['attribute_id'])
+            )
             cursor.execute('''
-                INSERT INTO product_attribute_data (product_id, attribute_id, value)
-                VALUES (?, ?, ?)
-            ''', (product_id, attr_data['attribute_id'], attr_data['value']))
+                INSERT INTO product_attribute_data (product_id, attribute_id, value, numeric_value, boolean_value)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (product_id, attr_data['attribute_id'], attr_data['value'], numeric_value, boolean_value))
     
     conn.commit()
     
@@ -306,7 +367,6 @@ def create_product(comparison_id):
         'updated_at': row[5]
     }
     
-    conn.close()
     return jsonify(product), 201
 
 @app.route('/api/comparisons/<int:comparison_id>/results/', methods=['GET'])
@@ -314,16 +374,22 @@ def get_ranking_results(comparison_id):
     """Get ranking results for comparison"""
     sort_by = request.args.get('sort_by')
     sort_order = request.args.get('sort_order', 'desc')
+    rank_method = request.args.get('rank_method', 'row_number')
+    
+    if rank_method not in RANK_FUNCTIONS:
+        return jsonify({'error': f"Invalid rank_method '{rank_method}'"}), 400
+    try:
+        sort_keys = parse_sort_by(sort_by, sort_order)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     conn = get_db()
     cursor = conn.cursor()
     
     # Get comparison details
-    comparison_detail = get_comparison_detail(comparison_id)
-    if comparison_detail.status_code != 200:
-        return comparison_detail
-    
-    comparison_data = comparison_detail.get_json()
+    comparison_data = load_comparison(conn, comparison_id)
+    if comparison_data is None:
+        return jsonify({'error': 'Comparison not found'}), 404
     
     # Process results for ranking
     results = []
@@ -344,40 +410,56 @@ def get_ranking_results(comparison_id):
             'rank': 1  # Will be updated after sorting
         })
     
-    # Sort results if sort_by is specified
-    if sort_by and results:
-        def sort_key(item):
-            if sort_by not in item['attribute_values']:
-                return float('-inf') if sort_order == 'desc' else float('inf')
-            
-            value = item['attribute_values'][sort_by]['value']
-            data_type = item['attribute_values'][sort_by]['data_type']
-            
-            if data_type == 'number':
-                try:
-                    return float(value)
-                except ValueError:
-                    return 0
-            elif data_type == 'boolean':
-                return value.lower() in ['true', '1', 'yes', 'on']
-            else:  # text
-                return value.lower()
-        
-        reverse = sort_order == 'desc'
-        results.sort(key=sort_key, reverse=reverse)
+    sorted_in_sql = False
+    
+    # Sort and rank in SQL on the typed value columns if sort_by is specified;
+    # each sort key joins its own attribute's values
+    if sort_keys and results:
+        attributes = {attr['name']: (attr['id'], attr['data_type']) for attr in comparison_data['attributes']}
+        lowercase = {name.lower(): attribute for name, attribute in attributes.items()}
+        joins, value_orders, params = [], [], []
+        for i, (name, descending, nulls_first) in enumerate(sort_keys):
+            attribute = attributes.get(name) or lowercase.get(name.lower())
+            if attribute is None:
+                return jsonify({'error': f"Unknown attribute '{name}'"}), 400
+            alias = f'pad{i}'
+            joins.append(
+                f'LEFT JOIN product_attribute_data {alias} ON {alias}.product_id = p.id AND {alias}.attribute_id = ?'
+            )
+            params.append(attribute[0])
+            column = SORT_COLUMNS.get(attribute[1], SORT_COLUMNS['text']).format(pad=alias)
+            value_orders.append(
+                f"{column} {'DESC' if descending else 'ASC'} {'NULLS FIRST' if nulls_first else 'NULLS LAST'}"
+            )
+        value_order = ', '.join(value_orders)
+        window_order = f'{value_order}, p.id' if rank_method == 'row_number' else value_order
+        cursor.execute(f'''
+            SELECT p.id, {RANK_FUNCTIONS[rank_method]} OVER (ORDER BY {window_order})
+            FROM products p
+            {' '.join(joins)}
+            WHERE p.comparison_id = ?
+            ORDER BY {value_order}, p.id
+        ''', (*params, comparison_id))
+        ranks = dict(cursor.fetchall())
+        positions = {product_id: i for i, product_id in enumerate(ranks)}
+        results.sort(key=lambda item: positions[item['product_id']])
+        for result in results:
+            result['rank'] = ranks[result['product_id']]
+        sorted_in_sql = True
     
     # Update ranks
-    for i, result in enumerate(results, 1):
-        result['rank'] = i
+    if not sorted_in_sql:
+        for i, result in enumerate(results, 1):
+            result['rank'] = i
     
     response_data = {
         'comparison': comparison_data,
         'results': results,
         'sort_by': sort_by,
-        'sort_order': sort_order
+        'sort_order': sort_order,
+        'rank_method': rank_method
     }
     
-    conn.close()
     return jsonify(response_data)
 
 @app.route('/')
@@ -388,11 +470,14 @@ def index():
         'version': '1.0',
         'endpoints': {
             'comparisons': '/api/comparisons/',
-            'health': '/health'
+            'health': '/health',
+            'metrics': '/metrics'
         }
     })
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    
     # Initialize database
     init_db()
     
@@ -0,0 +1,83 @@
+"""
+Data access for the Flask backend
+
+Views call these functions with the request's connection and get plain
+dicts back, so endpoints can share loaded data without going through a
+Response and back.
+"""
+
+
+def load_comparison(conn, comparison_id):
+    """
+    Load a comparison with its attributes, products and attribute values.
+
+    Uses three queries whatever the number of products: the comparison, its
+    attributes, and its products LEFT JOINed with their attribute data.
+    Returns None if the comparison does not exist.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute(
+        'SELECT id, name, description, created_at, updated_at FROM comparisons WHERE id = ?',
+        (comparison_id,)
+    )
+    comp_row = cursor.fetchone()
+    if not comp_row:
+        return None
+
+    cursor.execute(
+        'SELECT id, name, data_type, unit FROM attributes WHERE comparison_id = ?',
+        (comparison_id,)
+    )
+    attributes = []
+    attributes_by_id = {}
+    for row in cursor.fetchall():
+        attribute = {
+            'id': row[0],
+            'name': row[1],
+            'data_type': row[2],
+            'unit': row[3]
+        }
+        attributes.append(attribute)
+        attributes_by_id[row[0]] = attribute
+
+    cursor.execute('''
+        SELECT p.id, p.name, p.description, p.created_at, p.updated_at,
+               pad.id, pad.attribute_id, pad.value
+        FROM products p
+        LEFT JOIN product_attribute_data pad ON pad.product_id = p.id
+        WHERE p.comparison_id = ?
+        ORDER BY p.id, pad.id
+    ''', (comparison_id,))
+
+    products = []
+    product = None
+    for row in cursor:
+        if product is None or product['id'] != row[0]:
+            product = {
+                'id': row[0],
+                'name': row[1],
+                'description': row[2],
+                'created_at': row[3],
+                'updated_at': row[4],
+                'attribute_data': []
+            }
+            products.append(product)
+        # Rows for products without data have NULL attribute columns
+        if row[5] is not None and row[6] in attributes_by_id:
+            product['attribute_data'].append({
+                'id': row[5],
+                'attribute': dict(attributes_by_id[row[6]]),
+                'value': row[7]
+            })
+
+    return {
+        'id': comp_row[0],
+        'name': comp_row[1],
+        'description': comp_row[2],
+        'created_at': comp_row[3],
+        'updated_at': comp_row[4],
+        'attributes': attributes,
+        'products': products,
+        'product_count': len(products)
+    }